@@ -0,0 +1,108 @@
+"""
+Shared setup of benchmarks. Every benchmark runs with settings of ``runtests.py`` against
+a new SQLite database in temporary file (not in memory, so the database does not count
+into memory of the process), e.g.:
+
+    python benchmarks/exports.py --items 1000000
+"""
+import datetime
+import os
+import resource
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import runtests  # noqa, configures settings
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+
+
+def setup_database():
+    """
+    Creates and migrates database in temporary file.
+
+    :return: path of the database file, remove it with ``teardown_database()``
+    """
+    handle, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(handle)
+    settings.DATABASES['default']['NAME'] = path
+    django.setup()
+    call_command('migrate', verbosity=0, interactive=False)
+    return path
+
+
+def teardown_database(path):
+    from django.db import connections
+    connections.close_all()
+    os.remove(path)
+
+
+def rss():
+    """
+    Resident memory of the process in MB (peak resident memory where /proc is not available).
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 1024.0 / 1024.0
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def invoice_values(index, date_issue=datetime.date(2016, 1, 1)):
+    """
+    Field values of invoice inserted by ``bulk_create()`` (number is taken from ``index``).
+    """
+    supplier = settings.INVOICING_SUPPLIER
+    bank = supplier['bank']
+    return {
+        'number': index,
+        'full_number': '%s/%d' % (date_issue.strftime('%Y/%m'), index),
+        'language': 'en',
+        'date_issue': date_issue,
+        'date_tax_point': date_issue,
+        'date_due': date_issue + datetime.timedelta(days=14),
+        'currency': 'EUR',
+        'payment_method': 'BANK_TRANSFER',
+        'variable_symbol': index,
+        'supplier_name': supplier['name'],
+        'supplier_country': supplier['country_code'],
+        'supplier_vat_id': supplier['vat_id'],
+        'supplier_additional_info': supplier['additional_info'],
+        'bank_iban': bank['iban'],
+        'bank_swift_bic': bank['swift_bic'],
+        'customer_name': 'Customer %d' % (index % 1000),
+        'customer_country': 'SK',
+        'customer_additional_info': '{"note": "customer %d"}' % index,
+    }
+
+
+def populate(invoices, items_per_invoice=0, batch_size=1000):
+    """
+    Inserts invoices with ids 1..``invoices`` and their items in bulk, without ``save()``.
+    """
+    from django.db import transaction
+    from invoicing.models import Invoice, Item
+
+    for start in range(1, invoices + 1, batch_size):
+        pks = range(start, min(start + batch_size, invoices + 1))
+        with transaction.atomic():
+            Invoice.objects.bulk_create([Invoice(id=pk, **invoice_values(pk)) for pk in pks])
+            Item.objects.bulk_create([
+                Item(invoice_id=pk, title='Item %d' % position, quantity=Decimal(position + 1),
+                     unit_price=Decimal('9.99'), tax_rate=Decimal(20), weight=position)
+                for pk in pks for position in range(items_per_invoice)
+            ])
+
+
+class Timer(object):
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.seconds = time.time() - self.start
@@ -0,0 +1,49 @@
+"""
+Streams CSV export of invoices and items and reports throughput and resident memory sampled during export.
+Memory should stay flat regardless of the number of rows:
+
+    python benchmarks/exports.py --items 1000000
+"""
+from __future__ import print_function
+
+import argparse
+
+from base import Timer, populate, rss, setup_database, teardown_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--items-per-invoice', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    path = setup_database()
+    try:
+        from invoicing.exports import CSVWriter, InvoiceExport, ItemExport
+
+        with Timer() as timer:
+            populate(args.items // args.items_per_invoice, args.items_per_invoice)
+        print('populated %d items in %.1f s' % (args.items, timer.seconds))
+
+        for export_class in (InvoiceExport, ItemExport):
+            export = export_class(chunk_size=args.chunk_size)
+            start_rss = peak_rss = rss()
+            rows = size = 0
+
+            with Timer() as timer:
+                for line in CSVWriter().lines(export):
+                    rows += 1
+                    size += len(line)
+                    if rows % 10000 == 0:
+                        peak_rss = max(peak_rss, rss())
+
+            print('%s: %d rows, %.1f MB in %.1f s (%d rows/s), RSS %.1f MB at start, %.1f MB peak' % (
+                export_class.__name__, rows - 1, size / 1024.0 / 1024.0, timer.seconds,
+                (rows - 1) / max(timer.seconds, 0.001), start_rss, peak_rss))
+    finally:
+        teardown_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Ingests batch of invoices through ``invoicing.ingestion`` and sends the same batch again,
+as client retrying after timeout would. The retry creates nothing and should be much faster:
+
+    python benchmarks/ingestion.py --invoices 10000
+"""
+from __future__ import print_function
+
+import argparse
+
+from base import Timer, setup_database, teardown_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--invoices', type=int, default=10000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    path = setup_database()
+    try:
+        from collections import Counter
+        from invoicing.ingestion import Ingestion
+        from invoicing.tests.base import ingest_payload
+
+        payloads = [ingest_payload('order-%d' % index) for index in range(args.invoices)]
+
+        for run in ('first', 'retry'):
+            with Timer() as timer:
+                results = Ingestion(args.chunk_size).ingest(payloads)
+
+            statuses = Counter(result.status for result in results)
+            print('%s: %s in %.1f s (%d invoices/s)' % (
+                run, ', '.join('%d %s' % (count, status) for status, count in sorted(statuses.items())),
+                timer.seconds, len(results) / max(timer.seconds, 0.001)))
+    finally:
+        teardown_database(path)
+
+
+if __name__ == '__main__':
+    main()
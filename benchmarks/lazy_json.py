@@ -0,0 +1,44 @@
+"""
+Loads invoices with and without reading their additional info. Decoding is skipped
+for queries which never touch the JSON fields, the difference is the cost saved:
+
+    python benchmarks/lazy_json.py --invoices 100000
+"""
+from __future__ import print_function
+
+import argparse
+
+from base import Timer, populate, setup_database, teardown_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--invoices', type=int, default=100000)
+    args = parser.parse_args()
+
+    path = setup_database()
+    try:
+        from invoicing.models import Invoice
+
+        populate(args.invoices)
+
+        def untouched():
+            for invoice in Invoice.objects.all().iterator():
+                invoice.customer_name
+
+        def decoded():
+            for invoice in Invoice.objects.all().iterator():
+                invoice.supplier_additional_info
+                invoice.customer_additional_info
+
+        for name, load in (('not decoded', untouched), ('decoded', decoded)):
+            with Timer() as timer:
+                load()
+            print('%s: %d invoices in %.1f s (%d invoices/s)' % (
+                name, args.invoices, timer.seconds, args.invoices / max(timer.seconds, 0.001)))
+    finally:
+        teardown_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Loads invoices as full model instances and as ``as_rows('list')`` projection and reports
+load time and memory taken by the loaded objects:
+
+    python benchmarks/projections.py --invoices 100000
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+
+from base import Timer, populate, rss, setup_database, teardown_database
+
+
+def measure(name, load):
+    gc.collect()
+    start_rss = rss()
+    with Timer() as timer:
+        objects = load()
+    gc.collect()
+    print('%s: %d objects in %.1f s, %.1f MB' % (name, len(objects), timer.seconds, rss() - start_rss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--invoices', type=int, default=100000)
+    args = parser.parse_args()
+
+    path = setup_database()
+    try:
+        from invoicing.models import Invoice
+
+        populate(args.invoices)
+
+        # rows are measured first, so memory freed by instances is not reused by them
+        measure('rows', lambda: list(Invoice.objects.as_rows('list')))
+        measure('instances', lambda: list(Invoice.objects.all().iterator()))
+    finally:
+        teardown_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Reconciles bank statement in CSV against unsettled invoices: builds the in-memory invoice index,
+parses and matches statement lines and records payments of matched lines. Most lines pay
+their invoice in full, some of them partially and some match no invoice:
+
+    python benchmarks/reconciliation.py --lines 100000
+"""
+from __future__ import print_function
+
+import argparse
+import io
+
+from base import Timer, populate, rss, setup_database, teardown_database
+
+
+def statement(invoices, balances):
+    """
+    CSV statement with one line per invoice: every tenth line is partial payment,
+    every tenth line (shifted by five) has unknown variable symbol.
+    """
+    output = io.BytesIO() if str is bytes else io.StringIO()
+    output.write(str('amount,currency,date,variable_symbol,reference\n'))
+    for pk in range(1, invoices + 1):
+        amount = balances[pk]
+        variable_symbol = pk
+        if pk % 10 == 0:
+            amount = amount / 2
+        elif pk % 10 == 5:
+            variable_symbol = invoices + pk
+        output.write(str('%s,EUR,2016-01-20,%d,\n' % (amount, variable_symbol)))
+    output.seek(0)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    path = setup_database()
+    try:
+        from collections import Counter
+        from invoicing.models import Invoice
+        from invoicing.reconciliation import Reconciler, parse_csv
+
+        with Timer() as timer:
+            populate(args.lines, items_per_invoice=1)
+            for start in range(1, args.lines + 1, args.chunk_size):
+                Invoice.objects.filter(pk__gte=start, pk__lt=start + args.chunk_size).update_balances()
+        print('populated %d invoices in %.1f s' % (args.lines, timer.seconds))
+
+        balances = dict(Invoice.objects.values_list('pk', 'balance_due'))
+        fileobj = statement(args.lines, balances)
+        start_rss = rss()
+
+        with Timer() as timer:
+            reconciler = Reconciler()
+        print('index: %d invoices in %.1f s, RSS %.1f MB -> %.1f MB' % (
+            len(balances), timer.seconds, start_rss, rss()))
+
+        with Timer() as timer:
+            results = reconciler.reconcile(parse_csv(fileobj), apply=False)
+        statuses = Counter(result.status for result in results)
+        print('match: %s in %.1f s (%d lines/s)' % (
+            ', '.join('%d %s' % (count, status) for status, count in sorted(statuses.items())),
+            timer.seconds, len(results) / max(timer.seconds, 0.001)))
+
+        with Timer() as timer:
+            reconciler.apply(results, args.chunk_size)
+        print('apply: %d payments in %.1f s (%d lines/s), %d invoices paid' % (
+            sum(count for status, count in statuses.items() if status != 'UNMATCHED'), timer.seconds,
+            len(results) / max(timer.seconds, 0.001), Invoice.objects.filter(status=Invoice.STATUS.PAID).count()))
+    finally:
+        teardown_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -26,6 +26,18 @@ DATABASES = {
     }
 }
 
+# Reading reports, exports and rendered invoices from replica, e.g. two local SQLite databases
+# (replica mirrors default in tests):
+#
+# DATABASES = {
+#     'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'example.sqlite3'},
+#     'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'example-replica.sqlite3',
+#                 'TEST': {'MIRROR': 'default'}},
+# }
+# DATABASE_ROUTERS = ['invoicing.routers.InvoicingRouter']
+# INVOICING_READ_DATABASES = ('replica',)
+# and 'invoicing.routers.InvoicingRouterMiddleware' in MIDDLEWARE_CLASSES
+
 # Hosts/domain names that are valid for this site; required if DEBUG is False
 # See https://docs.djangoproject.com/en/1.4/ref/settings/#allowed-hosts
 ALLOWED_HOSTS = []
@@ -203,6 +215,32 @@ INVOICING_SUPPLIER = {
 # Therefore changing this value will affect all previously created invoices.
 INVOICING_FORMATTER = 'invoicing.formatters.html.BootstrapHTMLFormatter'
 
+# Formats available in invoice detail view (selected by ?format= parameter or Accept header).
+INVOICING_FORMATTERS = (
+    ('html', 'invoicing.formatters.html.HTMLFormatter'),
+    ('bootstrap', 'invoicing.formatters.html.BootstrapHTMLFormatter'),
+    ('pdf', 'invoicing.formatters.pdf.PDFFormatter'),
+    ('json', 'invoicing.formatters.data.JSONFormatter'),
+    ('ubl', 'invoicing.formatters.ubl.UBLFormatter'),
+    ('isdoc', 'invoicing.formatters.ubl.ISDOCFormatter'),
+)
+
+# Formats rendered and stored when invoice is sent; detail view serves the stored document afterwards.
+INVOICING_SNAPSHOT_FORMATS = ('bootstrap', 'pdf')
+
+# Digital invoices are emailed by deliver_invoices command with these formats attached.
+# Use EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend' to try it without SMTP server.
+INVOICING_DELIVERY_FORMATS = ('pdf',)
+INVOICING_DELIVERY_FROM_EMAIL = 'invoices@example.com'
+INVOICING_DELIVERY_MAX_ATTEMPTS = 5
+
+# Overdue days from which payment reminders of level 1, 2, 3 are sent by send_reminders command.
+INVOICING_DUNNING_LEVELS = (7, 21, 45)
+
+# Store supplier and bank details once in shared snapshots instead of copying them to every invoice row.
+# Existing invoices are compacted by migration 0010 when this is enabled before migrating.
+INVOICING_PARTY_SNAPSHOTS = False
+
 INVOICING_SUPPLIER_LOGO_URL = normpath(join(STATIC_URL, 'my_logo.png'))
 
 from invoicing.models import Invoice
@@ -1,11 +1,71 @@
+import datetime
+
+from django.conf.urls import url
 from django.contrib import admin
+from django.core.paginator import InvalidPage, Paginator
+from django.forms.models import BaseInlineFormSet
+from django.template.response import TemplateResponse
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
-from invoicing.models import Invoice, Item
+from invoicing.delivery import deliver, pending_invoices
+from invoicing.managers import InvoiceQuerySet
+from invoicing.routers import read_replica
+from invoicing.search import get_search_backend
+from invoicing.models import DeliveryAttempt, Invoice, InvoiceFacet, Item, Payment, RecurringInvoice, \
+    Reminder, VATReturnLine, VATReturnPeriod
+
+
+class PaginatedItemFormSet(BaseInlineFormSet):
+    """
+    Item formset showing only one page of items (``?items_page=`` parameter of the change page).
+    Changed items are written by bulk UPDATE, deleted ones by single DELETE
+    and invoice balance is recomputed once after saving.
+    """
+    per_page = 50
+    page_number = 1
+
+    def get_queryset(self):
+        if not hasattr(self, '_page_queryset'):
+            self.paginator = Paginator(super(PaginatedItemFormSet, self).get_queryset(), self.per_page)
+            try:
+                self.page = self.paginator.page(self.page_number)
+            except InvalidPage:
+                self.page = self.paginator.page(1)
+            self._page_queryset = self.page.object_list
+        return self._page_queryset
+
+    def save_existing_objects(self, commit=True):
+        self.changed_objects = []
+        self.deleted_objects = []
+        changed_fields = set()
+        saved = []
+
+        for form in self.initial_forms:
+            if form in self.deleted_forms:
+                self.deleted_objects.append(form.instance)
+            elif form.has_changed():
+                self.changed_objects.append((form.instance, form.changed_data))
+                changed_fields.update(form.changed_data)
+                saved.append(form.save(commit=False))
+
+        if commit:
+            if self.deleted_objects:
+                Item.objects.filter(pk__in=[item.pk for item in self.deleted_objects]).delete()
+            if saved:
+                Item.objects.update_in_bulk(saved, changed_fields)
+        return saved
+
+    def save(self, commit=True):
+        saved = super(PaginatedItemFormSet, self).save(commit)
+        if commit:
+            Invoice.objects.filter(pk=self.instance.pk).update_balances()
+        return saved
 
 
 class ItemInline(admin.TabularInline):
+    formset = PaginatedItemFormSet
+    template = 'admin/invoicing/invoice/item_inline.html'
     fieldsets = (
         (
             None,
@@ -17,6 +77,26 @@ class ItemInline(admin.TabularInline):
     model = Item
     extra = 0
 
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super(ItemInline, self).get_formset(request, obj, **kwargs)
+        formset.page_number = request.GET.get('items_page', 1)
+        return formset
+
+
+class PaymentInline(admin.TabularInline):
+    fields = ('amount', 'date', 'reference')
+    model = Payment
+    extra = 0
+
+
+class DeliveryAttemptInline(admin.TabularInline):
+    model = DeliveryAttempt
+    fields = ('created', 'recipient', 'status', 'error')
+    readonly_fields = ('created', 'recipient', 'status', 'error')
+    extra = 0
+    max_num = 0
+    can_delete = False
+
 
 class OverdueFilter(admin.SimpleListFilter):
     title = _('overdue')
@@ -30,21 +110,94 @@ class OverdueFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'no':
-            return queryset.not_overdue()
+            return queryset.filter(overdue=False)
         if self.value() == 'yes':
-            return queryset.overdue()
+            return queryset.filter(overdue=True)
+
+
+class FacetFilter(admin.SimpleListFilter):
+    """
+    Choices filter showing number of invoices of every choice, read from ``InvoiceFacet``.
+    """
+    facet_field = None
+    choices = ()
+
+    def lookups(self, request, model_admin):
+        counts = dict((row[self.facet_field], row['count']) for row in InvoiceFacet.objects.counts(self.facet_field))
+        return [(value, u'%s (%d)' % (label, counts.get(value, 0))) for value, label in self.choices]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.facet_field: self.value()})
+
+
+class TypeFilter(FacetFilter):
+    title = _(u'type')
+    parameter_name = 'type__exact'
+    facet_field = 'type'
+    choices = Invoice.TYPE
+
+
+class StatusFilter(FacetFilter):
+    title = _(u'status')
+    parameter_name = 'status__exact'
+    facet_field = 'status'
+    choices = Invoice.STATUS
+
+
+class IssueDateFilter(admin.SimpleListFilter):
+    """
+    Year and month drill-down by issue date with counts read from ``InvoiceFacet``
+    (replaces ``date_hierarchy``, which queries distinct dates of the whole table).
+    """
+    title = _(u'issue date')
+    parameter_name = 'issued'
+
+    def get_period(self):
+        try:
+            parts = [int(part) for part in (self.value() or '').split('-')]
+        except ValueError:
+            return None, None
+        return parts[0], parts[1] if len(parts) > 1 else None
+
+    def lookups(self, request, model_admin):
+        year, month = self.get_period()
+        lookups = [(str(row['year']), u'%d (%d)' % (row['year'], row['count']))
+                   for row in InvoiceFacet.objects.counts('year')]
+
+        if year is not None:
+            lookups += [('%d-%02d' % (year, row['month']), u'%d/%02d (%d)' % (year, row['month'], row['count']))
+                        for row in InvoiceFacet.objects.counts('month', year=year)]
+        return lookups
+
+    def queryset(self, request, queryset):
+        year, month = self.get_period()
+        if year is None:
+            return queryset
+
+        try:
+            if month is None:
+                date_from, date_to = datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+            else:
+                date_from = datetime.date(year, month, 1)
+                date_to = datetime.date(year + month // 12, month % 12 + 1, 1)
+        except ValueError:
+            return queryset.none()
+        return queryset.filter(date_issue__gte=date_from, date_issue__lt=date_to)
 
 
 class InvoiceAdmin(admin.ModelAdmin):
-    date_hierarchy = 'date_issue'
     list_display = ['pk', 'type', 'full_number', 'status', 'supplier', 'customer',
                     'subtotal', 'vat', 'total', 'currency', 'date_issue', 'payment_term_days', 'is_overdue_boolean', 'is_paid']
     list_editable = ['status']
-    list_filter = ['type', 'status', 'payment_method', OverdueFilter,
+    list_filter = [IssueDateFilter, TypeFilter, StatusFilter, 'payment_method', OverdueFilter,
                    #'language', 'currency'
     ]
+    show_full_result_count = False
     search_fields = ['number', 'subtitle', 'note', 'supplier_name', 'customer_name', 'shipping_name']
-    inlines = (ItemInline, )
+    inlines = (ItemInline, PaymentInline, DeliveryAttemptInline)
+    readonly_fields = ['amount_paid', 'balance_due']
+    actions = ['deliver', 'mark_sent', 'mark_paid', 'cancel']
     fieldsets = (
         (_(u'General information'), {
             'fields': (
@@ -59,8 +212,7 @@ class InvoiceAdmin(admin.ModelAdmin):
         }),
         (_(u'Payment details'), {
             'fields': (
-                'currency', 'credit',
-                #'already_paid',
+                'currency', 'credit', 'amount_paid', 'balance_due',
                 'payment_method', 'constant_symbol', 'variable_symbol', 'specific_symbol', 'reference',
                 'bank_name', 'bank_country', 'bank_city', 'bank_street', 'bank_zip', 'bank_iban', 'bank_swift_bic'
             )
@@ -75,7 +227,8 @@ class InvoiceAdmin(admin.ModelAdmin):
         (_(u'Customer details'), {
             'fields': (
                 'customer_name', 'customer_street', 'customer_zip', 'customer_city', 'customer_country',
-                'customer_registration_id', 'customer_tax_id', 'customer_vat_id', 'customer_additional_info',
+                'customer_registration_id', 'customer_tax_id', 'customer_vat_id', 'customer_email',
+                'customer_additional_info',
             )
         }),
         (_(u'Shipping details'), {
@@ -85,6 +238,57 @@ class InvoiceAdmin(admin.ModelAdmin):
         })
     )
 
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            url(r'^aging/$', self.admin_site.admin_view(self.aging_view), name='%s_%s_aging' % info),
+        ] + super(InvoiceAdmin, self).get_urls()
+
+    def _transition_action(self, request, queryset, status):
+        pks = queryset.transition(status)
+        skipped = queryset.count() - len(pks)
+        self.message_user(request, _(u'%(changed)d invoices changed to %(status)s, %(skipped)d skipped.') % {
+            'changed': len(pks), 'status': Invoice.STATUS[status], 'skipped': skipped})
+
+    def deliver(self, request, queryset):
+        sent, failed = deliver(queryset.filter(pk__in=pending_invoices().values('pk')))
+        self.message_user(request, _(u'%(sent)d invoices emailed, %(failed)d failed.') % {'sent': sent, 'failed': failed})
+    deliver.short_description = _(u'Email selected invoices to customers')
+
+    def mark_sent(self, request, queryset):
+        self._transition_action(request, queryset, Invoice.STATUS.SENT)
+    mark_sent.short_description = _(u'Mark selected invoices as sent')
+
+    def mark_paid(self, request, queryset):
+        self._transition_action(request, queryset, Invoice.STATUS.PAID)
+    mark_paid.short_description = _(u'Mark selected invoices as paid')
+
+    def cancel(self, request, queryset):
+        self._transition_action(request, queryset, Invoice.STATUS.CANCELED)
+    cancel.short_description = _(u'Cancel selected invoices')
+
+    def aging_bucket_label(self, days_from, days_to):
+        if days_from is None:
+            return _(u'current')
+        if days_to is None:
+            return _(u'%d+ days') % days_from
+        return _(u'%(from)d-%(to)d days') % {'from': days_from, 'to': days_to}
+
+    @read_replica()
+    def aging_view(self, request):
+        buckets = InvoiceQuerySet.AGING_BUCKETS
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title=_(u'Receivables aging'),
+            buckets=[self.aging_bucket_label(days_from, days_to) for name, days_from, days_to in buckets],
+            rows=[
+                (row['customer_name'], row['currency'], [row[name] for name, days_from, days_to in buckets], row['total'])
+                for row in self.model.objects.aging()
+            ]
+        )
+        return TemplateResponse(request, 'admin/invoicing/invoice/aging.html', context)
+
     def supplier(self, invoice):
         return mark_safe(u'%s<br>%s' % (invoice.supplier_name, invoice.supplier_country.name))
     supplier.short_description = _(u'supplier')
@@ -102,9 +306,65 @@ class InvoiceAdmin(admin.ModelAdmin):
     is_overdue_boolean.boolean = True
     is_overdue_boolean.short_description = _(u'is overdue')
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return get_search_backend(queryset.db).search(queryset, search_term), False
+
     def is_paid(self, invoice):
         return invoice.status == Invoice.STATUS.PAID
     is_paid.boolean = True
     is_paid.short_description = _(u'is paid')
 
 admin.site.register(Invoice, InvoiceAdmin)
+
+
+class RecurringInvoiceAdmin(admin.ModelAdmin):
+    list_display = ['template', 'period', 'interval_days', 'date_next', 'date_end', 'active']
+    list_filter = ['active', 'period']
+    raw_id_fields = ['template']
+    date_hierarchy = 'date_next'
+
+admin.site.register(RecurringInvoice, RecurringInvoiceAdmin)
+
+
+class ReminderAdmin(admin.ModelAdmin):
+    list_display = ['customer_name', 'recipient', 'level', 'outstanding', 'currency', 'status', 'created']
+    list_filter = ['status', 'level']
+    search_fields = ['customer_name', 'recipient']
+    readonly_fields = ['customer_name', 'recipient', 'currency', 'level', 'outstanding', 'invoice_ids', 'status',
+                       'error', 'created']
+    date_hierarchy = 'created'
+
+    def has_add_permission(self, request):
+        return False
+
+admin.site.register(Reminder, ReminderAdmin)
+
+
+class VATReturnLineInline(admin.TabularInline):
+    model = VATReturnLine
+    fields = VATReturnLine.VALUE_FIELDS
+    readonly_fields = VATReturnLine.VALUE_FIELDS
+    extra = 0
+    max_num = 0
+    can_delete = False
+
+
+class VATReturnPeriodAdmin(admin.ModelAdmin):
+    list_display = ['date_from', 'date_to', 'closed', 'refreshed']
+    list_filter = ['closed']
+    readonly_fields = ['refreshed']
+    inlines = (VATReturnLineInline, )
+    actions = ['refresh']
+
+    def save_model(self, request, obj, form, change):
+        super(VATReturnPeriodAdmin, self).save_model(request, obj, form, change)
+        obj.refresh(force='date_from' in form.changed_data or 'date_to' in form.changed_data)
+
+    def refresh(self, request, queryset):
+        refreshed = len([period for period in queryset if period.refresh(force=True)])
+        self.message_user(request, _(u'%d VAT return periods recomputed.') % refreshed)
+    refresh.short_description = _(u'Refresh VAT return')
+
+admin.site.register(VATReturnPeriod, VATReturnPeriodAdmin)
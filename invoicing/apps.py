@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.utils.translation import ugettext_lazy as _
+
+
+class InvoicingConfig(AppConfig):
+    name = 'invoicing'
+    verbose_name = _(u'Invoicing')
+
+    def ready(self):
+        from invoicing.formatters import registry
+
+        # import configured formatters now, so misconfiguration fails at startup instead of first request
+        registry.populate()
@@ -0,0 +1,287 @@
+"""
+Archive of settled invoices of closed years.
+
+Yearly partitions are emulated by plain archive tables instead of PostgreSQL declarative partitioning:
+partitioned tables cannot be created by migrations of supported Django versions, PostgreSQL
+does not allow foreign keys referencing them and SQLite and MySQL have nothing alike.
+``archive_year()`` moves invoices of a year with their items, payments, snapshots, documents and
+delivery attempts into ``*_archive`` tables, which keeps live tables (and their indexes) small
+like detaching old partitions would. ``including_archive()`` reads both, like querying the parent table.
+"""
+import datetime
+from itertools import chain, islice
+
+from django.apps.registry import Apps
+from django.db import connections, models, router, transaction
+from django.utils import six
+from model_utils.fields import MonitorField
+
+from invoicing.models import DeliveryAttempt, Invoice, InvoiceDocument, InvoiceFacet, InvoiceSnapshot, Item, \
+    OutboxEvent, Payment
+
+
+# archive models are kept out of the project app registry, so they do not appear in migrations
+archive_apps = Apps()
+
+
+class ArchivedInvoiceMixin(object):
+    def __str__(self):
+        return self.full_number
+
+    def __unicode__(self):
+        return self.full_number
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(ArchivedInvoiceMixin, cls).from_db(db, field_names, values)
+        six.get_unbound_function(Invoice._load_parties)(instance)
+        return instance
+
+    @property
+    def item_set(self):
+        return ARCHIVE_MODELS[Item].objects.filter(invoice_id=self.pk)
+
+    @property
+    def payments(self):
+        return ARCHIVE_MODELS[Payment].objects.filter(invoice_id=self.pk)
+
+    @property
+    def documents(self):
+        return ARCHIVE_MODELS[InvoiceDocument].objects.filter(invoice_id=self.pk)
+
+
+def _archive_field(field):
+    """
+    Copy of model field for archive table: relations are kept as plain ids, no unique constraints.
+    """
+    if field.primary_key:
+        return models.IntegerField(primary_key=True, db_column=field.column)
+    if isinstance(field, models.ForeignKey):
+        return models.IntegerField(null=True, db_column=field.column, db_index=field.name == 'invoice')
+    if isinstance(field, MonitorField):
+        return models.DateTimeField(null=True, db_column=field.column)
+
+    name, path, args, kwargs = field.deconstruct()
+    kwargs.update(unique=False, db_index=field.name == 'date_issue', db_column=field.column)
+    kwargs.pop('auto_now', None)
+    kwargs.pop('auto_now_add', None)
+    return field.__class__(*args, **kwargs)
+
+
+def _archive_model(model, bases=(models.Model,)):
+    attrs = {
+        '__module__': __name__,
+        'Meta': type(str('Meta'), (object,), {
+            'app_label': model._meta.app_label,
+            'db_table': '%s_archive' % model._meta.db_table,
+            'apps': archive_apps,
+            'managed': False,
+        }),
+    }
+    for field in model._meta.concrete_fields:
+        attrs[field.attname] = _archive_field(field)
+    return type(str('Archived%s' % model.__name__), bases, attrs)
+
+
+ARCHIVE_MODELS = {
+    Invoice: _archive_model(Invoice, (ArchivedInvoiceMixin, models.Model)),
+    Item: _archive_model(Item),
+    Payment: _archive_model(Payment),
+    InvoiceSnapshot: _archive_model(InvoiceSnapshot),
+    InvoiceDocument: _archive_model(InvoiceDocument),
+    DeliveryAttempt: _archive_model(DeliveryAttempt),
+}
+
+ArchivedInvoice = ARCHIVE_MODELS[Invoice]
+ArchivedItem = ARCHIVE_MODELS[Item]
+ArchivedPayment = ARCHIVE_MODELS[Payment]
+ArchivedInvoiceSnapshot = ARCHIVE_MODELS[InvoiceSnapshot]
+ArchivedInvoiceDocument = ARCHIVE_MODELS[InvoiceDocument]
+ArchivedDeliveryAttempt = ARCHIVE_MODELS[DeliveryAttempt]
+
+
+def ensure_archive_tables(using=None):
+    """
+    Creates archive tables, or adds columns added to live tables since the archive was created.
+    """
+    using = using or router.db_for_write(Invoice)
+    connection = connections[using]
+
+    with connection.schema_editor() as schema_editor:
+        tables = connection.introspection.table_names()
+
+        for archive_model in ARCHIVE_MODELS.values():
+            if archive_model._meta.db_table not in tables:
+                schema_editor.create_model(archive_model)
+                continue
+
+            with connection.cursor() as cursor:
+                columns = set(column.name for column in
+                              connection.introspection.get_table_description(cursor, archive_model._meta.db_table))
+            for field in archive_model._meta.local_fields:
+                if field.column not in columns:
+                    field.null = True
+                    schema_editor.add_field(archive_model, field)
+
+
+def archivable_invoices(year):
+    """
+    Settled invoices issued in ``year`` which are not referenced by other objects than their items, payments,
+    snapshot, documents and delivery attempts.
+    """
+    queryset = Invoice.objects.filter(
+        date_issue__gte=datetime.date(year, 1, 1), date_issue__lt=datetime.date(year + 1, 1, 1),
+        status__in=Invoice.SETTLED_STATUSES)
+
+    for relation in Invoice._meta.related_objects:
+        if relation.related_model not in ARCHIVE_MODELS:
+            queryset = queryset.exclude(pk__in=relation.related_model._default_manager.order_by()
+                                        .values(relation.field.attname))
+    return queryset
+
+
+def _move(cursor, model, where, params, quote):
+    archive_model = ARCHIVE_MODELS[model]
+    columns = ', '.join(quote(field.column) for field in model._meta.concrete_fields)
+    context = {
+        'archive': quote(archive_model._meta.db_table),
+        'table': quote(model._meta.db_table),
+        'columns': columns,
+        'where': where,
+    }
+    cursor.execute('INSERT INTO %(archive)s (%(columns)s) SELECT %(columns)s FROM %(table)s WHERE %(where)s' % context, params)
+    cursor.execute('DELETE FROM %(table)s WHERE %(where)s' % context, params)
+
+
+def archive_year(year, chunk_size=1000):
+    """
+    Moves settled invoices of ``year`` with their items, payments, snapshots and documents to archive tables,
+    chunk by chunk, every chunk in its own transaction.
+
+    :return: number of archived invoices
+    """
+    using = router.db_for_write(Invoice)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    ensure_archive_tables(using)
+
+    count = 0
+    while True:
+        with transaction.atomic(using=using):
+            invoices = list(archivable_invoices(year).using(using).select_for_update()
+                            .order_by('pk').values_list('pk', 'date_issue', 'type', 'status')[:chunk_size])
+            if not invoices:
+                return count
+
+            pks = [pk for pk, date_issue, invoice_type, status in invoices]
+            placeholders = ', '.join(['%s'] * len(pks))
+
+            with connection.cursor() as cursor:
+                _move(cursor, Item, '%s IN (%s)' % (quote('invoice_id'), placeholders), pks, quote)
+                _move(cursor, Payment, '%s IN (%s)' % (quote('invoice_id'), placeholders), pks, quote)
+                _move(cursor, InvoiceDocument, '%s IN (%s)' % (quote('invoice_id'), placeholders), pks, quote)
+                _move(cursor, DeliveryAttempt, '%s IN (%s)' % (quote('invoice_id'), placeholders), pks, quote)
+                _move(cursor, InvoiceSnapshot, '%s IN (%s)' % (quote('invoice_id'), placeholders), pks, quote)
+                _move(cursor, Invoice, '%s IN (%s)' % (quote('id'), placeholders), pks, quote)
+
+            changes = {}
+            for pk, date_issue, invoice_type, status in invoices:
+                key = (date_issue.year, date_issue.month, invoice_type, status)
+                changes[key] = changes.get(key, 0) - 1
+            InvoiceFacet.objects.using(using).adjust(changes)
+            OutboxEvent.objects.using(using).record_invoices(OutboxEvent.ACTION.ARCHIVED, pks)
+
+        count += len(invoices)
+
+
+class InvoicesIncludingArchive(object):
+    """
+    Invoices of live table (``Invoice`` instances) and archive table (``ArchivedInvoice`` instances
+    with the same fields) as one lazy collection. It can be filtered, ordered, counted and sliced
+    (so it can be paginated), both tables are queried for every evaluation. Ordered rows of the two
+    tables are merged; without ordering live invoices come first, in ``Invoice`` default order.
+    """
+
+    def __init__(self, live, archived, ordering=None):
+        self.live = live
+        self.archived = archived
+        self.ordering = tuple(ordering) if ordering is not None else tuple(Invoice._meta.ordering)
+
+    def _clone(self, method, *args, **kwargs):
+        return self.__class__(getattr(self.live, method)(*args, **kwargs),
+                              getattr(self.archived, method)(*args, **kwargs), self.ordering)
+
+    def filter(self, *args, **kwargs):
+        return self._clone('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._clone('exclude', *args, **kwargs)
+
+    def order_by(self, *field_names):
+        return self.__class__(self.live, self.archived, field_names)
+
+    def count(self):
+        return self.live.count() + self.archived.count()
+
+    def exists(self):
+        return self.live.exists() or self.archived.exists()
+
+    def __len__(self):
+        return self.count()
+
+    def _compare(self, first, second):
+        for field_name in self.ordering:
+            name = field_name.lstrip('-')
+            first_value, second_value = getattr(first, name), getattr(second, name)
+            result = (first_value > second_value) - (first_value < second_value)
+            if result:
+                return -result if field_name.startswith('-') else result
+        return 0
+
+    def _merge(self, stop=None):
+        live = self.live.order_by(*self.ordering)
+        archived = self.archived.order_by(*self.ordering)
+        if stop is not None:
+            live = live[:stop]
+            archived = archived[:stop]
+
+        live = live.iterator()
+        archived = archived.iterator()
+        first = next(live, None)
+        second = next(archived, None)
+        while first is not None and second is not None:
+            if self._compare(first, second) <= 0:
+                yield first
+                first = next(live, None)
+            else:
+                yield second
+                second = next(archived, None)
+
+        rest = live if first is not None else archived
+        for invoice in chain([first if first is not None else second], rest):
+            if invoice is not None:
+                yield invoice
+
+    def __iter__(self):
+        return self._merge()
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            if (k.start is not None and k.start < 0) or (k.stop is not None and k.stop < 0) or k.step is not None:
+                raise ValueError('Negative indexing and steps are not supported.')
+            return list(islice(self._merge(k.stop), k.start, k.stop))
+
+        if k < 0:
+            raise ValueError('Negative indexing is not supported.')
+        try:
+            return next(islice(self._merge(k + 1), k, None))
+        except StopIteration:
+            raise IndexError('Index out of range.')
+
+
+def including_archive(*args, **kwargs):
+    """
+    Invoices matching the filter in live and archive tables, see ``InvoicesIncludingArchive``.
+    """
+    return InvoicesIncludingArchive(Invoice.objects.filter(*args, **kwargs),
+                                    ArchivedInvoice.objects.filter(*args, **kwargs))
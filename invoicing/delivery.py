@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.utils import translation
+
+from invoicing.finalization import finalize, reopen
+from invoicing.formatters import registry as formatters
+from invoicing.models import DeliveryAttempt, Invoice
+
+
+# formats attached to email, names of ``settings.INVOICING_FORMATTERS``
+DEFAULT_DELIVERY_FORMATS = ('pdf',)
+
+
+def delivery_formats():
+    names = getattr(settings, 'INVOICING_DELIVERY_FORMATS', DEFAULT_DELIVERY_FORMATS)
+    unknown = [name for name in names if name not in formatters.formatters]
+    if unknown:
+        raise ImproperlyConfigured('Unknown invoice formats in INVOICING_DELIVERY_FORMATS: %s.' % ', '.join(unknown))
+    return names
+
+
+def pending_invoices(max_attempts=None):
+    """
+    Unsent invoices with digital delivery and customer email, except those which failed ``max_attempts`` times
+    (``settings.INVOICING_DELIVERY_MAX_ATTEMPTS``).
+    """
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'INVOICING_DELIVERY_MAX_ATTEMPTS', 5)
+
+    exhausted = list(DeliveryAttempt.objects.filter(status=DeliveryAttempt.STATUS.FAILED).order_by()
+                     .values('invoice').annotate(attempts=Count('id')).filter(attempts__gte=max_attempts)
+                     .values_list('invoice', flat=True))
+
+    return Invoice.objects.filter(
+        status__in=Invoice.STATUS_TRANSITIONS[Invoice.STATUS.SENT],
+        delivery_method=Invoice.DELIVERY_METHOD.DIGITAL,
+        customer_email__isnull=False
+    ).exclude(customer_email='').exclude(pk__in=exhausted)
+
+
+def build_message(invoice, connection=None):
+    """
+    Email with documents stored at finalization attached, so the customer gets exactly the frozen invoice.
+    Formats which are not stored are rendered through formatter cache; those whose optional dependency
+    is not installed (e.g. PDF without WeasyPrint) are not attached.
+    """
+    context = {'invoice': invoice}
+    with translation.override(invoice.language):
+        subject = ' '.join(render_to_string('invoicing/email/invoice_subject.txt', context).split())
+        body = render_to_string('invoicing/email/invoice_body.txt', context)
+
+    message = EmailMessage(subject, body, getattr(settings, 'INVOICING_DELIVERY_FROM_EMAIL', None),
+                           [invoice.customer_email], connection=connection,
+                           reply_to=[invoice.issuer_email] if invoice.issuer_email else None)
+
+    for name in delivery_formats():
+        formatter = formatters.formatters[name](invoice)
+        try:
+            content = formatter.get_stored_content()
+            if content is None:
+                content = formatter.get_cached_content()
+        except ImproperlyConfigured:
+            continue
+        message.attach(formatter.get_filename(), content, formatter.content_type.split(';')[0])
+
+    return message
+
+
+def send_batch(invoices, connection):
+    """
+    Sends invoices one message after another over already opened connection.
+    Failure of a message is recorded and does not stop the batch.
+
+    :return: list of unsaved ``DeliveryAttempt``
+    """
+    attempts = []
+    for invoice in invoices:
+        attempt = DeliveryAttempt(invoice=invoice, recipient=invoice.customer_email, status=DeliveryAttempt.STATUS.SENT)
+        try:
+            build_message(invoice, connection).send()
+        except Exception as e:
+            attempt.status = DeliveryAttempt.STATUS.FAILED
+            attempt.error = '%s: %s' % (e.__class__.__name__, e)
+        attempts.append(attempt)
+    return attempts
+
+
+def deliver(queryset=None, batch_size=100):
+    """
+    Emails pending invoices in batches. Every batch is finalized first and sent over one connection
+    of ``EMAIL_BACKEND``, then its attempts are inserted in bulk, delivered invoices are marked sent
+    by one bulk transition and invoices which failed are reopened, so they can still be corrected.
+
+    :return: tuple (number of sent invoices, number of failed invoices)
+    """
+    if queryset is None:
+        queryset = pending_invoices()
+
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+    connection = get_connection()
+    sent = failed = 0
+
+    for start in range(0, len(pks), batch_size):
+        finalize(pks[start:start + batch_size], unsent=True)
+        invoices = list(Invoice.objects.filter(pk__in=pks[start:start + batch_size]).order_by('pk'))
+
+        connection.open()
+        try:
+            attempts = send_batch(invoices, connection)
+        finally:
+            connection.close()
+
+        delivered = [attempt.invoice_id for attempt in attempts if attempt.status == DeliveryAttempt.STATUS.SENT]
+        undelivered = [attempt.invoice_id for attempt in attempts if attempt.status != DeliveryAttempt.STATUS.SENT]
+        with transaction.atomic():
+            DeliveryAttempt.objects.bulk_create(attempts)
+            Invoice.objects.filter(pk__in=delivered).mark_sent()
+            reopen(undelivered)
+
+        sent += len(delivered)
+        failed += len(attempts) - len(delivered)
+
+    return sent, failed
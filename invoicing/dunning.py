@@ -0,0 +1,140 @@
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.template.loader import render_to_string
+from django.utils import translation
+
+from invoicing.models import Invoice, Reminder, date_today
+
+
+# overdue days from which reminders of level 1, 2, 3, ... are sent
+DEFAULT_DUNNING_LEVELS = (7, 21, 45)
+
+REMINDER_FIELDS = ('id', 'full_number', 'customer_name', 'customer_email', 'currency', 'language',
+                   'date_due', 'balance_due', 'dunning_level')
+
+
+def dunning_levels():
+    return tuple(getattr(settings, 'INVOICING_DUNNING_LEVELS', DEFAULT_DUNNING_LEVELS))
+
+
+def level_for(overdue_days, levels):
+    """
+    Highest level whose overdue days were reached, 0 if none.
+    """
+    level = 0
+    for index, days in enumerate(levels, 1):
+        if overdue_days >= days:
+            level = index
+    return level
+
+
+def due_reminders(today=None):
+    """
+    Reminders due on ``today``. Overdue invoices are loaded by one query served by (status, date_due) index
+    and grouped per customer (email, or name without email) and currency. Reminder is due if any invoice
+    of the group reached higher level than in the last reminder; it lists all overdue invoices of the group.
+
+    :return: list of unsaved ``Reminder`` with ``invoices`` (list of dicts) and ``invoice_levels``
+        (dict of invoice id: level reached)
+    """
+    today = today or date_today()
+    levels = dunning_levels()
+
+    groups = OrderedDict()
+    rows = Invoice.objects.get_queryset().overdue(today).filter(balance_due__gt=0)\
+        .order_by('date_due').values(*REMINDER_FIELDS)
+    for row in rows:
+        key = ((row['customer_email'] or '').lower() or row['customer_name'], row['currency'])
+        groups.setdefault(key, []).append(row)
+
+    reminders = []
+    for rows in groups.values():
+        invoice_levels = dict((row['id'], level_for((today - row['date_due']).days, levels)) for row in rows)
+        if not any(invoice_levels[row['id']] > row['dunning_level'] for row in rows):
+            continue
+
+        reminder = Reminder(
+            customer_name=rows[0]['customer_name'],
+            recipient=rows[0]['customer_email'],
+            currency=rows[0]['currency'],
+            level=max(invoice_levels.values()),
+            outstanding=sum(row['balance_due'] for row in rows),
+            invoice_ids=[row['id'] for row in rows]
+        )
+        reminder.invoices = rows
+        reminder.invoice_levels = invoice_levels
+        reminders.append(reminder)
+
+    return reminders
+
+
+def build_message(reminder, connection=None):
+    context = {'reminder': reminder, 'invoices': reminder.invoices}
+    with translation.override(reminder.invoices[0]['language']):
+        subject = ' '.join(render_to_string('invoicing/email/reminder_subject.txt', context).split())
+        body = render_to_string('invoicing/email/reminder_body.txt', context)
+
+    return EmailMessage(subject, body, getattr(settings, 'INVOICING_DELIVERY_FROM_EMAIL', None),
+                        [reminder.recipient], connection=connection)
+
+
+def _raise_levels(reminders):
+    """
+    Stores level reached by invoices of reminders (which were not failed) by one UPDATE query.
+    """
+    changes = {}
+    for reminder in reminders:
+        if reminder.status == Reminder.STATUS.FAILED:
+            continue
+        for row in reminder.invoices:
+            level = reminder.invoice_levels[row['id']]
+            if level > row['dunning_level']:
+                changes.setdefault(level, []).append(row['id'])
+
+    if changes:
+        Invoice.objects.filter(pk__in=[pk for pks in changes.values() for pk in pks]).update(dunning_level=Case(
+            *[When(pk__in=pks, then=Value(level)) for level, pks in changes.items()],
+            output_field=IntegerField()
+        ))
+
+
+def send_reminders(today=None, batch_size=100):
+    """
+    Emails due reminders in batches over one connection per batch and stores them with levels of their invoices.
+    Failed reminders are stored with the error and the invoices keep their level, so the next run retries them.
+    Reminders of customers without email are stored as not sent.
+
+    :return: list of stored reminders
+    """
+    reminders = due_reminders(today)
+    connection = get_connection()
+
+    for start in range(0, len(reminders), batch_size):
+        batch = reminders[start:start + batch_size]
+
+        connection.open()
+        try:
+            for reminder in batch:
+                if not reminder.recipient:
+                    continue
+                try:
+                    build_message(reminder, connection).send()
+                    reminder.status = Reminder.STATUS.SENT
+                except Exception as e:
+                    reminder.status = Reminder.STATUS.FAILED
+                    reminder.error = '%s: %s' % (e.__class__.__name__, e)
+        finally:
+            connection.close()
+
+        with transaction.atomic():
+            Reminder.objects.bulk_create(batch)
+            _raise_levels(batch)
+
+    return reminders
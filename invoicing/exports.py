@@ -0,0 +1,151 @@
+import csv
+import json
+from decimal import Decimal
+
+from django.utils import six
+from django.utils.encoding import force_text
+
+from invoicing.formatters.data import InvoiceJSONEncoder
+from invoicing.models import Invoice, InvoiceSnapshot, Item
+
+
+TWO_PLACES = Decimal('0.01')
+
+
+def keyset_chunks(queryset, fields, chunk_size=2000):
+    """
+    Iterates ``values()`` of queryset in chunks ordered by primary key.
+    Each chunk is fetched by ``pk > last pk`` condition, so the cost of a chunk
+    does not grow with its position and only one chunk is kept in memory.
+    """
+    queryset = queryset.order_by('pk').values(*fields)
+    last_pk = None
+
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+
+        if not rows:
+            return
+
+        yield rows
+        last_pk = rows[-1]['id']
+
+
+def _round(value):
+    return Decimal(value or 0).quantize(TWO_PLACES)
+
+
+class InvoiceExport(object):
+    """
+    Exports invoices with totals frozen at finalization, or computed in database for invoices
+    not finalized yet (one aggregate query per chunk).
+    """
+    fields = (
+        'id', 'type', 'number', 'full_number', 'status', 'date_issue', 'date_tax_point', 'date_due',
+        'currency', 'credit', 'payment_method', 'variable_symbol', 'specific_symbol', 'constant_symbol', 'reference',
+        'customer_name', 'customer_country', 'customer_registration_id', 'customer_tax_id', 'customer_vat_id'
+    )
+    total_fields = ('subtotal', 'vat', 'total')
+    date_field = 'date_issue'
+
+    def __init__(self, queryset=None, chunk_size=2000, date_from=None, date_to=None):
+        if queryset is None:
+            queryset = self.get_queryset()
+        if date_from:
+            queryset = queryset.filter(**{self.date_field + '__gte': date_from})
+        if date_to:
+            queryset = queryset.filter(**{self.date_field + '__lte': date_to})
+        self.queryset = queryset
+        self.chunk_size = chunk_size
+
+    def get_queryset(self):
+        return Invoice.objects.all()
+
+    @property
+    def columns(self):
+        return self.fields + self.total_fields
+
+    def rows(self):
+        for chunk in keyset_chunks(self.queryset, self.fields, self.chunk_size):
+            pks = [row['id'] for row in chunk]
+            frozen = dict((pk, (subtotal, vat, total)) for pk, subtotal, vat, total in
+                          InvoiceSnapshot.objects.filter(invoice__in=pks).values_list('invoice', 'subtotal', 'vat', 'total'))
+            totals = Item.objects.filter(invoice__in=[pk for pk in pks if pk not in frozen]).totals_by_invoice()
+
+            for row in chunk:
+                if row['id'] in frozen:
+                    row['subtotal'], row['vat'], row['total'] = frozen[row['id']]
+                    yield row
+                    continue
+
+                invoice_totals = totals.get(row['id'], {'base': 0, 'vat': 0})
+                row['subtotal'] = _round(invoice_totals['base'])
+                row['vat'] = _round(invoice_totals['vat'])
+                row['total'] = row['subtotal'] + row['vat'] - _round(row['credit'])
+                yield row
+
+
+class ItemExport(InvoiceExport):
+    """
+    Exports invoice items with line totals computed in database.
+    """
+    fields = (
+        'id', 'invoice', 'title', 'quantity', 'unit', 'unit_price', 'discount', 'tax_rate', 'tag', 'weight'
+    )
+    date_field = 'invoice__date_issue'
+
+    def get_queryset(self):
+        return Item.objects.all()
+
+    def rows(self):
+        for chunk in keyset_chunks(self.queryset.with_totals(), self.fields + ('base_amount', 'vat_amount'), self.chunk_size):
+            for row in chunk:
+                row['subtotal'] = _round(row.pop('base_amount'))
+                row['vat'] = _round(row.pop('vat_amount'))
+                row['total'] = row['subtotal'] + row['vat']
+                yield row
+
+
+class Echo(object):
+    """
+    File-like object returning written value instead of storing it.
+    """
+    def write(self, value):
+        return value
+
+
+class CSVWriter(object):
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def _value(self, value):
+        value = u'' if value is None else force_text(value)
+        return value.encode('utf-8') if six.PY2 else value
+
+    def lines(self, export):
+        writer = csv.writer(Echo())
+        yield writer.writerow([self._value(column) for column in export.columns])
+
+        for row in export.rows():
+            yield writer.writerow([self._value(row[column]) for column in export.columns])
+
+
+class JSONLinesWriter(object):
+    content_type = 'application/x-ndjson; charset=utf-8'
+    extension = 'jsonl'
+
+    def lines(self, export):
+        for row in export.rows():
+            yield json.dumps(row, cls=InvoiceJSONEncoder) + '\n'
+
+
+EXPORTS = {
+    'invoices': InvoiceExport,
+    'items': ItemExport,
+}
+
+WRITERS = {
+    'csv': CSVWriter,
+    'jsonl': JSONLinesWriter,
+}
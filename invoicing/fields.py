@@ -1,6 +1,10 @@
+import json
+
 from django import forms
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import six
 from django.utils.translation import ugettext_lazy as _
 
 from .validators import VATValidator
@@ -60,3 +64,93 @@ class VATFormField(forms.CharField):
             return value.replace(' ', '').upper()
         except AttributeError:
             return value
+
+
+class RawJSON(six.text_type):
+    """
+    JSON document loaded from database, not decoded yet.
+    """
+
+
+class LazyJSONDescriptor(object):
+    """
+    Decodes raw JSON value of the field on first attribute access and keeps the result.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        value = instance.__dict__.get(self.field.attname)
+        if isinstance(value, RawJSON):
+            value = self.field.loads(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class LazyJSONField(models.TextField):
+    """
+    JSON field compatible with ``jsonfield.JSONField`` storage, which decodes values lazily.
+    Values are loaded from database as raw strings and parsed only when the attribute is read,
+    unchanged values are saved back without encoding.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.load_kwargs = kwargs.pop('load_kwargs', {})
+        self.dump_kwargs = kwargs.pop('dump_kwargs', {'cls': DjangoJSONEncoder, 'separators': (',', ':')})
+        super(LazyJSONField, self).__init__(*args, **kwargs)
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super(LazyJSONField, self).contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.name, LazyJSONDescriptor(self))
+
+    def loads(self, value):
+        return json.loads(value, **self.load_kwargs)
+
+    def dumps(self, value, **kwargs):
+        dump_kwargs = dict(self.dump_kwargs, **kwargs)
+        return json.dumps(value, **dump_kwargs)
+
+    def from_db_value(self, value, expression, connection, context):
+        if value is None:
+            return None
+        return RawJSON(value)
+
+    def to_python(self, value):
+        if isinstance(value, six.string_types) and not isinstance(value, RawJSON):
+            try:
+                return self.loads(value)
+            except ValueError:
+                raise ValidationError(_(u'Enter valid JSON'))
+        return value
+
+    def get_prep_value(self, value):
+        if value is None and self.null:
+            return None
+        if isinstance(value, RawJSON):
+            return six.text_type(value)
+        return self.dumps(value)
+
+    def value_from_object(self, obj):
+        value = super(LazyJSONField, self).value_from_object(obj)
+        if value is None and self.null:
+            return None
+        return self.dumps(value, indent=2)
+
+    def value_to_string(self, obj):
+        return self.get_prep_value(getattr(obj, self.attname))
+
+    def formfield(self, **kwargs):
+        from jsonfield.fields import JSONFormField
+
+        defaults = {'form_class': JSONFormField}
+        defaults.update(kwargs)
+        field = super(LazyJSONField, self).formfield(**defaults)
+        field.load_kwargs = self.load_kwargs
+        return field
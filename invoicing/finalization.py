@@ -0,0 +1,158 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router, transaction
+from django.utils.encoding import force_bytes
+
+from invoicing.formatters import registry as formatters
+from invoicing.models import Invoice, InvoiceDocument, InvoiceSnapshot, Item
+
+
+TWO_PLACES = Decimal('0.01')
+
+# formats rendered and stored at finalization, names of ``settings.INVOICING_FORMATTERS``
+DEFAULT_SNAPSHOT_FORMATS = ('bootstrap', 'pdf')
+
+# statuses of invoices which are not finalized
+UNSENT_STATUSES = (Invoice.STATUS.NEW, Invoice.STATUS.RETURNED)
+
+
+def _round(value):
+    return Decimal(value or 0).quantize(TWO_PLACES)
+
+
+def snapshot_formats():
+    names = getattr(settings, 'INVOICING_SNAPSHOT_FORMATS', DEFAULT_SNAPSHOT_FORMATS)
+    unknown = [name for name in names if name not in formatters.formatters]
+    if unknown:
+        raise ImproperlyConfigured('Unknown invoice formats in INVOICING_SNAPSHOT_FORMATS: %s.' % ', '.join(unknown))
+    return names
+
+
+def render_documents(invoice):
+    """
+    Renders invoice by formatters of snapshot formats. Formats whose optional dependency
+    is not installed (e.g. PDF without WeasyPrint) are skipped.
+
+    :return: list of unsaved ``InvoiceDocument``
+    """
+    documents = []
+    for name in snapshot_formats():
+        formatter = formatters.formatters[name](invoice)
+        try:
+            content = b''.join(force_bytes(chunk) for chunk in formatter.get_chunks())
+        except ImproperlyConfigured:
+            continue
+
+        data, checksum = InvoiceDocument.compress(content)
+        documents.append(InvoiceDocument(invoice=invoice, format=name, content_type=formatter.content_type,
+                                         data=data, checksum=checksum))
+    return documents
+
+
+def freeze(invoice, documents):
+    """
+    Computes totals of invoice rounded per tax rate by single query.
+
+    :return: unsaved ``InvoiceSnapshot``
+    """
+    vat_summary = [
+        {'tax_rate': str(row['tax_rate']) if row['tax_rate'] is not None else None,
+         'base': str(_round(row['base'])), 'vat': str(_round(row['vat']))}
+        for row in Item.objects.using(invoice._state.db).filter(invoice=invoice).totals_by_tax_rate()
+    ]
+    subtotal = sum((Decimal(row['base']) for row in vat_summary), Decimal(0))
+    vat = sum((Decimal(row['vat']) for row in vat_summary), Decimal(0))
+
+    snapshot = InvoiceSnapshot(invoice=invoice, subtotal=subtotal, vat=vat,
+                               total=subtotal + vat - _round(invoice.credit), vat_summary=vat_summary)
+    snapshot.checksum = snapshot.get_checksum(dict((document.format, document.checksum) for document in documents))
+    return snapshot
+
+
+def finalize(pks, using=None, chunk_size=100, unsent=False, attempts=3):
+    """
+    Freezes totals, VAT breakdown and rendered documents of invoices which are not finalized yet.
+    Snapshots and documents of every chunk are inserted in bulk and balances are recomputed from frozen totals.
+    Only sent invoices are finalized unless ``unsent`` is set (e.g. right before invoices are emailed,
+    see ``invoicing.delivery.deliver()``).
+
+    Documents of a chunk are rendered before its invoices are locked. Then the rows are locked and
+    snapshots are stored only for invoices which are still unfinalized and were not modified meanwhile;
+    modified invoices are rendered again, at most ``attempts`` times. Invoices left unfinalized
+    (e.g. by crash or by too many concurrent changes) are finalized by ``finalize_pending()``.
+
+    :return: number of finalized invoices
+    """
+    using = using or router.db_for_write(Invoice)
+    pks = list(pks)
+    count = 0
+
+    for start in range(0, len(pks), chunk_size):
+        pending = pks[start:start + chunk_size]
+
+        for attempt in range(attempts):
+            invoices = list(_unfinalized(pending, using, unsent))
+            if not invoices:
+                break
+
+            rendered = {}
+            for invoice in invoices:
+                invoice_documents = render_documents(invoice)
+                rendered[invoice.pk] = (invoice.modified, freeze(invoice, invoice_documents), invoice_documents)
+
+            with transaction.atomic(using=using):
+                versions = dict(_unfinalized(rendered.keys(), using, unsent, lock=True).values_list('pk', 'modified'))
+                stored = [pk for pk, (modified, snapshot, documents) in rendered.items() if versions.get(pk) == modified]
+                if stored:
+                    InvoiceSnapshot.objects.using(using).bulk_create([rendered[pk][1] for pk in stored])
+                    InvoiceDocument.objects.using(using).bulk_create(
+                        [document for pk in stored for document in rendered[pk][2]])
+                    Invoice.objects.using(using).filter(pk__in=stored).update_balances()
+                    count += len(stored)
+
+            # invoices finalized, returned or modified meanwhile
+            pending = [pk for pk in rendered if pk not in stored and pk in versions]
+
+    return count
+
+
+def _unfinalized(pks, using, unsent=False, lock=False):
+    invoices = Invoice.objects.using(using).filter(pk__in=list(pks), snapshot__isnull=True)
+    if lock:
+        invoices = invoices.select_for_update()
+    if not unsent:
+        # invoice returned meanwhile is finalized when it is sent again
+        invoices = invoices.exclude(status__in=UNSENT_STATUSES)
+    return invoices
+
+
+def finalize_pending(using=None, chunk_size=100):
+    """
+    Finalizes all sent (or later settled) invoices which were not finalized yet.
+
+    :return: number of finalized invoices
+    """
+    using = using or router.db_for_write(Invoice)
+    pks = Invoice.objects.using(using).filter(date_sent__isnull=False, snapshot__isnull=True)\
+        .exclude(status__in=UNSENT_STATUSES).order_by('pk').values_list('pk', flat=True)
+    return finalize(list(pks), using, chunk_size)
+
+
+def reopen(pks, using=None):
+    """
+    Drops snapshots and stored documents of returned invoices (or invoices whose delivery failed).
+    Returned invoice can be corrected and it is finalized again when it is sent next time.
+    Must be called in the transaction changing the status.
+
+    :return: number of reopened invoices
+    """
+    using = using or router.db_for_write(Invoice)
+    pks = list(InvoiceSnapshot.objects.using(using).filter(invoice__in=list(pks)).values_list('invoice_id', flat=True))
+    if pks:
+        InvoiceDocument.objects.using(using).filter(invoice__in=pks).delete()
+        InvoiceSnapshot.objects.using(using).filter(invoice__in=pks).delete()
+        Invoice.objects.using(using).filter(pk__in=pks).update_balances()
+    return len(pks)
+
@@ -1,6 +1,215 @@
+import re
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.encoding import force_bytes
+
+from invoicing.routers import read_replica, read_replica_iterator
+from invoicing.utils import import_name
+
+
+DEFAULT_FORMATTERS = (
+    ('html', 'invoicing.formatters.html.HTMLFormatter'),
+    ('bootstrap', 'invoicing.formatters.html.BootstrapHTMLFormatter'),
+    ('pdf', 'invoicing.formatters.pdf.PDFFormatter'),
+    ('json', 'invoicing.formatters.data.JSONFormatter'),
+    ('ubl', 'invoicing.formatters.ubl.UBLFormatter'),
+    ('isdoc', 'invoicing.formatters.ubl.ISDOCFormatter'),
+)
+
+
 class InvoiceFormatter(object):
+    """
+    Base class for invoice output formats.
+
+    Subclasses declare how their output may be served:
+
+    * ``cacheable`` -- rendered content can be stored in cache until the invoice or its items change,
+    * ``streamable`` -- content is produced chunk by chunk by ``get_chunks()`` and sent as it is generated.
+    """
+    content_type = 'text/html; charset=utf-8'
+    extension = 'html'
+    cacheable = False
+    streamable = False
+
     def __init__(self, invoice):
         self.invoice = invoice
 
-    def get_response(self):
+    def get_content(self):
         raise NotImplementedError()
+
+    def get_filename(self):
+        return '%s.%s' % (re.sub(r'[^\w-]+', '-', self.invoice.full_number).strip('-'), self.extension)
+
+    def get_chunks(self):
+        yield self.get_content()
+
+    def get_cache_key(self):
+        """
+        Cache key changes whenever invoice is modified. Changes of items and payments modify the invoice
+        too, because they recompute its balance (see ``InvoiceQuerySet.update_balances()``).
+        """
+        version = self.invoice.modified.isoformat()
+        return 'invoicing:%s.%s:%s:%s' % (self.__class__.__module__, self.__class__.__name__, self.invoice.pk, version)
+
+    def get_cached_content(self):
+        if not self.cacheable:
+            return self.get_content()
+
+        key = self.get_cache_key()
+        content = cache.get(key)
+
+        if content is None:
+            content = force_bytes(self.get_content())
+            cache.set(key, content, getattr(settings, 'INVOICING_FORMATTER_CACHE_TIMEOUT', 60 * 60 * 24))
+
+        return content
+
+    def get_stored_content(self):
+        """
+        Content rendered when the invoice was finalized, if this format is stored (see ``invoicing.finalization``).
+        """
+        from invoicing.models import InvoiceDocument
+
+        names = [name for name, formatter_class in registry.formatters.items() if formatter_class is self.__class__]
+        document = InvoiceDocument.objects.filter(invoice=self.invoice, format__in=names).first()
+        return document.get_content() if document is not None else None
+
+    def get_response(self):
+        """
+        Serves document stored for finalized invoice, otherwise renders invoice
+        with reads sent to replica databases (see ``invoicing.routers``).
+        """
+        with read_replica():
+            content = self.get_stored_content()
+
+            if content is None and not self.streamable:
+                content = self.get_cached_content()
+
+        if content is None:
+            return StreamingHttpResponse(read_replica_iterator(self.get_chunks()), content_type=self.content_type)
+        return HttpResponse(content, content_type=self.content_type)
+
+
+class NotAcceptable(Exception):
+    """
+    None of formats requested by ``?format=`` parameter or ``Accept`` header is available.
+    """
+
+
+class FormatterRegistry(object):
+    """
+    Keeps formatter classes configured by ``settings.INVOICING_FORMATTERS`` (mapping of format name to class path).
+    Classes are imported only once per process, when the app is ready (see ``invoicing.apps``),
+    so misconfigured formatters fail at startup.
+    """
+
+    def __init__(self):
+        self._formatters = None
+        self._default = None
+
+    def populate(self):
+        if self._formatters is not None:
+            return
+
+        formatters = OrderedDict()
+        for name, path in OrderedDict(getattr(settings, 'INVOICING_FORMATTERS', DEFAULT_FORMATTERS)).items():
+            formatters[name] = import_name(path)
+
+        default_path = getattr(settings, 'INVOICING_FORMATTER', 'invoicing.formatters.html.BootstrapHTMLFormatter')
+        default_class = import_name(default_path)
+        default = None
+        for name, formatter_class in formatters.items():
+            if formatter_class is default_class:
+                default = name
+                break
+
+        if default is None:
+            default = 'default'
+            formatters[default] = default_class
+
+        self._default = default
+        self._formatters = formatters
+
+    @property
+    def formatters(self):
+        self.populate()
+        return self._formatters
+
+    @property
+    def default(self):
+        self.populate()
+        return self._default
+
+    def get(self, name):
+        try:
+            return self.formatters[name]
+        except KeyError:
+            raise Http404('Unknown invoice format "%s".' % name)
+
+    def get_by_content_type(self, content_type):
+        """
+        Formatter class of media type, which may be wildcard (``*/*`` or e.g. ``application/*``).
+        Default formatter is preferred if it matches.
+        """
+        def matches(formatter_class):
+            main_type, _, sub_type = formatter_class.content_type.split(';')[0].partition('/')
+            return content_type in ('*/*', '%s/*' % main_type, '%s/%s' % (main_type, sub_type))
+
+        default_class = self.formatters[self.default]
+        if matches(default_class):
+            return default_class
+
+        for formatter_class in self.formatters.values():
+            if matches(formatter_class):
+                return formatter_class
+        return None
+
+    def negotiate(self, request):
+        """
+        Picks formatter class by ``?format=`` query parameter or by ``Accept`` header of the request
+        (media types in order of their quality). Without either falls back to ``settings.INVOICING_FORMATTER``.
+
+        :raises NotAcceptable: if the format is unknown or no media type of ``Accept`` header is available
+        """
+        name = request.GET.get('format', None)
+        if name:
+            if name not in self.formatters:
+                raise NotAcceptable('Unknown invoice format "%s".' % name)
+            return self.formatters[name]
+
+        accept = request.META.get('HTTP_ACCEPT', '').strip()
+        if not accept:
+            return self.formatters[self.default]
+
+        for content_type in parse_accept_header(accept):
+            formatter_class = self.get_by_content_type(content_type)
+            if formatter_class is not None:
+                return formatter_class
+
+        raise NotAcceptable('No invoice format matches "%s".' % accept)
+
+
+def parse_accept_header(accept):
+    """
+    Returns media types from ``Accept`` header ordered by their quality.
+    """
+    media_types = []
+    for position, media_range in enumerate(accept.split(',')):
+        parts = media_range.strip().split(';')
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if parts[0] and quality > 0:
+            media_types.append((-quality, position, parts[0].strip().lower()))
+    return [media_type for quality, position, media_type in sorted(media_types)]
+
+
+registry = FormatterRegistry()
@@ -0,0 +1,48 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.encoding import force_text
+
+from . import InvoiceFormatter
+
+
+class InvoiceJSONEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        try:
+            return super(InvoiceJSONEncoder, self).default(o)
+        except TypeError:
+            # countries, lazy translations, ...
+            return force_text(o)
+
+
+class JSONFormatter(InvoiceFormatter):
+    """
+    Serializes invoice, its items and VAT summary into JSON document.
+    Items are streamed one by one, so large invoices are never kept in memory as a whole.
+    """
+    content_type = 'application/json'
+    extension = 'json'
+    streamable = True
+    item_fields = ('id', 'title', 'quantity', 'unit', 'unit_price', 'discount', 'tax_rate', 'tag', 'weight')
+
+    def dumps(self, data):
+        return json.dumps(data, cls=InvoiceJSONEncoder)
+
+    def get_invoice_data(self):
+        return dict((field.attname, field.value_from_object(self.invoice)) for field in self.invoice._meta.fields)
+
+    def get_items(self):
+        return self.invoice.item_set.values(*self.item_fields).iterator()
+
+    def get_chunks(self):
+        yield '{"invoice": %s, "items": [' % self.dumps(self.get_invoice_data())
+
+        separator = ''
+        for item in self.get_items():
+            yield separator + self.dumps(item)
+            separator = ', '
+
+        yield '], "vat_summary": %s}' % self.dumps(self.invoice.vat_summary)
+
+    def get_content(self):
+        return ''.join(self.get_chunks())
@@ -6,6 +6,7 @@ from . import InvoiceFormatter
 
 class HTMLFormatter(InvoiceFormatter):
     template_name = 'invoicing/formatters/html.html'
+    cacheable = True
 
     def get_data(self):
         return {
@@ -13,13 +14,16 @@ class HTMLFormatter(InvoiceFormatter):
             "INVOICING_DATE_FORMAT_TAG": "d.m.Y"  # TODO: move to settings
         }
 
-    def get_response(self, context={}):
+    def get_content(self, context=None):
         template = loader.get_template(self.template_name)
         data = self.get_data()
-        data.update(context)
-        context = Context(data)
-        response_data = template.render(context)
-        return HttpResponse(response_data)
+        data.update(context or {})
+        return template.render(Context(data))
+
+    def get_response(self, context=None):
+        if context:
+            return HttpResponse(self.get_content(context), content_type=self.content_type)
+        return super(HTMLFormatter, self).get_response()
 
 
 class BootstrapHTMLFormatter(HTMLFormatter):
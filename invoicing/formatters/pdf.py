@@ -1,5 +1,24 @@
-from . import InvoiceFormatter
+from django.core.exceptions import ImproperlyConfigured
 
+from .html import BootstrapHTMLFormatter
 
-class PDFFormatter(InvoiceFormatter):
-    pass
\ No newline at end of file
+try:
+    from weasyprint import HTML
+except ImportError:
+    HTML = None
+
+
+class PDFFormatter(BootstrapHTMLFormatter):
+    """
+    Renders HTML invoice into PDF document. Requires WeasyPrint.
+    """
+    content_type = 'application/pdf'
+    extension = 'pdf'
+    cacheable = True
+
+    def get_content(self, context=None):
+        if HTML is None:
+            raise ImproperlyConfigured("PDFFormatter requires WeasyPrint to be installed.")
+
+        html = super(PDFFormatter, self).get_content(context)
+        return HTML(string=html).write_pdf()
@@ -0,0 +1,446 @@
+import os
+import uuid
+from decimal import Decimal
+from xml.sax.saxutils import XMLGenerator
+
+from django.utils.encoding import force_str, force_text
+
+from . import InvoiceFormatter
+
+
+TWO_PLACES = Decimal('0.01')
+
+
+def amount(value):
+    return force_text(Decimal(value or 0).quantize(TWO_PLACES))
+
+
+class XMLStreamWriter(object):
+    """
+    Writes XML elements one by one. Written data is collected only until ``drain()`` is called.
+    """
+
+    def __init__(self, encoding='utf-8'):
+        self.chunks = []
+        self.generator = XMLGenerator(self, encoding)
+        self.generator.startDocument()
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+    def start(self, name, attrs=None):
+        self.generator.startElement(name, attrs or {})
+
+    def end(self, name):
+        self.generator.endElement(name)
+
+    def element(self, name, value, attrs=None):
+        """
+        Writes simple element with text content. Empty values are skipped.
+        """
+        if value is None or value == '':
+            return
+        self.start(name, attrs)
+        self.generator.characters(force_text(value))
+        self.end(name)
+
+
+class XMLFormatter(InvoiceFormatter):
+    """
+    Base class for structured e-invoice formats. Document is serialized incrementally,
+    invoice lines are read from database by iterator and written as they come.
+    """
+    content_type = 'application/xml; charset=utf-8'
+    streamable = True
+    extension = 'xml'
+    item_fields = ('id', 'title', 'quantity', 'unit', 'unit_price', 'discount', 'tax_rate', 'base_amount', 'vat_amount')
+    unit_codes = {
+        'EMPTY': 'C62',
+        'PIECES': 'C62',
+        'HOURS': 'HUR',
+    }
+
+    def get_items(self):
+        return self.invoice.item_set.all().with_totals().values(*self.item_fields).iterator()
+
+    def get_tax_subtotals(self):
+        """
+        VAT breakdown aggregated from the same items as the lines, so totals always match the lines.
+        Documents of finalized invoices are frozen by storing the format (``settings.INVOICING_SNAPSHOT_FORMATS``).
+        """
+        return self.invoice.item_set.all().totals_by_tax_rate()
+
+    def get_totals(self, tax_subtotals):
+        base = sum(Decimal(subtotal['base'] or 0).quantize(TWO_PLACES) for subtotal in tax_subtotals)
+        vat = sum(Decimal(subtotal['vat'] or 0).quantize(TWO_PLACES) for subtotal in tax_subtotals)
+        credit = Decimal(self.invoice.credit or 0).quantize(TWO_PLACES)
+        return {
+            'base': base,
+            'vat': vat,
+            'total': base + vat,
+            'credit': credit,
+            'payable': base + vat - credit,
+        }
+
+    def get_chunks(self):
+        raise NotImplementedError()
+
+    def get_content(self):
+        return b''.join(self.get_chunks())
+
+    @classmethod
+    def write_files(cls, queryset, directory):
+        """
+        Writes every invoice of queryset into separate file in ``directory``.
+
+        :return: list of written file paths
+        """
+        paths = []
+        for invoice in queryset.iterator():
+            formatter = cls(invoice)
+            path = os.path.join(directory, formatter.get_filename())
+            with open(path, 'wb') as output:
+                for chunk in formatter.get_chunks():
+                    output.write(chunk)
+            paths.append(path)
+        return paths
+
+
+class UBLFormatter(XMLFormatter):
+    """
+    UBL 2.1 invoice (http://docs.oasis-open.org/ubl/UBL-2.1.html). VAT credit notes are written
+    as ``CreditNote`` documents.
+    """
+    NAMESPACES = {
+        'xmlns': 'urn:oasis:names:specification:ubl:schema:xsd:Invoice-2',
+        'xmlns:cac': 'urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2',
+        'xmlns:cbc': 'urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2',
+    }
+    CREDIT_NOTE_NAMESPACE = 'urn:oasis:names:specification:ubl:schema:xsd:CreditNote-2'
+    TYPE_CODES = {
+        'INVOICE': '380',
+        'ADVANCE': '386',
+        'PROFORMA': '325',
+        'VAT_CREDIT_NOTE': '381',
+    }
+    PAYMENT_MEANS_CODES = {
+        'BANK_TRANSFER': '58',
+        'CASH': '10',
+        'CASH_ON_DELIVERY': '10',
+        'PAYMENT_CARD': '48',
+    }
+
+    def tax_category(self, tax_rate):
+        if tax_rate is None:
+            return 'O'  # tax not applicable, e.g. supplier is not VAT payer
+        if tax_rate == 0:
+            return 'Z'
+        return 'S'
+
+    def write_tax_category(self, writer, element, tax_rate):
+        writer.start(element)
+        writer.element('cbc:ID', self.tax_category(tax_rate))
+        if tax_rate is not None:
+            writer.element('cbc:Percent', tax_rate)
+        writer.start('cac:TaxScheme')
+        writer.element('cbc:ID', 'VAT')
+        writer.end('cac:TaxScheme')
+        writer.end(element)
+
+    def write_party(self, writer, element, prefix):
+        invoice = self.invoice
+        value = lambda name: getattr(invoice, '%s_%s' % (prefix, name))
+        country = value('country')
+
+        writer.start(element)
+        writer.start('cac:Party')
+        writer.start('cac:PartyName')
+        writer.element('cbc:Name', value('name'))
+        writer.end('cac:PartyName')
+        writer.start('cac:PostalAddress')
+        writer.element('cbc:StreetName', value('street'))
+        writer.element('cbc:CityName', value('city'))
+        writer.element('cbc:PostalZone', value('zip'))
+        if country:
+            writer.start('cac:Country')
+            writer.element('cbc:IdentificationCode', country.code)
+            writer.end('cac:Country')
+        writer.end('cac:PostalAddress')
+        if value('vat_id'):
+            writer.start('cac:PartyTaxScheme')
+            writer.element('cbc:CompanyID', value('vat_id'))
+            writer.start('cac:TaxScheme')
+            writer.element('cbc:ID', 'VAT')
+            writer.end('cac:TaxScheme')
+            writer.end('cac:PartyTaxScheme')
+        writer.start('cac:PartyLegalEntity')
+        writer.element('cbc:RegistrationName', value('name'))
+        writer.element('cbc:CompanyID', value('registration_id'))
+        writer.end('cac:PartyLegalEntity')
+        writer.end('cac:Party')
+        writer.end(element)
+
+    def get_chunks(self):
+        invoice = self.invoice
+        currency = {'currencyID': invoice.currency}
+        tax_subtotals = self.get_tax_subtotals()
+        totals = self.get_totals(tax_subtotals)
+        credit_note = invoice.type == invoice.TYPE.VAT_CREDIT_NOTE
+        document = 'CreditNote' if credit_note else 'Invoice'
+        writer = XMLStreamWriter()
+
+        namespaces = dict(self.NAMESPACES)
+        if credit_note:
+            namespaces['xmlns'] = self.CREDIT_NOTE_NAMESPACE
+
+        # element order differs between Invoice and CreditNote schemas
+        writer.start(document, namespaces)
+        writer.element('cbc:UBLVersionID', '2.1')
+        writer.element('cbc:ID', invoice.full_number)
+        writer.element('cbc:IssueDate', invoice.date_issue.isoformat())
+        if credit_note:
+            writer.element('cbc:TaxPointDate', invoice.date_tax_point.isoformat())
+            writer.element('cbc:CreditNoteTypeCode', self.TYPE_CODES[invoice.type])
+            writer.element('cbc:Note', invoice.note)
+        else:
+            writer.element('cbc:DueDate', invoice.date_due.isoformat())
+            writer.element('cbc:InvoiceTypeCode', self.TYPE_CODES.get(invoice.type, '380'))
+            writer.element('cbc:Note', invoice.note)
+            writer.element('cbc:TaxPointDate', invoice.date_tax_point.isoformat())
+        writer.element('cbc:DocumentCurrencyCode', invoice.currency)
+
+        self.write_party(writer, 'cac:AccountingSupplierParty', 'supplier')
+        self.write_party(writer, 'cac:AccountingCustomerParty', 'customer')
+
+        if invoice.shipping_name:
+            writer.start('cac:Delivery')
+            writer.start('cac:DeliveryLocation')
+            writer.start('cac:Address')
+            writer.element('cbc:StreetName', invoice.shipping_street)
+            writer.element('cbc:CityName', invoice.shipping_city)
+            writer.element('cbc:PostalZone', invoice.shipping_zip)
+            if invoice.shipping_country:
+                writer.start('cac:Country')
+                writer.element('cbc:IdentificationCode', invoice.shipping_country.code)
+                writer.end('cac:Country')
+            writer.end('cac:Address')
+            writer.end('cac:DeliveryLocation')
+            writer.start('cac:DeliveryParty')
+            writer.start('cac:PartyName')
+            writer.element('cbc:Name', invoice.shipping_name)
+            writer.end('cac:PartyName')
+            writer.end('cac:DeliveryParty')
+            writer.end('cac:Delivery')
+
+        writer.start('cac:PaymentMeans')
+        writer.element('cbc:PaymentMeansCode', self.PAYMENT_MEANS_CODES.get(invoice.payment_method, '1'))
+        writer.element('cbc:PaymentDueDate', invoice.date_due.isoformat())
+        writer.element('cbc:PaymentID', invoice.variable_symbol)
+        if invoice.bank_iban:
+            writer.start('cac:PayeeFinancialAccount')
+            writer.element('cbc:ID', invoice.bank_iban)
+            writer.element('cbc:Name', invoice.bank_name)
+            if invoice.bank_swift_bic:
+                writer.start('cac:FinancialInstitutionBranch')
+                writer.element('cbc:ID', invoice.bank_swift_bic)
+                writer.end('cac:FinancialInstitutionBranch')
+            writer.end('cac:PayeeFinancialAccount')
+        writer.end('cac:PaymentMeans')
+
+        writer.start('cac:TaxTotal')
+        writer.element('cbc:TaxAmount', amount(totals['vat']), currency)
+        for subtotal in tax_subtotals:
+            writer.start('cac:TaxSubtotal')
+            writer.element('cbc:TaxableAmount', amount(subtotal['base']), currency)
+            writer.element('cbc:TaxAmount', amount(subtotal['vat']), currency)
+            self.write_tax_category(writer, 'cac:TaxCategory', subtotal['tax_rate'])
+            writer.end('cac:TaxSubtotal')
+        writer.end('cac:TaxTotal')
+
+        writer.start('cac:LegalMonetaryTotal')
+        writer.element('cbc:LineExtensionAmount', amount(totals['base']), currency)
+        writer.element('cbc:TaxExclusiveAmount', amount(totals['base']), currency)
+        writer.element('cbc:TaxInclusiveAmount', amount(totals['total']), currency)
+        writer.element('cbc:PrepaidAmount', amount(totals['credit']), currency)
+        writer.element('cbc:PayableAmount', amount(totals['payable']), currency)
+        writer.end('cac:LegalMonetaryTotal')
+        yield writer.drain()
+
+        line, quantity = ('cac:CreditNoteLine', 'cbc:CreditedQuantity') if credit_note else ('cac:InvoiceLine', 'cbc:InvoicedQuantity')
+        for item in self.get_items():
+            writer.start(line)
+            writer.element('cbc:ID', item['id'])
+            writer.element(quantity, item['quantity'], {'unitCode': self.unit_codes.get(item['unit'], 'C62')})
+            writer.element('cbc:LineExtensionAmount', amount(item['base_amount']), currency)
+            writer.start('cac:Item')
+            writer.element('cbc:Name', item['title'])
+            self.write_tax_category(writer, 'cac:ClassifiedTaxCategory', item['tax_rate'])
+            writer.end('cac:Item')
+            writer.start('cac:Price')
+            writer.element('cbc:PriceAmount', amount(item['unit_price']), currency)
+            writer.end('cac:Price')
+            writer.end(line)
+            yield writer.drain()
+
+        writer.end(document)
+        writer.generator.endDocument()
+        yield writer.drain()
+
+
+class ISDOCFormatter(XMLFormatter):
+    """
+    ISDOC 6.0.2 invoice (Czech e-invoicing standard, http://www.isdoc.org).
+    """
+    extension = 'isdoc'
+    NAMESPACE = 'http://isdoc.cz/namespace/2013'
+    DOCUMENT_TYPES = {
+        'INVOICE': '1',
+        'VAT_CREDIT_NOTE': '2',
+        'ADVANCE': '5',
+        'PROFORMA': '1',
+    }
+    PAYMENT_MEANS_CODES = {
+        'BANK_TRANSFER': '42',
+        'CASH': '10',
+        'CASH_ON_DELIVERY': '10',
+        'PAYMENT_CARD': '48',
+    }
+
+    def get_uuid(self):
+        return force_text(uuid.uuid5(uuid.NAMESPACE_URL, force_str('invoicing:%s:%s' % (self.invoice.pk, self.invoice.full_number)))).upper()
+
+    def write_party(self, writer, element, prefix):
+        invoice = self.invoice
+        value = lambda name: getattr(invoice, '%s_%s' % (prefix, name))
+        country = value('country')
+
+        writer.start(element)
+        writer.start('Party')
+        writer.start('PartyIdentification')
+        writer.element('ID', value('registration_id'))
+        writer.end('PartyIdentification')
+        writer.start('PartyName')
+        writer.element('Name', value('name'))
+        writer.end('PartyName')
+        writer.start('PostalAddress')
+        writer.element('StreetName', value('street'))
+        writer.element('CityName', value('city'))
+        writer.element('PostalZone', value('zip'))
+        if country:
+            writer.start('Country')
+            writer.element('IdentificationCode', country.code)
+            writer.element('Name', country.name)
+            writer.end('Country')
+        writer.end('PostalAddress')
+        if value('vat_id'):
+            writer.start('PartyTaxScheme')
+            writer.element('CompanyID', value('vat_id'))
+            writer.element('TaxScheme', 'VAT')
+            writer.end('PartyTaxScheme')
+        writer.end('Party')
+        writer.end(element)
+
+    def get_chunks(self):
+        invoice = self.invoice
+        tax_subtotals = self.get_tax_subtotals()
+        totals = self.get_totals(tax_subtotals)
+        vat_applicable = any(subtotal['tax_rate'] is not None for subtotal in tax_subtotals)
+        writer = XMLStreamWriter()
+
+        writer.start('Invoice', {'xmlns': self.NAMESPACE, 'version': '6.0.2'})
+        writer.element('DocumentType', self.DOCUMENT_TYPES.get(invoice.type, '1'))
+        writer.element('ID', invoice.full_number)
+        writer.element('UUID', self.get_uuid())
+        writer.element('IssueDate', invoice.date_issue.isoformat())
+        writer.element('TaxPointDate', invoice.date_tax_point.isoformat())
+        writer.element('VATApplicable', 'true' if vat_applicable else 'false')
+        writer.element('Note', invoice.note)
+        writer.element('LocalCurrencyCode', invoice.currency)
+        writer.element('CurrRate', '1')
+        writer.element('RefCurrRate', '1')
+
+        self.write_party(writer, 'AccountingSupplierParty', 'supplier')
+        self.write_party(writer, 'AccountingCustomerParty', 'customer')
+        yield writer.drain()
+
+        writer.start('InvoiceLines')
+        for item in self.get_items():
+            base = Decimal(item['base_amount'] or 0)
+            vat = Decimal(item['vat_amount'] or 0)
+            writer.start('InvoiceLine')
+            writer.element('ID', item['id'])
+            writer.element('InvoicedQuantity', item['quantity'], {'unitCode': self.unit_codes.get(item['unit'], 'C62')})
+            writer.element('LineExtensionAmount', amount(base))
+            writer.element('LineExtensionAmountTaxInclusive', amount(base + vat))
+            writer.element('LineExtensionTaxAmount', amount(vat))
+            writer.element('UnitPrice', amount(item['unit_price']))
+            writer.element('UnitPriceTaxInclusive', amount(Decimal(item['unit_price']) * (100 + Decimal(item['tax_rate'] or 0)) / 100))
+            writer.start('ClassifiedTaxCategory')
+            writer.element('Percent', item['tax_rate'] or 0)
+            writer.element('VATCalculationMethod', '0')
+            writer.end('ClassifiedTaxCategory')
+            writer.start('Item')
+            writer.element('Description', item['title'])
+            writer.end('Item')
+            writer.end('InvoiceLine')
+            yield writer.drain()
+        writer.end('InvoiceLines')
+
+        writer.start('TaxTotal')
+        for subtotal in tax_subtotals:
+            base = Decimal(subtotal['base'] or 0)
+            vat = Decimal(subtotal['vat'] or 0)
+            writer.start('TaxSubTotal')
+            writer.element('TaxableAmount', amount(base))
+            writer.element('TaxAmount', amount(vat))
+            writer.element('TaxInclusiveAmount', amount(base + vat))
+            writer.element('AlreadyClaimedTaxableAmount', amount(0))
+            writer.element('AlreadyClaimedTaxAmount', amount(0))
+            writer.element('AlreadyClaimedTaxInclusiveAmount', amount(0))
+            writer.element('DifferenceTaxableAmount', amount(base))
+            writer.element('DifferenceTaxAmount', amount(vat))
+            writer.element('DifferenceTaxInclusiveAmount', amount(base + vat))
+            writer.start('TaxCategory')
+            writer.element('Percent', subtotal['tax_rate'] or 0)
+            writer.end('TaxCategory')
+            writer.end('TaxSubTotal')
+        writer.element('TaxAmount', amount(totals['vat']))
+        writer.end('TaxTotal')
+
+        writer.start('LegalMonetaryTotal')
+        writer.element('TaxExclusiveAmount', amount(totals['base']))
+        writer.element('TaxInclusiveAmount', amount(totals['total']))
+        writer.element('AlreadyClaimedTaxExclusiveAmount', amount(0))
+        writer.element('AlreadyClaimedTaxInclusiveAmount', amount(0))
+        writer.element('DifferenceTaxExclusiveAmount', amount(totals['base']))
+        writer.element('DifferenceTaxInclusiveAmount', amount(totals['total']))
+        writer.element('PaidDepositsAmount', amount(totals['credit']))
+        writer.element('PayableAmount', amount(totals['payable']))
+        writer.end('LegalMonetaryTotal')
+
+        writer.start('PaymentMeans')
+        writer.start('Payment')
+        writer.element('PaidAmount', amount(totals['payable']))
+        writer.element('PaymentMeansCode', self.PAYMENT_MEANS_CODES.get(invoice.payment_method, '42'))
+        writer.start('Details')
+        writer.element('PaymentDueDate', invoice.date_due.isoformat())
+        writer.element('ID', invoice.bank_iban)
+        writer.element('BankCode', invoice.bank_swift_bic)
+        writer.element('Name', invoice.bank_name)
+        writer.element('IBAN', invoice.bank_iban)
+        writer.element('BIC', invoice.bank_swift_bic)
+        writer.element('VariableSymbol', invoice.variable_symbol)
+        writer.element('ConstantSymbol', invoice.constant_symbol)
+        writer.element('SpecificSymbol', invoice.specific_symbol)
+        writer.end('Details')
+        writer.end('Payment')
+        writer.end('PaymentMeans')
+
+        writer.end('Invoice')
+        writer.generator.endDocument()
+        yield writer.drain()
@@ -0,0 +1,219 @@
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.core.validators import EMPTY_VALUES
+from django.db import IntegrityError, transaction
+from django.utils import six
+from django_countries import countries
+from django_countries.fields import CountryField
+
+from invoicing.finalization import finalize
+from invoicing.models import Invoice, InvoiceFacet, Item, OutboxEvent
+from invoicing.utils import get_customer_key
+
+
+IngestResult = namedtuple('IngestResult', ['key', 'status', 'invoice', 'errors'])
+
+CREATED = 'CREATED'
+EXISTING = 'EXISTING'
+INVALID = 'INVALID'
+
+
+def _editable_fields(model):
+    return set(field.name for field in model._meta.concrete_fields if field.editable and not field.primary_key)
+
+
+def _errors(error):
+    return error.message_dict if hasattr(error, 'error_dict') else {'__all__': error.messages}
+
+
+def _key_errors(key):
+    """
+    :return: None if idempotency key is valid, otherwise dict of errors
+    """
+    if key in EMPTY_VALUES:
+        return {'idempotency_key': ['This field is required.']}
+    if not isinstance(key, six.string_types):
+        return {'idempotency_key': ['Enter a string.']}
+    return None
+
+
+class Ingestion(object):
+    """
+    Creates invoices from batch of payloads (dicts of invoice fields with ``items`` list and
+    client supplied ``idempotency_key``).
+
+    Keys already stored are looked up by one query per chunk and their invoices are reported as existing,
+    the rest is numbered and inserted in bulk. Sending the same batch again (e.g. retry after timeout)
+    creates nothing and consumes no invoice numbers.
+    """
+    invoice_fields = _editable_fields(Invoice)
+    item_fields = _editable_fields(Item) - set(['invoice'])
+    country_fields = [field for field in Invoice._meta.concrete_fields if isinstance(field, CountryField)]
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        # CountryField.validate() sorts translated names of all countries on every call,
+        # codes are checked against this set instead
+        self.country_codes = set(code for code, name in countries)
+
+    def clean_fields(self, invoice):
+        exclude = ['number', 'full_number']
+        errors = {}
+
+        for field in self.country_fields:
+            code = getattr(invoice, field.name).code
+            if code:
+                exclude.append(field.name)
+                if code not in self.country_codes:
+                    errors[field.name] = [field.error_messages['invalid_choice'] % {'value': code}]
+
+        try:
+            invoice.clean_fields(exclude=exclude)
+        except ValidationError as e:
+            errors.update(e.message_dict)
+
+        if errors:
+            raise ValidationError(errors)
+
+    def build(self, payload):
+        """
+        Validates payload and returns tuple (unsaved invoice, list of unsaved items).
+
+        :raises ValidationError: if payload is not valid
+        """
+        errors = _key_errors(payload.get('idempotency_key'))
+        if errors:
+            raise ValidationError(errors)
+
+        data = dict(payload)
+        data.pop('idempotency_key', None)
+        items_data = data.pop('items', None) or []
+
+        unknown = set(data) - self.invoice_fields
+        if unknown:
+            raise ValidationError({'__all__': ['Unknown fields: %s.' % ', '.join(sorted(unknown))]})
+
+        invoice = Invoice(idempotency_key=payload['idempotency_key'], **data)
+        self.clean_fields(invoice)
+        invoice.clean()
+        invoice.overdue = invoice.is_overdue
+        invoice.customer_key = get_customer_key(invoice.customer_vat_id, invoice.customer_registration_id,
+                                                invoice.customer_country)
+
+        items = []
+        tax_rate = None
+        for item_data in items_data:
+            unknown = set(item_data) - self.item_fields
+            if unknown:
+                raise ValidationError({'items': ['Unknown item fields: %s.' % ', '.join(sorted(unknown))]})
+
+            item = Item(**item_data)
+            try:
+                item.clean_fields(exclude=['invoice'])
+            except ValidationError as e:
+                raise ValidationError({'items': ['%s: %s' % (field, ' '.join(messages))
+                                                 for field, messages in sorted(_errors(e).items())]})
+
+            # the same default as Item.save(), computed once per invoice
+            if item.tax_rate in EMPTY_VALUES:
+                if tax_rate is None:
+                    tax_rate = invoice.get_tax_rate()
+                item.tax_rate = tax_rate
+            items.append(item)
+
+        return invoice, items
+
+    def insert(self, built):
+        """
+        Inserts invoices and their items in bulk. Invoice pks are read back by idempotency key,
+        because ``bulk_create()`` does not set them on every backend.
+
+        :return: dict of idempotency key: invoice pk
+        """
+        invoices = [invoice for invoice, items in built]
+        Invoice.objects.allocate_numbers(invoices)
+        Invoice.objects.bulk_create(invoices)
+        InvoiceFacet.objects.add_invoices(invoices)
+
+        pks = dict(Invoice.objects.filter(idempotency_key__in=[invoice.idempotency_key for invoice in invoices])
+                   .values_list('idempotency_key', 'pk'))
+
+        new_items = []
+        for invoice, items in built:
+            for item in items:
+                item.invoice_id = pks[invoice.idempotency_key]
+                new_items.append(item)
+        Item.objects.bulk_create(new_items)
+        Invoice.objects.filter(pk__in=pks.values()).update_balances()
+        OutboxEvent.objects.record_invoices(OutboxEvent.ACTION.CREATED, pks.values())
+        return pks
+
+    def ingest_chunk(self, payloads):
+        keys = [payload.get('idempotency_key') for payload in payloads]
+        # invalid keys (e.g. lists or objects) are not hashable, they are only reported
+        key_errors = [_key_errors(key) for key in keys]
+        existing = dict(Invoice.objects.filter(idempotency_key__in=[key for key, errors in zip(keys, key_errors) if not errors])
+                        .values_list('idempotency_key', 'pk'))
+
+        results = {}
+        built = []
+        for key, errors, payload in zip(keys, key_errors, payloads):
+            if errors:
+                continue
+            if key in existing or key in results:
+                continue
+            try:
+                built.append(self.build(payload))
+                results[key] = None
+            except ValidationError as e:
+                results[key] = IngestResult(key, INVALID, None, _errors(e))
+            except (TypeError, ValueError) as e:
+                results[key] = IngestResult(key, INVALID, None, {'__all__': [str(e)]})
+
+        created = {}
+        if built:
+            with transaction.atomic():
+                created = self.insert(built)
+            # invoices created as sent are finalized after the chunk is committed
+            finalize(created[invoice.idempotency_key] for invoice, items in built if invoice.status == Invoice.STATUS.SENT)
+
+        report = []
+        seen = set()
+        for key, errors in zip(keys, key_errors):
+            if errors:
+                report.append(IngestResult(key, INVALID, None, errors))
+                continue
+
+            if key in created and key not in seen:
+                report.append(IngestResult(key, CREATED, created[key], None))
+            elif key in created:
+                report.append(IngestResult(key, EXISTING, created[key], None))
+            elif key in existing:
+                report.append(IngestResult(key, EXISTING, existing[key], None))
+            else:
+                report.append(results[key])
+            seen.add(key)
+        return report
+
+    def ingest(self, payloads):
+        """
+        :return: list of ``IngestResult`` in the order of payloads
+        """
+        payloads = list(payloads)
+        report = []
+
+        for start in range(0, len(payloads), self.chunk_size):
+            chunk = payloads[start:start + self.chunk_size]
+            try:
+                report.extend(self.ingest_chunk(chunk))
+            except IntegrityError:
+                # some key was inserted by concurrent request meanwhile, chunk was rolled back;
+                # lookup of existing keys is repeated
+                report.extend(self.ingest_chunk(chunk))
+
+        return report
+
+
+def ingest(payloads, chunk_size=1000):
+    return Ingestion(chunk_size).ingest(payloads)
@@ -0,0 +1,28 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicing.archive import archive_year
+from invoicing.models import Invoice, date_today
+
+
+class Command(BaseCommand):
+    help = 'Moves settled invoices of closed years (with their items, payments and finalized documents) to archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('years', nargs='*', type=int, help='Years to archive (default: all years before last year)')
+        parser.add_argument('--chunk-size', type=int, dest='chunk_size', default=1000,
+                            help='Number of invoices moved in one transaction')
+
+    def handle(self, *args, **options):
+        last_year = date_today().year - 1
+        years = options['years'] or [
+            date.year for date in Invoice.objects.filter(date_issue__lt=datetime.date(last_year, 1, 1)).dates('date_issue', 'year')
+        ]
+
+        for year in years:
+            if year >= last_year:
+                raise CommandError('Year %d is not closed yet.' % year)
+
+            count = archive_year(year, chunk_size=options['chunk_size'])
+            self.stdout.write('%d: %d invoices archived.' % (year, count))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from invoicing.outbox import compact
+
+
+class Command(BaseCommand):
+    help = 'Deletes invoice change events already processed by all consumers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, dest='chunk_size', default=10000,
+                            help='Number of events deleted by one query')
+
+    def handle(self, *args, **options):
+        count = compact(chunk_size=options['chunk_size'])
+        self.stdout.write('%d events deleted.' % count)
@@ -0,0 +1,47 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicing.formatters.data import InvoiceJSONEncoder
+from invoicing.outbox import acknowledge, event_data, get_position, read
+
+
+class Command(BaseCommand):
+    help = 'Writes invoice change events not yet processed by consumer as JSON Lines and moves its cursor.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('consumer', help='Consumer name, every consumer has its own cursor')
+        parser.add_argument('--output', dest='output', default=None, help='Output file (default: stdout)')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=500)
+        parser.add_argument('--max-batches', dest='max_batches', type=int, default=None,
+                            help='Stop after given number of batches (default: all pending events)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Batch size has to be positive number.')
+
+        consumer = options['consumer']
+        position = get_position(consumer)
+        output = open(options['output'], 'a') if options['output'] else sys.stdout
+        count = 0
+        batches = 0
+        try:
+            while options['max_batches'] is None or batches < options['max_batches']:
+                events = read(position, options['batch_size'])
+                if not events:
+                    break
+
+                for event in events:
+                    output.write(json.dumps(event_data(event), cls=InvoiceJSONEncoder) + '\n')
+                output.flush()
+
+                # cursor is moved only after the batch was written
+                position = events[-1].get_position()
+                acknowledge(consumer, position)
+                count += len(events)
+                batches += 1
+        finally:
+            if options['output']:
+                output.close()
+        self.stderr.write('%d events consumed.' % count)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicing.delivery import deliver
+
+
+class Command(BaseCommand):
+    help = 'Emails pending digital invoices to customers in batches and marks delivered invoices as sent.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, dest='batch_size', default=100,
+                            help='Number of messages sent over one connection')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Batch size has to be positive number.')
+
+        sent, failed = deliver(batch_size=options['batch_size'])
+        self.stdout.write('%d invoices sent, %d failed.' % (sent, failed))
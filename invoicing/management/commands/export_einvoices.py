@@ -0,0 +1,52 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from invoicing.formatters.ubl import ISDOCFormatter, UBLFormatter
+from invoicing.models import Invoice
+from invoicing.routers import read_replica
+
+
+class Command(BaseCommand):
+    help = 'Writes structured e-invoices (UBL 2.1 or ISDOC) of selected invoices into separate files.'
+    formatters = {
+        'ubl': UBLFormatter,
+        'isdoc': ISDOCFormatter,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Output directory')
+        parser.add_argument('--format', dest='format', default='ubl', choices=sorted(self.formatters.keys()))
+        parser.add_argument('--date-from', dest='date_from', default=None, help='Issue date from (YYYY-MM-DD)')
+        parser.add_argument('--date-to', dest='date_to', default=None, help='Issue date to (YYYY-MM-DD)')
+        parser.add_argument('--status', dest='status', default=None, choices=[status for status, label in Invoice.STATUS])
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError('Directory "%s" does not exist.' % directory)
+
+        dates = {}
+        for name in ('date_from', 'date_to'):
+            if options[name]:
+                try:
+                    dates[name] = parse_date(options[name])
+                except ValueError:
+                    dates[name] = None
+                if dates[name] is None:
+                    raise CommandError('Invalid date "%s" (expected YYYY-MM-DD).' % options[name])
+        if len(dates) == 2 and dates['date_from'] > dates['date_to']:
+            raise CommandError('Period has to start before it ends.')
+
+        queryset = Invoice.objects.all()
+        if 'date_from' in dates:
+            queryset = queryset.filter(date_issue__gte=dates['date_from'])
+        if 'date_to' in dates:
+            queryset = queryset.filter(date_issue__lte=dates['date_to'])
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+
+        with read_replica():
+            paths = self.formatters[options['format']].write_files(queryset, directory)
+        self.stdout.write('%d invoices exported.' % len(paths))
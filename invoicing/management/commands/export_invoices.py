@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from invoicing.exports import EXPORTS, WRITERS
+from invoicing.routers import read_replica
+
+
+class Command(BaseCommand):
+    help = 'Exports invoices or invoice items as CSV or JSON Lines with constant memory usage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', nargs='?', default='invoices', choices=sorted(EXPORTS.keys()))
+        parser.add_argument('--format', dest='format', default='csv', choices=sorted(WRITERS.keys()))
+        parser.add_argument('--output', dest='output', default=None, help='Output file (default: stdout)')
+        parser.add_argument('--date-from', dest='date_from', default=None, help='Issue date from (YYYY-MM-DD)')
+        parser.add_argument('--date-to', dest='date_to', default=None, help='Issue date to (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('Chunk size has to be positive number.')
+
+        dates = {}
+        for name in ('date_from', 'date_to'):
+            if options[name]:
+                try:
+                    dates[name] = parse_date(options[name])
+                except ValueError:
+                    dates[name] = None
+                if dates[name] is None:
+                    raise CommandError('Invalid date "%s" (expected YYYY-MM-DD).' % options[name])
+
+        export = EXPORTS[options['export']](chunk_size=options['chunk_size'], **dates)
+        writer = WRITERS[options['format']]()
+
+        output = open(options['output'], 'w') if options['output'] else sys.stdout
+        try:
+            with read_replica():
+                for line in writer.lines(export):
+                    output.write(line)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from invoicing.finalization import finalize_pending
+
+
+class Command(BaseCommand):
+    help = 'Freezes totals and documents of sent invoices which were not finalized yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, dest='chunk_size', default=100,
+                            help='Number of invoices finalized in one transaction')
+
+    def handle(self, *args, **options):
+        count = finalize_pending(chunk_size=options['chunk_size'])
+        self.stdout.write('%d invoices finalized.' % count)
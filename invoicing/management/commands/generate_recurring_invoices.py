@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from invoicing.recurring import generate
+
+
+class Command(BaseCommand):
+    help = 'Issues invoices of due recurring schedules. Run it daily, interrupted run can be safely repeated.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', dest='date', default=None,
+                            help='Issue invoices due till this date (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--chunk-size', type=int, dest='chunk_size', default=500,
+                            help='Number of schedules processed in one transaction')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = parse_date(options['date'])
+            except ValueError:
+                today = None
+            if today is None:
+                raise CommandError('Invalid date "%s".' % options['date'])
+
+        count = generate(today, chunk_size=options['chunk_size'])
+        self.stdout.write('%d recurring invoices generated.' % count)
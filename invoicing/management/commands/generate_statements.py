@@ -0,0 +1,43 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from invoicing.formatters.data import InvoiceJSONEncoder
+from invoicing.routers import read_replica
+from invoicing.statements import statements
+
+
+class Command(BaseCommand):
+    help = 'Generates account statements of all customers for the period as JSON Lines, ' \
+           'one statement per customer and currency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', dest='date_from', required=True, help='Period from (YYYY-MM-DD)')
+        parser.add_argument('--date-to', dest='date_to', required=True, help='Period to (YYYY-MM-DD)')
+        parser.add_argument('--customer', dest='customers', action='append', default=None,
+                            help='Customer key, may be repeated (default: all customers)')
+        parser.add_argument('--output', dest='output', default=None, help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            date_from = parse_date(options['date_from'])
+            date_to = parse_date(options['date_to'])
+        except ValueError:
+            date_from = date_to = None
+        if date_from is None or date_to is None:
+            raise CommandError('Invalid period "%s" - "%s".' % (options['date_from'], options['date_to']))
+        if date_from > date_to:
+            raise CommandError('Period has to start before it ends.')
+
+        with read_replica():
+            result = statements(date_from, date_to, options['customers'])
+
+        output = open(options['output'], 'w') if options['output'] else sys.stdout
+        try:
+            for statement in result:
+                output.write(json.dumps(statement._asdict(), cls=InvoiceJSONEncoder) + '\n')
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,38 @@
+import json
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicing.ingestion import Ingestion, INVALID
+
+
+class Command(BaseCommand):
+    help = 'Creates invoices from JSON Lines file (one payload with idempotency_key per line). ' \
+           'Already ingested keys are skipped, so the file can be loaded again after failure.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('payloads', help='JSON Lines file')
+        parser.add_argument('--chunk-size', type=int, dest='chunk_size', default=1000,
+                            help='Number of invoices inserted in one transaction')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['payloads']) as payloads_file:
+                payloads = [json.loads(line) for line in payloads_file if line.strip()]
+        except (IOError, ValueError) as e:
+            raise CommandError(e)
+
+        started = time.time()
+        results = Ingestion(options['chunk_size']).ingest(payloads)
+        elapsed = time.time() - started
+
+        for result in results:
+            if result.status == INVALID:
+                self.stderr.write('%s: %s' % (result.key, json.dumps(result.errors, default=str)))
+
+        statuses = Counter(result.status for result in results)
+        for status in sorted(statuses.keys()):
+            self.stdout.write('%s: %d' % (status, statuses[status]))
+        self.stdout.write('%d invoices in %.2f s (%.0f invoices/s).' % (
+            len(results), elapsed, len(results) / elapsed if elapsed else 0))
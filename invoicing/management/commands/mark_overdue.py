@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from invoicing.models import Invoice
+
+
+class Command(BaseCommand):
+    help = 'Flags invoices which became overdue and clears the flag of settled ones. Run it daily.'
+
+    def handle(self, *args, **options):
+        flagged, cleared = Invoice.objects.get_queryset().mark_overdue()
+        self.stdout.write('%d invoices marked as overdue, %d cleared.' % (flagged, cleared))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from invoicing.models import Invoice, InvoiceFacet
+
+
+class Command(BaseCommand):
+    help = 'Recomputes cached invoice counts (facets), e.g. after invoices were deleted in bulk.'
+
+    def handle(self, *args, **options):
+        InvoiceFacet.objects.rebuild(Invoice.objects.all())
+        self.stdout.write('%d invoice facets stored.' % InvoiceFacet.objects.count())
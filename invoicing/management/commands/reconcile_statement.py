@@ -0,0 +1,41 @@
+import csv
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicing.reconciliation import PARSERS, Reconciler, MATCHED, OVERPAID
+
+
+class Command(BaseCommand):
+    help = 'Matches bank statement payments against unsettled invoices and marks matched invoices as paid.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Bank statement file')
+        parser.add_argument('--format', dest='format', default='csv', choices=sorted(PARSERS.keys()))
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False,
+                            help='Only report matches, do not change invoices')
+        parser.add_argument('--unmatched', action='store_true', dest='unmatched', default=False,
+                            help='Write lines which were not matched as CSV to stdout')
+
+    def handle(self, *args, **options):
+        parse = PARSERS[options['format']]
+        mode = 'rb' if options['format'] == 'camt053' else 'r'
+
+        try:
+            statement = open(options['statement'], mode)
+        except IOError as e:
+            raise CommandError(e)
+
+        with statement:
+            results = Reconciler().reconcile(parse(statement), apply=not options['dry_run'])
+
+        statuses = Counter(result.status for result in results)
+        for status in sorted(statuses.keys()):
+            self.stderr.write('%s: %d' % (status, statuses[status]))
+
+        if options['unmatched']:
+            writer = csv.writer(sys.stdout)
+            for result in results:
+                if result.status not in (MATCHED, OVERPAID):
+                    writer.writerow([result.status, result.invoice or ''] + list(result.line))
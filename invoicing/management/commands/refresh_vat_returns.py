@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from invoicing.models import VATReturnPeriod
+from invoicing.reports import build_vat_return, update_vat_returns
+
+
+class Command(BaseCommand):
+    help = 'Builds materialized VAT returns of newly closed periods and applies changes of invoices ' \
+           'to the closed ones. Run it periodically; only changed invoices are recomputed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', dest='force', default=False,
+                            help='Build all closed periods again from invoices')
+
+    def handle(self, *args, **options):
+        built = 0
+        for period in VATReturnPeriod.objects.filter(closed=True):
+            if options['force'] or not period.refreshed:
+                build_vat_return(period)
+                built += 1
+
+        events = update_vat_returns()
+        self.stdout.write('%d VAT return periods built, %d changes applied.' % (built, events))
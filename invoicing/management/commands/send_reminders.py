@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from invoicing.dunning import send_reminders
+from invoicing.models import Reminder
+
+
+class Command(BaseCommand):
+    help = 'Emails payment reminders of overdue invoices, one per customer and currency. Run it daily, ' \
+           'repeated run sends only reminders which were not sent yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', dest='date', default=None,
+                            help='Compute overdue days at this date (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--batch-size', type=int, dest='batch_size', default=100,
+                            help='Number of messages sent over one connection')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = parse_date(options['date'])
+            except ValueError:
+                today = None
+            if today is None:
+                raise CommandError('Invalid date "%s".' % options['date'])
+
+        reminders = send_reminders(today, batch_size=options['batch_size'])
+        statuses = [reminder.status for reminder in reminders]
+        self.stdout.write('%d reminders sent, %d failed, %d without email.' % (
+            statuses.count(Reminder.STATUS.SENT), statuses.count(Reminder.STATUS.FAILED), statuses.count(Reminder.STATUS.NEW)))
@@ -1,33 +1,615 @@
 import datetime
-from django.db.models import Manager, Q
+from collections import Counter
+from django.core.validators import EMPTY_VALUES
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Manager, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.db.models.query import QuerySet
+from django.utils import six
 from django.utils.timezone import now
 
+from invoicing.signals import invoices_status_changed
+from invoicing.snapshots import party_digest
+
+
+def item_base_expression(prefix=''):
+    """
+    Item price without VAT (quantity * unit price - discount) as database expression.
+    """
+    return ExpressionWrapper(
+        F(prefix + 'quantity') * F(prefix + 'unit_price') * (Value(100) - F(prefix + 'discount')) / Value(100),
+        output_field=DecimalField(max_digits=19, decimal_places=2))
+
+
+def item_vat_expression(prefix=''):
+    """
+    Item VAT amount as database expression. Items without tax rate have zero VAT.
+    """
+    return ExpressionWrapper(
+        item_base_expression(prefix) * Coalesce(F(prefix + 'tax_rate'), Value(0)) / Value(100),
+        output_field=DecimalField(max_digits=19, decimal_places=2))
+
+
+class InvoiceRow(object):
+    """
+    Read-only invoice loaded by projection (see ``InvoiceQuerySet.as_rows()``).
+    Only projected columns are kept, in ``__slots__``, so rows take a fraction of memory of model instances
+    and no JSON fields are decoded. Total is derived from denormalized ``amount_paid`` and ``balance_due``.
+    """
+    __slots__ = ()
+    fields = ()
+    settled_statuses = ()
+
+    def __init__(self, values):
+        for name, value in zip(self.fields, values):
+            setattr(self, name, value)
+
+    def __str__(self):
+        return self.full_number
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, self.full_number)
+
+    @property
+    def total(self):
+        return self.amount_paid + self.balance_due
+
+    @property
+    def is_overdue(self):
+        return self.date_due < now().date() and self.status not in self.settled_statuses
+
+    @property
+    def overdue_days(self):
+        return (now().date() - self.date_due).days
+
 
 class InvoiceQuerySet(QuerySet):
-    def overdue(self):
-        return self.filter(date_due__lt=datetime.datetime.combine(now().date(), datetime.time.max)).exclude(status__in=[self.model.STATUS.PAID, self.model.STATUS.CANCELED])
+    # fields required by InvoiceRow properties
+    ROW_FIELDS = ('id', 'full_number', 'status', 'date_due', 'amount_paid', 'balance_due')
+
+    PROJECTIONS = {
+        'list': ('type', 'number', 'date_issue', 'customer_name', 'customer_country', 'currency', 'overdue'),
+        'report': ('type', 'date_issue', 'date_tax_point', 'customer_name', 'customer_country',
+                   'customer_vat_id', 'currency', 'credit'),
+        'payment': ('currency', 'variable_symbol', 'specific_symbol', 'constant_symbol', 'reference'),
+    }
+    _row_classes = {}
+
+    AGING_BUCKETS = (
+        # name, overdue days from, overdue days to
+        ('current', None, 0),
+        ('1_30', 1, 30),
+        ('31_60', 31, 60),
+        ('61_90', 61, 90),
+        ('90_plus', 91, None),
+    )
+
+    def overdue(self, today=None):
+        """
+        Unsettled invoices after due date. Compares ``date_due`` with plain date,
+        so (status, date_due) index is used.
+        """
+        return self.unsettled().filter(date_due__lt=today or now().date())
+
+    def not_overdue(self, today=None):
+        return self.filter(Q(date_due__gte=today or now().date()) | Q(status__in=self.model.SETTLED_STATUSES))
+
+    def unsettled(self):
+        return self.filter(status__in=self.model.UNSETTLED_STATUSES)
+
+    def unpaid(self):
+        return self.unsettled().filter(amount_paid=0, balance_due__gt=0)
+
+    def partially_paid(self):
+        return self.unsettled().filter(amount_paid__gt=0, balance_due__gt=0)
+
+    def row_class(self, projection):
+        """
+        ``InvoiceRow`` subclass with slots for projection given by name (key of ``PROJECTIONS``) or tuple of fields.
+        Classes are created once per projection.
+        """
+        extra_fields = self.PROJECTIONS[projection] if isinstance(projection, six.string_types) else tuple(projection)
+        fields = self.ROW_FIELDS + tuple(name for name in extra_fields if name not in self.ROW_FIELDS)
+
+        if fields not in self._row_classes:
+            self._row_classes[fields] = type(str('InvoiceRow'), (InvoiceRow,), {
+                '__slots__': fields,
+                'fields': fields,
+                'settled_statuses': self.model.SETTLED_STATUSES,
+            })
+        return self._row_classes[fields]
+
+    def as_rows(self, projection='list'):
+        """
+        Iterates invoices as lightweight ``InvoiceRow`` objects selecting only columns of the projection.
+        Rows are fetched by ``iterator()``, so results are not cached by queryset.
+        """
+        row_class = self.row_class(projection)
+        for values in self.values_list(*row_class.fields).iterator():
+            yield row_class(values)
+
+    def update_balances(self):
+        """
+        Recomputes denormalized ``amount_paid`` and ``balance_due`` of invoices in queryset
+        from payments ledger and items (or frozen total of finalized invoice) by single UPDATE query.
+        ``modified`` is updated as well, so cached documents of the invoices are not served anymore.
+
+        :return: number of updated invoices
+        """
+        from invoicing.models import InvoiceSnapshot, Item, Payment
+
+        # routed like UPDATE, without changing routing of this queryset
+        queryset = self._clone()
+        queryset._for_write = True
+        connection = connections[queryset.db]
+        quote = connection.ops.quote_name
+        invoices = quote(self.model._meta.db_table)
+        paid = 'COALESCE((SELECT SUM(payments.amount) FROM %(payments)s payments WHERE payments.invoice_id = %(invoices)s.id), 0)' % {
+            'payments': quote(Payment._meta.db_table),
+            'invoices': invoices,
+        }
+        total = (
+            'COALESCE((SELECT ROUND(SUM(items.quantity * items.unit_price * (100 - items.discount) / 100 '
+            '* (100 + COALESCE(items.tax_rate, 0)) / 100), 2) '
+            'FROM %(items)s items WHERE items.invoice_id = %(invoices)s.id), 0)'
+        ) % {
+            'items': quote(Item._meta.db_table),
+            'invoices': invoices,
+        }
+        # finalized invoices keep their frozen total
+        finalized = '(SELECT snapshots.total FROM %(snapshots)s snapshots WHERE snapshots.invoice_id = %(invoices)s.id)' % {
+            'snapshots': quote(InvoiceSnapshot._meta.db_table),
+            'invoices': invoices,
+        }
+        pks_sql, params = queryset.order_by().values('pk').query.sql_with_params()
+
+        modified = self.model._meta.get_field('modified').get_db_prep_value(now(), connection)
+
+        sql = 'UPDATE %(invoices)s SET amount_paid = %(paid)s, balance_due = COALESCE(%(finalized)s, %(total)s - %(invoices)s.credit) - %(paid)s, modified = %%s WHERE id IN (%(pks)s)' % {
+            'invoices': invoices,
+            'paid': paid,
+            'finalized': finalized,
+            'total': total,
+            'pks': pks_sql,
+        }
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (modified,) + tuple(params))
+            return cursor.rowcount
+
+    def transition(self, status, chunk_size=1000):
+        """
+        Changes status of all invoices in queryset allowed by ``Invoice.STATUS_TRANSITIONS``
+        using bulk UPDATE queries. Sets ``date_sent``, finalizes sent invoices and reopens returned
+        invoices like ``Invoice.save()`` would do and sends ``invoices_status_changed`` signal once for all changed invoices.
+
+        :return: list of primary keys of changed invoices
+        """
+        sources = self.model.STATUS_TRANSITIONS[status]
+        timestamp = now()
+        values = {'status': status, 'modified': timestamp}
 
-    def not_overdue(self):
-        return self.filter(Q(date_due__gt=datetime.datetime.combine(now().date(), datetime.time.max)) | Q(status__in=[self.model.STATUS.PAID, self.model.STATUS.CANCELED]))
+        if status == self.model.STATUS.SENT:
+            values['date_sent'] = timestamp
+
+        if status in self.model.SETTLED_STATUSES:
+            values['overdue'] = False
+
+        from invoicing.models import InvoiceFacet, OutboxEvent
+
+        # status is always read and changed on primary database, this queryset keeps its routing
+        queryset = self._clone()
+        queryset._for_write = True
+        using = queryset.db
+
+        with transaction.atomic(using=using):
+            rows = list(queryset.filter(status__in=sources).select_for_update().values_list('pk', 'date_issue', 'type', 'status'))
+            pks = [row[0] for row in rows]
+
+            for start in range(0, len(pks), chunk_size):
+                self.model._default_manager.using(using)\
+                    .filter(pk__in=pks[start:start + chunk_size])\
+                    .update(**values)
+
+            changes = Counter()
+            for pk, date_issue, invoice_type, old_status in rows:
+                changes[(date_issue.year, date_issue.month, invoice_type, old_status)] -= 1
+                changes[(date_issue.year, date_issue.month, invoice_type, status)] += 1
+            InvoiceFacet.objects.using(using).adjust(changes)
+
+            OutboxEvent.objects.using(using).record_invoices(OutboxEvent.ACTION.STATUS_CHANGED, pks, {'status': status})
+
+            if status == self.model.STATUS.RETURNED:
+                from invoicing.finalization import reopen
+                reopen(pks, using=using)
+
+            if pks:
+                invoices_status_changed.send(sender=self.model, pks=pks, status=status)
+
+        # documents are rendered after invoices are unlocked, chunk by chunk
+        if status == self.model.STATUS.SENT:
+            from invoicing.finalization import finalize
+            finalize(pks, using=using)
+
+        return pks
+
+    def mark_sent(self):
+        return self.transition(self.model.STATUS.SENT)
+
+    def mark_returned(self):
+        return self.transition(self.model.STATUS.RETURNED)
+
+    def mark_paid(self):
+        return self.transition(self.model.STATUS.PAID)
+
+    def cancel(self):
+        return self.transition(self.model.STATUS.CANCELED)
+
+    def mark_overdue(self, today=None, chunk_size=1000):
+        """
+        Updates ``overdue`` flag of invoices which became overdue or were settled since the last run
+        using bulk UPDATE queries and records ``UPDATED`` outbox event of every changed invoice.
+
+        :return: tuple (number of newly flagged, number of cleared invoices)
+        """
+        today = today or now().date()
+
+        from invoicing.models import OutboxEvent
+
+        queryset = self._clone()
+        queryset._for_write = True
+        using = queryset.db
+
+        counts = []
+        with transaction.atomic(using=using):
+            for changed, overdue in ((queryset.filter(overdue=False).overdue(today), True),
+                                     (queryset.filter(overdue=True).not_overdue(today), False)):
+                pks = list(changed.select_for_update().values_list('pk', flat=True))
+
+                for start in range(0, len(pks), chunk_size):
+                    self.model._default_manager.using(using)\
+                        .filter(pk__in=pks[start:start + chunk_size])\
+                        .update(overdue=overdue)
+
+                OutboxEvent.objects.using(using).record_invoices(OutboxEvent.ACTION.UPDATED, pks, {'overdue': overdue})
+                counts.append(len(pks))
+
+        return tuple(counts)
+
+    def aging(self, today=None):
+        """
+        Receivables aging report of unsettled invoices. Denormalized ``balance_due`` is bucketed
+        by overdue days (see ``AGING_BUCKETS``) and summed per customer and currency in single query.
+        Drafts (``NEW`` invoices) are not receivables yet, as they were never sent to the customer.
+
+        :return: list of dicts with keys ``customer_name``, ``currency``, ``total`` and bucket names
+        """
+        today = today or now().date()
+
+        sums = {'total': Sum('balance_due')}
+        for name, days_from, days_to in self.AGING_BUCKETS:
+            condition = Q()
+            if days_from is not None:
+                condition &= Q(date_due__lte=today - datetime.timedelta(days=days_from))
+            if days_to is not None:
+                condition &= Q(date_due__gte=today - datetime.timedelta(days=days_to))
+            sums[name] = Sum(Case(When(condition, then='balance_due'), default=Value(0), output_field=DecimalField()))
+
+        return list(self.unsettled().exclude(status=self.model.STATUS.NEW).order_by('customer_name', 'currency')
+                    .values('customer_name', 'currency').annotate(**sums))
 
 
 class InvoiceManager(Manager):
     # TODO: Deprecated
     def get_query_set(self):
-        return InvoiceQuerySet(self.model, self._db)
+        return InvoiceQuerySet(self.model, using=self._db)
 
     def get_queryset(self):
-        return InvoiceQuerySet(self.model, self._db)
+        return InvoiceQuerySet(self.model, using=self._db)
 
     def overdue(self):
         return self.get_queryset().overdue()
 
+    def unpaid(self):
+        return self.get_queryset().unpaid()
+
+    def partially_paid(self):
+        return self.get_queryset().partially_paid()
+
+    def aging(self, today=None):
+        return self.get_queryset().aging(today)
+
+    def as_rows(self, projection='list'):
+        return self.get_queryset().as_rows(projection)
+
+    def including_archive(self, *args, **kwargs):
+        """
+        Invoices matching the filter in live and archive tables, which can be further filtered,
+        ordered and paginated (see ``invoicing.archive.InvoicesIncludingArchive``).
+        """
+        from invoicing.archive import including_archive
+        return including_archive(*args, **kwargs)
+
+    def allocate_numbers(self, invoices):
+        """
+        Sets ``number`` and ``full_number`` of new (not yet saved) invoices, e.g. before ``bulk_create()``.
+        Last used number is queried only once per invoice type and numbering period.
+        """
+        last_numbers = {}
+
+        for invoice in invoices:
+            if invoice.number in EMPTY_VALUES:
+                key = (invoice.type,) + invoice._get_counter_period()
+                if key not in last_numbers:
+                    last_numbers[key] = invoice._get_next_number() - 1
+                last_numbers[key] += 1
+                invoice.number = last_numbers[key]
+
+            if invoice.full_number in EMPTY_VALUES:
+                invoice.full_number = invoice._get_full_number()
+
+
+class RecurringInvoiceQuerySet(QuerySet):
+    def due(self, today=None):
+        today = today or now().date()
+        return self.filter(active=True, date_next__lte=today).filter(Q(date_end__isnull=True) | Q(date_end__gte=F('date_next')))
+
+
+class RecurringInvoiceManager(Manager):
+    def get_queryset(self):
+        return RecurringInvoiceQuerySet(self.model, using=self._db)
+
+    def due(self, today=None):
+        return self.get_queryset().due(today)
+
+
+class PartySnapshotManager(Manager):
+    """
+    Snapshots never change, so once read from database they are kept in process memory.
+    """
+    CACHE_SIZE = 1000
+    _cache = {}
+
+    def _remember(self, snapshot):
+        if len(self._cache) >= self.CACHE_SIZE:
+            self._cache.clear()
+        self._cache[('pk', snapshot.pk)] = snapshot
+        self._cache[('digest', snapshot.digest)] = snapshot
+
+    def get_for_data(self, data):
+        """
+        Returns snapshot of party data, creates it if it does not exist yet.
+        """
+        digest = party_digest(data)
+        snapshot = self._cache.get(('digest', digest))
+
+        if snapshot is None:
+            snapshot, created = self.get_or_create(digest=digest, defaults={'data': data})
+            if not created:
+                # new rows are not cached until they are surely committed
+                self._remember(snapshot)
+        return snapshot
+
+    def get_cached(self, pk):
+        snapshot = self._cache.get(('pk', pk))
+
+        if snapshot is None:
+            snapshot = self.get(pk=pk)
+            self._remember(snapshot)
+        return snapshot
+
+
+class InvoiceFacetQuerySet(QuerySet):
+    def adjust(self, changes):
+        """
+        Applies count differences ``{(year, month, type, status): delta}`` by ``count = count + delta`` updates.
+        Missing facets are created.
+        """
+        for (year, month, invoice_type, status), delta in changes.items():
+            if not delta:
+                continue
+
+            facet = self.filter(year=year, month=month, type=invoice_type, status=status)
+            if not facet.update(count=F('count') + delta):
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.create(year=year, month=month, type=invoice_type, status=status, count=delta)
+                except IntegrityError:
+                    # created by concurrent transaction meanwhile
+                    facet.update(count=F('count') + delta)
+
+    def add_invoices(self, invoices, delta=1):
+        """
+        Counts invoices created or deleted in bulk (without ``Invoice.save()`` or ``Invoice.delete()``).
+        """
+        self.adjust(Counter(dict(
+            (key, count * delta) for key, count in Counter(invoice.facet_key for invoice in invoices).items()
+        )))
+
+    def counts(self, *fields, **filters):
+        """
+        Sums of counts grouped by given facet fields, e.g. ``counts('year', 'month', type='INVOICE')``.
+
+        :return: list of dicts with facet fields and ``count``
+        """
+        rows = self.filter(**filters).order_by(*fields).values(*fields).annotate(total=Sum('count'))
+
+        counts = []
+        for row in rows:
+            if row['total']:
+                row['count'] = row.pop('total')
+                counts.append(row)
+        return counts
+
+    def rebuild(self, invoices):
+        """
+        Recomputes all facets from invoices (queryset). Only three columns of invoices are read.
+        """
+        changes = Counter()
+        for date_issue, invoice_type, status in invoices.order_by().values_list('date_issue', 'type', 'status').iterator():
+            changes[(date_issue.year, date_issue.month, invoice_type, status)] += 1
+
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            self.bulk_create([
+                self.model(year=year, month=month, type=invoice_type, status=status, count=count)
+                for (year, month, invoice_type, status), count in changes.items()
+            ])
+
+
+class InvoiceFacetManager(Manager):
+    def get_queryset(self):
+        return InvoiceFacetQuerySet(self.model, using=self._db)
+
+    def adjust(self, changes):
+        return self.get_queryset().adjust(changes)
+
+    def add_invoices(self, invoices, delta=1):
+        return self.get_queryset().add_invoices(invoices, delta)
+
+    def counts(self, *fields, **filters):
+        return self.get_queryset().counts(*fields, **filters)
+
+    def rebuild(self, invoices):
+        return self.get_queryset().rebuild(invoices)
+
+
+class OutboxEventQuerySet(QuerySet):
+    def transaction_id(self):
+        """
+        Id of the current transaction on PostgreSQL (``txid_current()``), 0 on other databases.
+        """
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            return 0
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT txid_current()')
+            return cursor.fetchone()[0]
+
+    def visibility_horizon(self):
+        """
+        Transaction id below which all transactions are finished on PostgreSQL, ``None`` on other databases.
+        """
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+            return cursor.fetchone()[0]
+
+    def record(self, action, object_type, rows, data=None):
+        """
+        Appends events of ``action`` for objects given as (object id, invoice id) pairs by single INSERT.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+
+        # events are written (and their transaction id read) on primary database
+        queryset = self._clone()
+        queryset._for_write = True
+        transaction_id = queryset.transaction_id()
+        queryset.bulk_create([
+            self.model(action=action, object_type=object_type, object_id=object_id, invoice_id=invoice_id, data=data,
+                       transaction_id=transaction_id)
+            for object_id, invoice_id in rows
+        ])
+
+    def record_invoices(self, action, pks, data=None):
+        self.record(action, self.model.OBJECT_TYPE.INVOICE, [(pk, pk) for pk in pks], data)
+
+    def record_items(self, action, items, data=None):
+        self.record(action, self.model.OBJECT_TYPE.ITEM, [(item.pk, item.invoice_id) for item in items], data)
+
+    def after(self, position):
+        """
+        Events after ``position``, tuple (transaction id, event id), in order of positions.
+        """
+        transaction_id, pk = position
+        return self.filter(Q(transaction_id__gt=transaction_id) | Q(transaction_id=transaction_id, pk__gt=pk))\
+            .order_by('transaction_id', 'pk')
+
+    def up_to(self, position):
+        transaction_id, pk = position
+        return self.filter(Q(transaction_id__lt=transaction_id) | Q(transaction_id=transaction_id, pk__lte=pk))
+
+
+class OutboxEventManager(Manager):
+    def get_queryset(self):
+        return OutboxEventQuerySet(self.model, using=self._db)
+
+    def record(self, action, object_type, rows, data=None):
+        return self.get_queryset().record(action, object_type, rows, data)
+
+    def record_invoices(self, action, pks, data=None):
+        return self.get_queryset().record_invoices(action, pks, data)
+
+    def record_items(self, action, items, data=None):
+        return self.get_queryset().record_items(action, items, data)
+
+    def after(self, position):
+        return self.get_queryset().after(position)
+
+    def up_to(self, position):
+        return self.get_queryset().up_to(position)
+
+    def visibility_horizon(self):
+        return self.get_queryset().visibility_horizon()
+
 
 class ItemQuerySet(QuerySet):
     def with_tag(self, tag):
         return self.filter(tag=tag)
 
+    def with_totals(self):
+        return self.annotate(base_amount=item_base_expression(), vat_amount=item_vat_expression())
+
+    def update_in_bulk(self, items, fields, chunk_size=500):
+        """
+        Writes ``fields`` of given item instances by one UPDATE query per chunk (``CASE WHEN pk = ...``),
+        without calling ``Item.save()``. Invoice balances are not recomputed.
+        """
+        from invoicing.models import OutboxEvent
+
+        items = list(items)
+        fields = [self.model._meta.get_field(name) for name in fields]
+        timestamp = now()
+
+        with transaction.atomic(using=self.db):
+            for start in range(0, len(items), chunk_size):
+                chunk = items[start:start + chunk_size]
+                values = dict((field.attname, Case(
+                    *[When(pk=item.pk, then=Value(getattr(item, field.attname), output_field=field)) for item in chunk],
+                    default=F(field.attname), output_field=field
+                )) for field in fields)
+                values['modified'] = timestamp
+                self.filter(pk__in=[item.pk for item in chunk]).update(**values)
+
+            OutboxEvent.objects.using(self.db).record_items(OutboxEvent.ACTION.UPDATED, items)
+
+    def totals_by_invoice(self):
+        """
+        Sums of item prices grouped by invoice in single query.
+
+        :return: dict {invoice_id: {'base': Decimal, 'vat': Decimal}}
+        """
+        rows = self.order_by().values('invoice').annotate(
+            base=Sum(item_base_expression(), output_field=DecimalField()),
+            vat=Sum(item_vat_expression(), output_field=DecimalField()))
+        return dict((row['invoice'], {'base': row['base'] or 0, 'vat': row['vat'] or 0}) for row in rows)
+
+    def totals_by_tax_rate(self):
+        """
+        Sums of item prices grouped by tax rate in single query.
+
+        :return: list of dicts with keys ``tax_rate``, ``base`` and ``vat``
+        """
+        return list(self.order_by('tax_rate').values('tax_rate').annotate(
+            base=Sum(item_base_expression(), output_field=DecimalField()),
+            vat=Sum(item_vat_expression(), output_field=DecimalField())))
+
 
 class ItemManager(Manager):
     # TODO: Deprecated
@@ -37,5 +619,8 @@ class ItemManager(Manager):
     def get_queryset(self):
         return ItemQuerySet(self.model, using=self._db)
 
+    def update_in_bulk(self, items, fields, chunk_size=500):
+        return self.get_queryset().update_in_bulk(items, fields, chunk_size)
+
     def with_tag(self, tag):
         return self.get_queryset().with_tag(tag)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0003_auto_20170123_1810'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='date_tax_point',
+            field=models.DateField(help_text='time of supply', verbose_name='tax point date', db_index=True),
+        ),
+        migrations.CreateModel(
+            name='VATReturnPeriod',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('date_from', models.DateField(verbose_name='date from')),
+                ('date_to', models.DateField(verbose_name='date to')),
+                ('closed', models.BooleanField(default=False, verbose_name='closed')),
+                ('fingerprint', models.CharField(default=None, max_length=255, null=True, verbose_name='fingerprint', editable=False, blank=True)),
+                ('refreshed', models.DateTimeField(default=None, null=True, verbose_name='refreshed', editable=False, blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+            ],
+            options={
+                'ordering': ('-date_from',),
+                'db_table': 'invoicing_vat_return_periods',
+                'verbose_name': 'VAT return period',
+                'verbose_name_plural': 'VAT return periods',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='vatreturnperiod',
+            unique_together=set([('date_from', 'date_to')]),
+        ),
+        migrations.CreateModel(
+            name='VATReturnLine',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('tax_rate', models.DecimalField(decimal_places=1, default=None, max_digits=3, blank=True, null=True, verbose_name='tax rate (%)')),
+                ('customer_country', models.CharField(default=None, max_length=2, null=True, verbose_name='customer country', blank=True)),
+                ('reverse_charge', models.BooleanField(default=False, verbose_name='reverse charge')),
+                ('currency', models.CharField(max_length=10, verbose_name='currency')),
+                ('invoices', models.PositiveIntegerField(default=0, verbose_name='invoices')),
+                ('base', models.DecimalField(default=0, verbose_name='base', max_digits=19, decimal_places=2)),
+                ('vat', models.DecimalField(default=0, verbose_name='VAT', max_digits=19, decimal_places=2)),
+                ('period', models.ForeignKey(related_name='lines', verbose_name='period', to='invoicing.VATReturnPeriod')),
+            ],
+            options={
+                'ordering': ('period', 'currency', 'tax_rate', 'customer_country'),
+                'db_table': 'invoicing_vat_return_lines',
+                'verbose_name': 'VAT return line',
+                'verbose_name_plural': 'VAT return lines',
+            },
+        ),
+    ]
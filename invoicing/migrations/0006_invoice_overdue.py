@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.utils.timezone import now
+
+
+def mark_overdue(apps, schema_editor):
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    Invoice.objects.using(schema_editor.connection.alias)\
+        .filter(date_due__lt=now().date(), status__in=['NEW', 'SENT', 'RETURNED'])\
+        .update(overdue=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0005_invoice_status_date_due_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='date_due',
+            field=models.DateField(help_text='payment till', verbose_name='due date', db_index=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='overdue',
+            field=models.BooleanField(default=False, help_text='updated by mark_overdue command', verbose_name='overdue', db_index=True, editable=False),
+        ),
+        migrations.RunPython(mark_overdue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import invoicing.models
+
+
+BALANCES_SQL = (
+    'UPDATE invoicing_invoices SET '
+    'balance_due = COALESCE((SELECT ROUND(SUM(items.quantity * items.unit_price * (100 - items.discount) / 100 '
+    '* (100 + COALESCE(items.tax_rate, 0)) / 100), 2) '
+    'FROM invoicing_items items WHERE items.invoice_id = invoicing_invoices.id), 0) - credit'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0006_invoice_overdue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_paid',
+            field=models.DecimalField(default=0, editable=False, max_digits=10, decimal_places=2, help_text='sum of payments', verbose_name='amount paid', db_index=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='balance_due',
+            field=models.DecimalField(default=0, editable=False, max_digits=10, decimal_places=2, help_text='total minus payments', verbose_name='balance due', db_index=True),
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('amount', models.DecimalField(verbose_name='amount', max_digits=10, decimal_places=2)),
+                ('date', models.DateField(default=invoicing.models.date_today, verbose_name='date')),
+                ('reference', models.CharField(default=None, max_length=140, null=True, verbose_name='reference', blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+                ('invoice', models.ForeignKey(related_name='payments', verbose_name='invoice', to='invoicing.Invoice')),
+            ],
+            options={
+                'ordering': ('date', 'created'),
+                'db_table': 'invoicing_payments',
+                'verbose_name': 'payment',
+                'verbose_name_plural': 'payments',
+            },
+        ),
+        migrations.RunSQL(BALANCES_SQL, migrations.RunSQL.noop),
+    ]
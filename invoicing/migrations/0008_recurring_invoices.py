@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0007_payments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringInvoice',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('period', models.CharField(default='MONTHLY', max_length=64, verbose_name='period', choices=[('MONTHLY', 'monthly'), ('YEARLY', 'yearly'), ('CUSTOM', 'custom')])),
+                ('interval_days', models.PositiveIntegerField(default=None, help_text='only for custom period', null=True, verbose_name='interval (days)', blank=True)),
+                ('date_next', models.DateField(verbose_name='next issue date', db_index=True)),
+                ('date_end', models.DateField(default=None, null=True, verbose_name='end date', blank=True)),
+                ('active', models.BooleanField(default=True, verbose_name='active')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+                ('template', models.ForeignKey(related_name='recurring_templates', verbose_name='template', to='invoicing.Invoice')),
+            ],
+            options={
+                'ordering': ('date_next',),
+                'db_table': 'invoicing_recurring_invoices',
+                'verbose_name': 'recurring invoice',
+                'verbose_name_plural': 'recurring invoices',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='recurringinvoice',
+            index_together=set([('active', 'date_next')]),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='recurring',
+            field=models.ForeignKey(related_name='invoices', on_delete=django.db.models.deletion.SET_NULL, default=None, editable=False, to='invoicing.RecurringInvoice', blank=True, null=True, verbose_name='recurring invoice'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='recurring_period',
+            field=models.DateField(default=None, verbose_name='recurring period', null=True, editable=False, blank=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='invoice',
+            unique_together=set([('recurring', 'recurring_period')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0008_recurring_invoices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='idempotency_key',
+            field=models.CharField(default=None, editable=False, max_length=255, blank=True, help_text='client supplied key of ingested invoice', null=True, verbose_name='idempotency key', unique=True),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import models, migrations
+import django.db.models.deletion
+import jsonfield.fields
+
+from invoicing.snapshots import PARTIES, empty_values, is_empty, party_data, party_digest
+
+
+CHUNK_SIZE = 2000
+
+
+def link_party_snapshots(apps, schema_editor):
+    """
+    Creates one snapshot per distinct supplier and bank details of existing invoices and links invoices to them.
+    Invoice columns are emptied only if ``settings.INVOICING_PARTY_SNAPSHOTS`` is enabled.
+    Data are hashed by ``party_data()`` like in ``Invoice.save()``, which decodes raw JSON of additional info
+    loaded here, so later saved invoices are linked to the same snapshots.
+    """
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    PartySnapshot = apps.get_model('invoicing', 'PartySnapshot')
+    compact = getattr(settings, 'INVOICING_PARTY_SNAPSHOTS', False)
+
+    fields = ['id'] + [name for snapshot_field, party_fields in PARTIES for name in party_fields]
+    snapshots = {}
+    last_pk = 0
+
+    while True:
+        rows = list(Invoice.objects.filter(pk__gt=last_pk).order_by('pk').values(*fields)[:CHUNK_SIZE])
+        if not rows:
+            break
+        last_pk = rows[-1]['id']
+
+        for snapshot_field, party_fields in PARTIES:
+            links = {}
+            for row in rows:
+                if is_empty(row, party_fields):
+                    continue
+                data = party_data(row, party_fields)
+                digest = party_digest(data)
+                if digest not in snapshots:
+                    snapshots[digest] = PartySnapshot.objects.get_or_create(digest=digest, defaults={'data': data})[0].pk
+                links.setdefault(snapshots[digest], []).append(row['id'])
+
+            update = empty_values(Invoice, party_fields) if compact else {}
+            for snapshot_id, pks in links.items():
+                update[snapshot_field + '_id'] = snapshot_id
+                Invoice.objects.filter(pk__in=pks).update(**update)
+
+
+def unlink_party_snapshots(apps, schema_editor):
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    PartySnapshot = apps.get_model('invoicing', 'PartySnapshot')
+
+    # linked invoices have either the same details or emptied columns, so all of them are restored
+    for snapshot in PartySnapshot.objects.all():
+        for snapshot_field, party_fields in PARTIES:
+            if set(snapshot.data) == set(party_fields):
+                Invoice.objects.filter(**{snapshot_field: snapshot}).update(**snapshot.data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0009_invoice_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartySnapshot',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('digest', models.CharField(verbose_name='digest', unique=True, max_length=64, editable=False)),
+                ('data', jsonfield.fields.JSONField(verbose_name='data', editable=False)),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+            ],
+            options={
+                'db_table': 'invoicing_party_snapshots',
+                'verbose_name': 'party snapshot',
+                'verbose_name_plural': 'party snapshots',
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='supplier_snapshot',
+            field=models.ForeignKey(related_name='+', on_delete=django.db.models.deletion.PROTECT, default=None, editable=False, to='invoicing.PartySnapshot', blank=True, null=True, verbose_name='supplier snapshot'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='bank_snapshot',
+            field=models.ForeignKey(related_name='+', on_delete=django.db.models.deletion.PROTECT, default=None, editable=False, to='invoicing.PartySnapshot', blank=True, null=True, verbose_name='bank snapshot'),
+        ),
+        migrations.RunPython(link_party_snapshots, unlink_party_snapshots),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import invoicing.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0010_party_snapshots'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='supplier_additional_info',
+            field=invoicing.fields.LazyJSONField(default=None, null=True, verbose_name='supplier additional information', blank=True),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='customer_additional_info',
+            field=invoicing.fields.LazyJSONField(default=None, null=True, verbose_name='customer additional information', blank=True),
+        ),
+    ]
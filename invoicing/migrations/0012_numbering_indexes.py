@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import IntegrityError, models, migrations
+from django.db.models import Count
+
+
+def check_duplicate_numbers(apps, schema_editor):
+    """
+    Unique (type, full_number) index cannot be created while invoices share the number. Issued numbers
+    are not changed automatically, duplicates are listed so they can be renumbered by hand.
+    """
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    duplicates = list(
+        Invoice.objects.using(schema_editor.connection.alias).order_by()
+        .values('type', 'full_number').annotate(count=Count('id')).filter(count__gt=1)
+        .values_list('type', 'full_number', 'count')[:20]
+    )
+
+    if duplicates:
+        raise IntegrityError(
+            'Invoice full numbers must be unique per invoice type before migration, duplicates (type, full number, '
+            'count): %s' % ', '.join('(%s, "%s", %d)' % duplicate for duplicate in duplicates))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0011_lazy_additional_info'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='invoice',
+            index_together=set([('status', 'date_due'), ('type', 'date_issue', 'number')]),
+        ),
+        migrations.RunPython(check_duplicate_numbers, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='invoice',
+            unique_together=set([('recurring', 'recurring_period'), ('type', 'full_number')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='item',
+            index_together=set([('invoice', 'weight', 'created')]),
+        ),
+    ]
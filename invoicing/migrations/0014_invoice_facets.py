@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import Counter
+
+from django.db import models, migrations
+
+
+def count_invoices(apps, schema_editor):
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    InvoiceFacet = apps.get_model('invoicing', 'InvoiceFacet')
+
+    counts = Counter()
+    for date_issue, invoice_type, status in Invoice.objects.order_by().values_list('date_issue', 'type', 'status').iterator():
+        counts[(date_issue.year, date_issue.month, invoice_type, status)] += 1
+
+    InvoiceFacet.objects.bulk_create([
+        InvoiceFacet(year=year, month=month, type=invoice_type, status=status, count=count)
+        for (year, month, invoice_type, status), count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0013_invoice_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceFacet',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('year', models.PositiveSmallIntegerField(verbose_name='year')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='month')),
+                ('type', models.CharField(max_length=64, verbose_name='type', choices=[('INVOICE', 'Invoice'), ('ADVANCE', 'Advance invoice'), ('PROFORMA', 'Proforma invoice'), ('VAT_CREDIT_NOTE', 'VAT credit note')])),
+                ('status', models.CharField(max_length=64, verbose_name='status', choices=[('NEW', 'new'), ('SENT', 'sent'), ('RETURNED', 'returned'), ('CANCELED', 'canceled'), ('PAID', 'paid')])),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+            ],
+            options={
+                'ordering': ('year', 'month', 'type', 'status'),
+                'db_table': 'invoicing_invoice_facets',
+                'verbose_name': 'invoice facet',
+                'verbose_name_plural': 'invoice facets',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='invoicefacet',
+            unique_together=set([('year', 'month', 'type', 'status')]),
+        ),
+        migrations.RunPython(count_invoices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.db.models.deletion
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0014_invoice_facets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSnapshot',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('invoice', models.OneToOneField(related_name='snapshot', on_delete=django.db.models.deletion.PROTECT, editable=False, to='invoicing.Invoice', verbose_name='invoice')),
+                ('subtotal', models.DecimalField(verbose_name='subtotal', editable=False, max_digits=10, decimal_places=2)),
+                ('vat', models.DecimalField(verbose_name='VAT', editable=False, max_digits=10, decimal_places=2)),
+                ('total', models.DecimalField(verbose_name='total', editable=False, max_digits=10, decimal_places=2)),
+                ('vat_summary', jsonfield.fields.JSONField(verbose_name='VAT summary', editable=False)),
+                ('checksum', models.CharField(verbose_name='checksum', max_length=64, editable=False)),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+            ],
+            options={
+                'db_table': 'invoicing_invoice_snapshots',
+                'verbose_name': 'invoice snapshot',
+                'verbose_name_plural': 'invoice snapshots',
+            },
+        ),
+        migrations.CreateModel(
+            name='InvoiceDocument',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('invoice', models.ForeignKey(related_name='documents', on_delete=django.db.models.deletion.PROTECT, editable=False, to='invoicing.Invoice', verbose_name='invoice')),
+                ('format', models.CharField(verbose_name='format', max_length=64, editable=False)),
+                ('content_type', models.CharField(verbose_name='content type', max_length=255, editable=False)),
+                ('data', models.BinaryField(verbose_name='data')),
+                ('checksum', models.CharField(verbose_name='checksum', max_length=64, editable=False)),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+            ],
+            options={
+                'db_table': 'invoicing_invoice_documents',
+                'verbose_name': 'invoice document',
+                'verbose_name_plural': 'invoice documents',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='invoicedocument',
+            unique_together=set([('invoice', 'format')]),
+        ),
+    ]
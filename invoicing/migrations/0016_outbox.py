@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0015_invoice_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('object_type', models.CharField(max_length=64, verbose_name='object type', choices=[('INVOICE', 'invoice'), ('ITEM', 'item')])),
+                ('object_id', models.IntegerField(verbose_name='object ID')),
+                ('invoice_id', models.IntegerField(verbose_name='invoice ID')),
+                ('action', models.CharField(max_length=64, verbose_name='action', choices=[('CREATED', 'created'), ('UPDATED', 'updated'), ('DELETED', 'deleted'), ('STATUS_CHANGED', 'status changed'), ('ARCHIVED', 'archived')])),
+                ('data', jsonfield.fields.JSONField(default=None, null=True, verbose_name='data', blank=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created')),
+            ],
+            options={
+                'ordering': ('id',),
+                'db_table': 'invoicing_outbox_events',
+                'verbose_name': 'outbox event',
+                'verbose_name_plural': 'outbox events',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxCursor',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('consumer', models.CharField(unique=True, max_length=128, verbose_name='consumer')),
+                ('position', models.IntegerField(default=0, verbose_name='position')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+            ],
+            options={
+                'db_table': 'invoicing_outbox_cursors',
+                'verbose_name': 'outbox cursor',
+                'verbose_name_plural': 'outbox cursors',
+            },
+        ),
+    ]
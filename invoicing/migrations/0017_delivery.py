@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0016_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='customer_email',
+            field=models.EmailField(default=None, max_length=254, blank=True, help_text='digital delivery address', null=True, verbose_name='customer email'),
+        ),
+        migrations.CreateModel(
+            name='DeliveryAttempt',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('recipient', models.EmailField(max_length=254, verbose_name='recipient')),
+                ('status', models.CharField(max_length=64, verbose_name='status', choices=[('SENT', 'sent'), ('FAILED', 'failed')])),
+                ('error', models.TextField(default=None, null=True, verbose_name='error', blank=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created')),
+                ('invoice', models.ForeignKey(related_name='delivery_attempts', verbose_name='invoice', to='invoicing.Invoice')),
+            ],
+            options={
+                'ordering': ('created',),
+                'db_table': 'invoicing_delivery_attempts',
+                'verbose_name': 'delivery attempt',
+                'verbose_name_plural': 'delivery attempts',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='deliveryattempt',
+            index_together=set([('invoice', 'status')]),
+        ),
+    ]
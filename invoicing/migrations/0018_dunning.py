@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+import jsonfield.fields
+from djmoney.forms.widgets import CURRENCY_CHOICES
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0017_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='dunning_level',
+            field=models.PositiveSmallIntegerField(default=0, help_text='level of the last payment reminder', verbose_name='dunning level', editable=False),
+        ),
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('customer_name', models.CharField(max_length=255, verbose_name='customer name')),
+                ('recipient', models.EmailField(default=None, max_length=254, null=True, verbose_name='recipient', blank=True)),
+                ('currency', models.CharField(max_length=10, verbose_name='currency', choices=CURRENCY_CHOICES)),
+                ('level', models.PositiveSmallIntegerField(verbose_name='level')),
+                ('outstanding', models.DecimalField(verbose_name='outstanding', max_digits=10, decimal_places=2)),
+                ('invoice_ids', jsonfield.fields.JSONField(default=list, verbose_name='invoices')),
+                ('status', models.CharField(default='NEW', max_length=64, verbose_name='status', choices=[('NEW', 'not sent'), ('SENT', 'sent'), ('FAILED', 'failed')])),
+                ('error', models.TextField(default=None, null=True, verbose_name='error', blank=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created', db_index=True)),
+            ],
+            options={
+                'ordering': ('-created',),
+                'db_table': 'invoicing_reminders',
+                'verbose_name': 'reminder',
+                'verbose_name_plural': 'reminders',
+            },
+        ),
+    ]
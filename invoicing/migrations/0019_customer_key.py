@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from invoicing.utils import get_customer_key
+
+
+def set_customer_keys(apps, schema_editor):
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    invoices = Invoice.objects.using(schema_editor.connection.alias)
+    identities = invoices.order_by()\
+        .values_list('customer_vat_id', 'customer_registration_id', 'customer_country').distinct()
+
+    for vat_id, registration_id, country in list(identities):
+        key = get_customer_key(vat_id, registration_id, country)
+        if key is not None:
+            invoices.filter(customer_vat_id=vat_id, customer_registration_id=registration_id,
+                            customer_country=country).update(customer_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0018_dunning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='customer_key',
+            field=models.CharField(default=None, editable=False, max_length=255, blank=True, help_text='normalized VAT ID or registration ID with country', null=True, verbose_name='customer key'),
+        ),
+        migrations.RunPython(set_customer_keys, migrations.RunPython.noop),
+        migrations.AlterIndexTogether(
+            name='invoice',
+            index_together=set([('status', 'date_due'), ('type', 'date_issue', 'number'), ('customer_key', 'currency', 'date_issue')]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def reset_periods(apps, schema_editor):
+    # closed periods are built again with their entries
+    VATReturnPeriod = apps.get_model('invoicing', 'VATReturnPeriod')
+    VATReturnPeriod.objects.using(schema_editor.connection.alias).update(refreshed=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0019_customer_key'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='vatreturnperiod',
+            name='fingerprint',
+        ),
+        migrations.CreateModel(
+            name='VATReturnEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('invoice_id', models.IntegerField(verbose_name='invoice ID', db_index=True)),
+                ('tax_rate', models.DecimalField(decimal_places=1, default=None, max_digits=3, blank=True, null=True, verbose_name='tax rate (%)')),
+                ('customer_country', models.CharField(default=None, max_length=2, null=True, verbose_name='customer country', blank=True)),
+                ('reverse_charge', models.BooleanField(default=False, verbose_name='reverse charge')),
+                ('currency', models.CharField(max_length=10, verbose_name='currency')),
+                ('base', models.DecimalField(default=0, verbose_name='base', max_digits=19, decimal_places=2)),
+                ('vat', models.DecimalField(default=0, verbose_name='VAT', max_digits=19, decimal_places=2)),
+                ('period', models.ForeignKey(related_name='entries', verbose_name='period', to='invoicing.VATReturnPeriod')),
+            ],
+            options={
+                'db_table': 'invoicing_vat_return_entries',
+                'verbose_name': 'VAT return entry',
+                'verbose_name_plural': 'VAT return entries',
+            },
+        ),
+        migrations.RunPython(reset_periods, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from invoicing.search import SQLiteSearchBackend
+
+
+def recreate_triggers(apps, schema_editor):
+    # invoices table was rebuilt by SQLite schema changes since 0013, which dropped triggers of FTS table
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and SQLiteSearchBackend.is_available(connection):
+        cursor = connection.cursor()
+        SQLiteSearchBackend.drop_triggers(cursor)
+        SQLiteSearchBackend.create_triggers(cursor)
+        SQLiteSearchBackend.rebuild_index(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0020_vat_return_entries'),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_triggers, migrations.RunPython.noop),
+    ]
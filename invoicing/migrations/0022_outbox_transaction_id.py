@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0021_search_triggers'),
+    ]
+
+    # existing events and cursors get transaction id 0, so their positions keep the order of ids
+    operations = [
+        migrations.AddField(
+            model_name='outboxevent',
+            name='transaction_id',
+            field=models.BigIntegerField(default=0, verbose_name='transaction ID', editable=False),
+        ),
+        migrations.AddField(
+            model_name='outboxcursor',
+            name='transaction_id',
+            field=models.BigIntegerField(default=0, verbose_name='transaction ID'),
+        ),
+        migrations.AlterModelOptions(
+            name='outboxevent',
+            options={'ordering': ('transaction_id', 'id'), 'verbose_name': 'outbox event', 'verbose_name_plural': 'outbox events'},
+        ),
+        migrations.AlterIndexTogether(
+            name='outboxevent',
+            index_together=set([('transaction_id', 'id')]),
+        ),
+    ]
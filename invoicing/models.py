@@ -5,6 +5,11 @@ try:
 except ImportError:
     from ordereddict import OrderedDict
 
+import calendar
+import datetime
+import hashlib
+import json
+import zlib
 from decimal import Decimal
 from django_countries.fields import CountryField
 from django_iban.fields import IBANField, SWIFTBICField
@@ -14,20 +19,28 @@ from model_utils import Choices
 from model_utils.fields import MonitorField
 
 from django.conf import settings
-from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.core.urlresolvers import reverse
 from django.core.validators import EMPTY_VALUES, MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, router, transaction
 from django.db.models import Max
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.template import Template, Context
 from django.utils.timezone import now
 from django.utils.translation import ugettext_lazy as _
 
-from invoicing.fields import VATField
-from invoicing.managers import InvoiceManager, ItemManager
+from invoicing.fields import LazyJSONField, VATField
+from invoicing.managers import InvoiceFacetManager, InvoiceManager, ItemManager, OutboxEventManager, \
+    PartySnapshotManager, RecurringInvoiceManager
+from invoicing.snapshots import PARTIES, empty_values, is_empty, party_data
 from invoicing.taxation import TaxationPolicy
 from invoicing.taxation.eu import EUTaxationPolicy
-from invoicing.utils import import_name
+from invoicing.utils import get_customer_key, import_name
+
+
+def date_today():
+    return now().date()
 
 
 def default_supplier(attribute_lookup):
@@ -69,6 +82,17 @@ class Invoice(models.Model):
         ('PAID', _(u'paid'))
     )
 
+    SETTLED_STATUSES = (STATUS.PAID, STATUS.CANCELED)
+    UNSETTLED_STATUSES = (STATUS.NEW, STATUS.SENT, STATUS.RETURNED)
+
+    # target status: allowed source statuses
+    STATUS_TRANSITIONS = {
+        STATUS.SENT: (STATUS.NEW, STATUS.RETURNED),
+        STATUS.RETURNED: (STATUS.SENT,),
+        STATUS.PAID: (STATUS.NEW, STATUS.SENT, STATUS.RETURNED),
+        STATUS.CANCELED: (STATUS.NEW, STATUS.SENT, STATUS.RETURNED),
+    }
+
     PAYMENT_METHOD = Choices(
         ('BANK_TRANSFER', _(u'bank transfer')),
         ('CASH', _(u'cash')),
@@ -123,15 +147,22 @@ class Invoice(models.Model):
     note = models.CharField(_(u'note'), max_length=255,
         blank=True, null=True, default=_(u'Thank you for using our services.'))
     date_issue = models.DateField(_(u'issue date'))
-    date_tax_point = models.DateField(_(u'tax point date'), help_text=_(u'time of supply'))
-    date_due = models.DateField(_(u'due date'), help_text=_(u'payment till'))
+    date_tax_point = models.DateField(_(u'tax point date'), help_text=_(u'time of supply'), db_index=True)
+    date_due = models.DateField(_(u'due date'), help_text=_(u'payment till'), db_index=True)
     date_sent = MonitorField(monitor='status', when=[STATUS.SENT],
         blank=True, null=True, default=None)
+    overdue = models.BooleanField(_(u'overdue'), default=False, db_index=True, editable=False,
+        help_text=_(u'updated by mark_overdue command'))
+    dunning_level = models.PositiveSmallIntegerField(_(u'dunning level'), default=0, editable=False,
+        help_text=_(u'level of the last payment reminder'))
 
     # Payment details
     currency = models.CharField(_(u'currency'), max_length=10, choices=CURRENCY_CHOICES)
     credit = models.DecimalField(_(u'credit'), max_digits=10, decimal_places=2, default=0)
-    #already_paid = models.DecimalField(_(u'already paid'), max_digits=10, decimal_places=2, default=0)
+    amount_paid = models.DecimalField(_(u'amount paid'), max_digits=10, decimal_places=2, default=0,
+        db_index=True, editable=False, help_text=_(u'sum of payments'))
+    balance_due = models.DecimalField(_(u'balance due'), max_digits=10, decimal_places=2, default=0,
+        db_index=True, editable=False, help_text=_(u'total minus payments'))
 
     payment_method = models.CharField(_(u'payment method'), choices=PAYMENT_METHOD, max_length=64)
     constant_symbol = models.CharField(_(u'constant symbol'), max_length=64, choices=CONSTANT_SYMBOL,
@@ -173,7 +204,7 @@ class Invoice(models.Model):
         blank=True, null=True, default=None)
     supplier_vat_id = VATField(_(u'supplier VAT No.'),
         blank=True, null=True, default=None)
-    supplier_additional_info = JSONField(_(u'supplier additional information'),
+    supplier_additional_info = LazyJSONField(_(u'supplier additional information'),
         load_kwargs={'object_pairs_hook': OrderedDict},
         blank=True, null=True, default=None)  # for example www or legal matters
 
@@ -200,7 +231,11 @@ class Invoice(models.Model):
         blank=True, null=True, default=None)
     customer_vat_id = VATField(_(u'customer VAT No.'),
         blank=True, null=True, default=None)
-    customer_additional_info = JSONField(_(u'customer additional information'),
+    customer_email = models.EmailField(_(u'customer email'), help_text=_(u'digital delivery address'),
+        blank=True, null=True, default=None)
+    customer_key = models.CharField(_(u'customer key'), max_length=255, editable=False,
+        blank=True, null=True, default=None, help_text=_(u'normalized VAT ID or registration ID with country'))
+    customer_additional_info = LazyJSONField(_(u'customer additional information'),
         load_kwargs={'object_pairs_hook': OrderedDict},
         blank=True, null=True, default=None)
 
@@ -220,6 +255,22 @@ class Invoice(models.Model):
     delivery_method = models.CharField(_(u'delivery method'), choices=DELIVERY_METHOD, max_length=64,
         default=DELIVERY_METHOD.PERSONAL_PICKUP)
 
+    # Party snapshots (see settings.INVOICING_PARTY_SNAPSHOTS)
+    supplier_snapshot = models.ForeignKey('PartySnapshot', verbose_name=_(u'supplier snapshot'), related_name='+',
+        on_delete=models.PROTECT, editable=False, blank=True, null=True, default=None)
+    bank_snapshot = models.ForeignKey('PartySnapshot', verbose_name=_(u'bank snapshot'), related_name='+',
+        on_delete=models.PROTECT, editable=False, blank=True, null=True, default=None)
+
+    # Ingestion
+    idempotency_key = models.CharField(_(u'idempotency key'), max_length=255, unique=True, editable=False,
+        blank=True, null=True, default=None, help_text=_(u'client supplied key of ingested invoice'))
+
+    # Recurring billing
+    recurring = models.ForeignKey('RecurringInvoice', verbose_name=_(u'recurring invoice'), related_name='invoices',
+        on_delete=models.SET_NULL, editable=False, blank=True, null=True, default=None)
+    recurring_period = models.DateField(_(u'recurring period'), editable=False,
+        blank=True, null=True, default=None)
+
     # Other
     created = models.DateTimeField(_(u'created'), auto_now_add=True)
     modified = models.DateTimeField(_(u'modified'), auto_now=True)
@@ -230,6 +281,15 @@ class Invoice(models.Model):
         verbose_name = _(u'invoice')
         verbose_name_plural = _(u'invoices')
         ordering = ('date_issue', 'number')
+        index_together = (
+            ('status', 'date_due'),
+            ('type', 'date_issue', 'number'),
+            ('customer_key', 'currency', 'date_issue'),
+        )
+        unique_together = (
+            ('recurring', 'recurring_period'),
+            ('type', 'full_number'),
+        )
 
     def __str__(self):
         return self.full_number
@@ -244,7 +304,101 @@ class Invoice(models.Model):
         if self.full_number in EMPTY_VALUES:
             self.full_number = self._get_full_number()
 
-        return super(Invoice, self).save(**kwargs)
+        self.overdue = self.is_overdue
+        self.customer_key = get_customer_key(self.customer_vat_id, self.customer_registration_id, self.customer_country)
+
+        compacted = {}
+        if getattr(settings, 'INVOICING_PARTY_SNAPSHOTS', False) and kwargs.get('update_fields') is None:
+            compacted = self._compact_parties()
+
+        adding = self._state.adding
+        old_facet_key = getattr(self, '_facet_key', None)
+        facet_key = self.facet_key
+        status_changed = old_facet_key is None or old_facet_key[3] != self.status
+
+        try:
+            with transaction.atomic():
+                result = super(Invoice, self).save(**kwargs)
+                self.update_balance()
+
+                if adding:
+                    InvoiceFacet.objects.adjust({facet_key: 1})
+                elif old_facet_key is not None and old_facet_key != facet_key:
+                    InvoiceFacet.objects.adjust({old_facet_key: -1, facet_key: 1})
+
+                OutboxEvent.objects.record_invoices(OutboxEvent.ACTION.CREATED if adding else OutboxEvent.ACTION.UPDATED, [self.pk])
+                if not adding and old_facet_key is not None and status_changed:
+                    OutboxEvent.objects.record_invoices(OutboxEvent.ACTION.STATUS_CHANGED, [self.pk], {'status': self.status})
+
+                if self.status == Invoice.STATUS.RETURNED and status_changed:
+                    from invoicing.finalization import reopen
+                    reopen([self.pk], using=router.db_for_write(Invoice, instance=self))
+        finally:
+            # instance keeps its values, only database row is compacted
+            for name, value in compacted.items():
+                setattr(self, name, value)
+
+        self._facet_key = facet_key
+
+        # documents are rendered after the invoice is saved, see ``InvoiceQuerySet.transition()``
+        if self.status == Invoice.STATUS.SENT and status_changed:
+            from invoicing.finalization import finalize
+            finalize([self.pk], using=router.db_for_write(Invoice, instance=self))
+        return result
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Invoice, cls).from_db(db, field_names, values)
+        instance._load_parties()
+
+        if all(name in instance.__dict__ for name in ('date_issue', 'type', 'status')):
+            instance._facet_key = instance.facet_key
+        return instance
+
+    @property
+    def facet_key(self):
+        """
+        Key of ``InvoiceFacet`` counting this invoice: (year, month, type, status).
+        """
+        date_issue = self._meta.get_field('date_issue').to_python(self.date_issue)
+        return date_issue.year, date_issue.month, self.type, self.status
+
+    def _compact_parties(self):
+        """
+        Moves supplier and bank details to shared content-addressed snapshots and empties their columns.
+
+        :return: dict of original field values
+        """
+        compacted = {}
+
+        for snapshot_field, fields in PARTIES:
+            if is_empty(self, fields):
+                continue
+
+            setattr(self, snapshot_field, PartySnapshot.objects.get_for_data(party_data(self, fields)))
+            for name, value in empty_values(Invoice, fields).items():
+                compacted[name] = getattr(self, name)
+                setattr(self, name, value)
+
+        return compacted
+
+    def _load_parties(self):
+        """
+        Fills compacted supplier and bank details from their snapshots, so attribute access works as before.
+        """
+        for snapshot_field, fields in PARTIES:
+            snapshot_id = self.__dict__.get(snapshot_field + '_id')
+            if snapshot_id is not None and is_empty(self, fields):
+                for name, value in PartySnapshot.objects.get_cached(snapshot_id).data.items():
+                    setattr(self, name, value)
+
+    def update_balance(self):
+        """
+        Recomputes ``amount_paid`` and ``balance_due`` from payments and items.
+        """
+        Invoice.objects.filter(pk=self.pk).update_balances()
+        self.amount_paid, self.balance_due, self.modified = Invoice.objects.filter(pk=self.pk)\
+            .values_list('amount_paid', 'balance_due', 'modified')[0]
 
     def get_absolute_url(self):
         return reverse('invoicing:invoice_detail', args=(self.pk,))
@@ -264,25 +418,35 @@ class Invoice(models.Model):
 
         :return: string (generated next number)
         """
+        date_from, date_to = self._get_counter_period()
+        relative_invoices = Invoice.objects.db_manager(router.db_for_write(Invoice, instance=self))\
+            .filter(date_issue__gte=date_from, date_issue__lte=date_to, type=self.type)
+        last_number = relative_invoices.aggregate(Max('number'))['number__max'] or 0
+
+        return last_number + 1
+
+    def _get_counter_period(self):
+        """
+        Returns first and last day of numbering period (``settings.INVOICING_COUNTER_PERIOD``) of invoice.
+
+        :return: tuple (date from, date to)
+        """
         invoice_counter_reset = getattr(settings, 'INVOICING_COUNTER_PERIOD', Invoice.COUNTER_PERIOD.YEARLY)
 
         important_date = self.date_tax_point  # self.date_issue
         if invoice_counter_reset == Invoice.COUNTER_PERIOD.DAILY:
-            relative_invoices = Invoice.objects.filter(date_issue=important_date, type=self.type)
+            return important_date, important_date
 
         elif invoice_counter_reset == Invoice.COUNTER_PERIOD.YEARLY:
-            relative_invoices = Invoice.objects.filter(date_issue__year=important_date.year, type=self.type)
+            return datetime.date(important_date.year, 1, 1), datetime.date(important_date.year, 12, 31)
 
         elif invoice_counter_reset == Invoice.COUNTER_PERIOD.MONTHLY:
-            relative_invoices = Invoice.objects.filter(date_issue__year=important_date.year, date_issue__month=important_date.month, type=self.type)
+            last_day = calendar.monthrange(important_date.year, important_date.month)[1]
+            return important_date.replace(day=1), important_date.replace(day=last_day)
 
         else:
             raise ImproperlyConfigured("INVOICING_COUNTER_PERIOD can be set only to these values: DAILY, MONTHLY, YEARLY.")
 
-        last_number = relative_invoices.aggregate(Max('number'))['number__max'] or 0
-
-        return last_number + 1
-
     def _get_full_number(self):
         """
         Generates on the fly invoice full number from template provided by ``settings.INVOICING_NUMBER_FORMAT``.
@@ -324,7 +488,7 @@ class Invoice(models.Model):
 
     @property
     def is_overdue(self):
-        return self.date_due < now().date() and self.status not in [self.STATUS.PAID, self.STATUS.CANCELED]
+        return self.date_due < now().date() and self.status not in self.SETTLED_STATUSES
 
     @property
     def overdue_days(self):
@@ -363,6 +527,7 @@ class Invoice(models.Model):
         self.customer_registration_id = customer.get('registration_id', None)
         self.customer_tax_id = customer.get('tax_id', None)
         self.customer_vat_id = customer.get('vat_id', None)
+        self.customer_email = customer.get('email', None)
         self.customer_additional_info = customer.get('additional_info', None)
         
     def set_shipping_data(self, shipping):
@@ -428,7 +593,6 @@ class Invoice(models.Model):
 
         #total *= float((100 - float(self.discount)) / 100)  # subtract discount amount
         total -= float(self.credit)  # subtract credit
-        #total -= self.already_paid  # subtract already paid
         return round(total, 2)
 
 
@@ -464,6 +628,9 @@ class Item(models.Model):
         verbose_name = _(u'item')
         verbose_name_plural = _(u'items')
         ordering = ('-invoice', 'weight', 'created')
+        index_together = (
+            ('invoice', 'weight', 'created'),
+        )
 
     def __unicode__(self):
         return self.title
@@ -490,4 +657,503 @@ class Item(models.Model):
         # If tax rate is not set while creating new invoice item, set it according billing details
         if self.tax_rate in EMPTY_VALUES and self.pk is None:
             self.tax_rate = self.invoice.get_tax_rate()
-        return super(Item, self).save(**kwargs)
+
+        adding = self._state.adding
+
+        with transaction.atomic():
+            result = super(Item, self).save(**kwargs)
+            Invoice.objects.filter(pk=self.invoice_id).update_balances()
+            OutboxEvent.objects.record_items(OutboxEvent.ACTION.CREATED if adding else OutboxEvent.ACTION.UPDATED, [self])
+        return result
+
+    def delete(self, **kwargs):
+        # outbox event is recorded by post_delete receiver, which covers queryset deletes as well
+        with transaction.atomic():
+            result = super(Item, self).delete(**kwargs)
+            Invoice.objects.filter(pk=self.invoice_id).update_balances()
+        return result
+
+
+@receiver(post_delete, sender=Item)
+def record_deleted_item(sender, instance, using, **kwargs):
+    """
+    Records ``DELETED`` outbox event of every deleted item: by ``Item.delete()``, ``QuerySet.delete()``
+    (e.g. admin inline) or cascade.
+    """
+    OutboxEvent.objects.using(using).record_items(OutboxEvent.ACTION.DELETED, [instance])
+
+
+class Payment(models.Model):
+    """
+    Payment (or partial payment) of invoice. Every change of payments updates
+    denormalized ``Invoice.amount_paid`` and ``Invoice.balance_due`` in the same transaction.
+    """
+    invoice = models.ForeignKey(Invoice, verbose_name=_(u'invoice'), related_name='payments')
+    amount = models.DecimalField(_(u'amount'), max_digits=10, decimal_places=2)
+    date = models.DateField(_(u'date'), default=date_today)
+    reference = models.CharField(_(u'reference'), max_length=140,
+        blank=True, null=True, default=None)
+    created = models.DateTimeField(_(u'created'), auto_now_add=True)
+    modified = models.DateTimeField(_(u'modified'), auto_now=True)
+
+    class Meta:
+        db_table = 'invoicing_payments'
+        verbose_name = _(u'payment')
+        verbose_name_plural = _(u'payments')
+        ordering = ('date', 'created')
+
+    def __unicode__(self):
+        return u'%s %s' % (self.amount, self.invoice.currency)
+
+    def save(self, **kwargs):
+        with transaction.atomic():
+            result = super(Payment, self).save(**kwargs)
+            Invoice.objects.filter(pk=self.invoice_id).update_balances()
+            OutboxEvent.objects.record_invoices(OutboxEvent.ACTION.UPDATED, [self.invoice_id])
+        return result
+
+    def delete(self, **kwargs):
+        with transaction.atomic():
+            result = super(Payment, self).delete(**kwargs)
+            Invoice.objects.filter(pk=self.invoice_id).update_balances()
+            OutboxEvent.objects.record_invoices(OutboxEvent.ACTION.UPDATED, [self.invoice_id])
+        return result
+
+
+class InvoiceFacet(models.Model):
+    """
+    Number of invoices by issue month, type and status. Counts are updated incrementally
+    when invoices are saved, deleted or change status, so admin filters and dashboards
+    do not need to count the invoices table.
+    """
+    year = models.PositiveSmallIntegerField(_(u'year'))
+    month = models.PositiveSmallIntegerField(_(u'month'))
+    type = models.CharField(_(u'type'), max_length=64, choices=Invoice.TYPE)
+    status = models.CharField(_(u'status'), max_length=64, choices=Invoice.STATUS)
+    count = models.IntegerField(_(u'count'), default=0)
+    objects = InvoiceFacetManager()
+
+    class Meta:
+        db_table = 'invoicing_invoice_facets'
+        verbose_name = _(u'invoice facet')
+        verbose_name_plural = _(u'invoice facets')
+        ordering = ('year', 'month', 'type', 'status')
+        unique_together = (('year', 'month', 'type', 'status'),)
+
+    def __unicode__(self):
+        return u'%d/%02d %s %s: %d' % (self.year, self.month, self.type, self.status, self.count)
+
+
+@receiver(post_delete, sender=Invoice)
+def record_deleted_invoice(sender, instance, using, **kwargs):
+    """
+    Decrements facet and records ``DELETED`` outbox event of every deleted invoice: by ``Invoice.delete()``,
+    ``QuerySet.delete()`` (e.g. admin action) or cascade. Archiving deletes invoices by raw SQL
+    and adjusts facets and records its events itself.
+    """
+    facet_key = getattr(instance, '_facet_key', None) or instance.facet_key
+    InvoiceFacet.objects.using(using).adjust({facet_key: -1})
+    OutboxEvent.objects.using(using).record_invoices(OutboxEvent.ACTION.DELETED, [instance.pk])
+
+
+class PartySnapshot(models.Model):
+    """
+    Supplier or bank details shared by invoices, addressed by hash of their content.
+    With ``settings.INVOICING_PARTY_SNAPSHOTS`` enabled, invoices reference these rows
+    instead of repeating the same details in every invoice row.
+    """
+    digest = models.CharField(_(u'digest'), max_length=64, unique=True, editable=False)
+    data = JSONField(_(u'data'), load_kwargs={'object_pairs_hook': OrderedDict}, editable=False)
+    created = models.DateTimeField(_(u'created'), auto_now_add=True)
+    objects = PartySnapshotManager()
+
+    class Meta:
+        db_table = 'invoicing_party_snapshots'
+        verbose_name = _(u'party snapshot')
+        verbose_name_plural = _(u'party snapshots')
+
+    def __unicode__(self):
+        return self.digest
+
+
+class InvoiceSnapshot(models.Model):
+    """
+    Totals and VAT breakdown of invoice frozen when the invoice is sent (see ``invoicing.finalization``).
+    Finalized invoice is never recomputed from its items again: balance, exports and stored documents
+    use these values. Checksum covers the totals and checksums of all stored documents.
+    """
+    invoice = models.OneToOneField(Invoice, verbose_name=_(u'invoice'), related_name='snapshot',
+        on_delete=models.PROTECT, editable=False)
+    subtotal = models.DecimalField(_(u'subtotal'), max_digits=10, decimal_places=2, editable=False)
+    vat = models.DecimalField(_(u'VAT'), max_digits=10, decimal_places=2, editable=False)
+    total = models.DecimalField(_(u'total'), max_digits=10, decimal_places=2, editable=False)
+    vat_summary = JSONField(_(u'VAT summary'), editable=False)
+    checksum = models.CharField(_(u'checksum'), max_length=64, editable=False)
+    created = models.DateTimeField(_(u'created'), auto_now_add=True)
+
+    class Meta:
+        db_table = 'invoicing_invoice_snapshots'
+        verbose_name = _(u'invoice snapshot')
+        verbose_name_plural = _(u'invoice snapshots')
+
+    def __unicode__(self):
+        return u'%s' % self.invoice_id
+
+    def get_checksum(self, document_checksums):
+        """
+        :param document_checksums: dict of document format: checksum of its content
+        """
+        data = {
+            'subtotal': str(self.subtotal),
+            'vat': str(self.vat),
+            'total': str(self.total),
+            'vat_summary': self.vat_summary,
+            'documents': document_checksums,
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def verify(self):
+        """
+        Checks that neither totals nor any stored document were changed since finalization.
+        """
+        documents = list(self.invoice.documents.all())
+        return self.checksum == self.get_checksum(dict((document.format, document.checksum) for document in documents)) \
+            and all(document.verify() for document in documents)
+
+
+class InvoiceDocument(models.Model):
+    """
+    Invoice rendered by formatter (``format`` is its name in formatter registry) at finalization,
+    stored zlib compressed with checksum of uncompressed content.
+    """
+    invoice = models.ForeignKey(Invoice, verbose_name=_(u'invoice'), related_name='documents',
+        on_delete=models.PROTECT, editable=False)
+    format = models.CharField(_(u'format'), max_length=64, editable=False)
+    content_type = models.CharField(_(u'content type'), max_length=255, editable=False)
+    data = models.BinaryField(_(u'data'))
+    checksum = models.CharField(_(u'checksum'), max_length=64, editable=False)
+    created = models.DateTimeField(_(u'created'), auto_now_add=True)
+
+    class Meta:
+        db_table = 'invoicing_invoice_documents'
+        verbose_name = _(u'invoice document')
+        verbose_name_plural = _(u'invoice documents')
+        unique_together = (('invoice', 'format'),)
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.invoice_id, self.format)
+
+    @classmethod
+    def compress(cls, content):
+        """
+        :return: tuple (compressed data, checksum of content)
+        """
+        return zlib.compress(content, 9), hashlib.sha256(content).hexdigest()
+
+    def get_content(self):
+        """
+        :raises ValueError: if content does not match its checksum
+        """
+        content = zlib.decompress(bytes(self.data))
+        if hashlib.sha256(content).hexdigest() != self.checksum:
+            raise ValueError('Stored %s document of invoice %s does not match its checksum.' % (self.format, self.invoice_id))
+        return content
+
+    def verify(self):
+        try:
+            self.get_content()
+        except (ValueError, zlib.error):
+            return False
+        return True
+
+
+class DeliveryAttempt(models.Model):
+    """
+    Result of sending invoice to customer by email (see ``invoicing.delivery``).
+    Invoices with failed attempts stay unsent and are retried up to ``settings.INVOICING_DELIVERY_MAX_ATTEMPTS`` times.
+    """
+    STATUS = Choices(
+        ('SENT', _(u'sent')),
+        ('FAILED', _(u'failed'))
+    )
+
+    invoice = models.ForeignKey(Invoice, verbose_name=_(u'invoice'), related_name='delivery_attempts')
+    recipient = models.EmailField(_(u'recipient'))
+    status = models.CharField(_(u'status'), choices=STATUS, max_length=64)
+    error = models.TextField(_(u'error'),
+        blank=True, null=True, default=None)
+    created = models.DateTimeField(_(u'created'), default=now)
+
+    class Meta:
+        db_table = 'invoicing_delivery_attempts'
+        verbose_name = _(u'delivery attempt')
+        verbose_name_plural = _(u'delivery attempts')
+        ordering = ('created',)
+        index_together = (
+            ('invoice', 'status'),
+        )
+
+    def __unicode__(self):
+        return u'%s %s' % (self.recipient, self.status)
+
+
+class Reminder(models.Model):
+    """
+    Payment reminder sent to customer for all their overdue invoices in one currency (see ``invoicing.dunning``).
+    Invoices are kept as list of ids, so reminder history does not prevent archiving of invoices.
+    """
+    STATUS = Choices(
+        ('NEW', _(u'not sent')),
+        ('SENT', _(u'sent')),
+        ('FAILED', _(u'failed'))
+    )
+
+    customer_name = models.CharField(_(u'customer name'), max_length=255)
+    recipient = models.EmailField(_(u'recipient'),
+        blank=True, null=True, default=None)
+    currency = models.CharField(_(u'currency'), max_length=10, choices=CURRENCY_CHOICES)
+    level = models.PositiveSmallIntegerField(_(u'level'))
+    outstanding = models.DecimalField(_(u'outstanding'), max_digits=10, decimal_places=2)
+    invoice_ids = JSONField(_(u'invoices'), default=list)
+    status = models.CharField(_(u'status'), choices=STATUS, max_length=64, default=STATUS.NEW)
+    error = models.TextField(_(u'error'),
+        blank=True, null=True, default=None)
+    created = models.DateTimeField(_(u'created'), default=now, db_index=True)
+
+    class Meta:
+        db_table = 'invoicing_reminders'
+        verbose_name = _(u'reminder')
+        verbose_name_plural = _(u'reminders')
+        ordering = ('-created',)
+
+    def __unicode__(self):
+        return u'%s %d: %s %s' % (self.customer_name, self.level, self.outstanding, self.currency)
+
+
+class OutboxEvent(models.Model):
+    """
+    Append-only log of changes of invoices and items, written in the same transaction as the change.
+    Consumers read it in order of position (``transaction_id``, ``id``) with their own ``OutboxCursor``,
+    see ``invoicing.outbox``. Transaction id is set on PostgreSQL only, elsewhere it is 0 and events
+    are read by increasing ``id``. Rows are plain ids, not relations, so events of deleted or archived
+    invoices are kept.
+    """
+    OBJECT_TYPE = Choices(
+        ('INVOICE', _(u'invoice')),
+        ('ITEM', _(u'item'))
+    )
+
+    ACTION = Choices(
+        ('CREATED', _(u'created')),
+        ('UPDATED', _(u'updated')),
+        ('DELETED', _(u'deleted')),
+        ('STATUS_CHANGED', _(u'status changed')),
+        ('ARCHIVED', _(u'archived'))
+    )
+
+    object_type = models.CharField(_(u'object type'), choices=OBJECT_TYPE, max_length=64)
+    object_id = models.IntegerField(_(u'object ID'))
+    invoice_id = models.IntegerField(_(u'invoice ID'))
+    action = models.CharField(_(u'action'), choices=ACTION, max_length=64)
+    data = JSONField(_(u'data'), blank=True, null=True, default=None)
+    transaction_id = models.BigIntegerField(_(u'transaction ID'), default=0, editable=False)
+    created = models.DateTimeField(_(u'created'), default=now)
+    objects = OutboxEventManager()
+
+    class Meta:
+        db_table = 'invoicing_outbox_events'
+        verbose_name = _(u'outbox event')
+        verbose_name_plural = _(u'outbox events')
+        ordering = ('transaction_id', 'id')
+        index_together = (
+            ('transaction_id', 'id'),
+        )
+
+    def __unicode__(self):
+        return u'%s %s %s' % (self.object_type, self.object_id, self.action)
+
+    def get_position(self):
+        return self.transaction_id, self.pk
+
+
+class OutboxCursor(models.Model):
+    """
+    Position (transaction id and id of the last processed ``OutboxEvent``) of outbox consumer.
+    """
+    consumer = models.CharField(_(u'consumer'), max_length=128, unique=True)
+    transaction_id = models.BigIntegerField(_(u'transaction ID'), default=0)
+    position = models.IntegerField(_(u'position'), default=0)
+    modified = models.DateTimeField(_(u'modified'), auto_now=True)
+
+    class Meta:
+        db_table = 'invoicing_outbox_cursors'
+        verbose_name = _(u'outbox cursor')
+        verbose_name_plural = _(u'outbox cursors')
+
+    def __unicode__(self):
+        return u'%s: %d/%d' % (self.consumer, self.transaction_id, self.position)
+
+    def get_position(self):
+        return self.transaction_id, self.position
+
+
+class RecurringInvoice(models.Model):
+    """
+    Schedule issuing copies of template invoice periodically.
+    Invoices are generated by ``generate_recurring_invoices`` command, see ``invoicing.recurring``.
+    """
+    PERIOD = Choices(
+        ('MONTHLY', _(u'monthly')),
+        ('YEARLY', _(u'yearly')),
+        ('CUSTOM', _(u'custom'))
+    )
+
+    template = models.ForeignKey(Invoice, verbose_name=_(u'template'), related_name='recurring_templates')
+    period = models.CharField(_(u'period'), choices=PERIOD, max_length=64, default=PERIOD.MONTHLY)
+    interval_days = models.PositiveIntegerField(_(u'interval (days)'), help_text=_(u'only for custom period'),
+        blank=True, null=True, default=None)
+    date_next = models.DateField(_(u'next issue date'), db_index=True)
+    date_end = models.DateField(_(u'end date'),
+        blank=True, null=True, default=None)
+    active = models.BooleanField(_(u'active'), default=True)
+    created = models.DateTimeField(_(u'created'), auto_now_add=True)
+    modified = models.DateTimeField(_(u'modified'), auto_now=True)
+    objects = RecurringInvoiceManager()
+
+    class Meta:
+        db_table = 'invoicing_recurring_invoices'
+        verbose_name = _(u'recurring invoice')
+        verbose_name_plural = _(u'recurring invoices')
+        ordering = ('date_next',)
+        index_together = (
+            ('active', 'date_next'),
+        )
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.template, self.get_period_display())
+
+    def clean(self):
+        if self.period == RecurringInvoice.PERIOD.CUSTOM and not self.interval_days:
+            raise ValidationError({'interval_days': _(u'Interval is required for custom period.')})
+
+
+class VATReturnPeriod(models.Model):
+    """
+    Tax period of VAT return. Closed period is built once into ``VATReturnEntry`` rows (contribution
+    of every invoice) and ``VATReturnLine`` rows summed from them. Later changes of invoices are read
+    from outbox and only contributions of changed invoices are recomputed (see ``invoicing.reports``).
+    """
+    date_from = models.DateField(_(u'date from'))
+    date_to = models.DateField(_(u'date to'))
+    closed = models.BooleanField(_(u'closed'), default=False)
+    refreshed = models.DateTimeField(_(u'refreshed'), editable=False,
+        blank=True, null=True, default=None)
+    created = models.DateTimeField(_(u'created'), auto_now_add=True)
+    modified = models.DateTimeField(_(u'modified'), auto_now=True)
+
+    class Meta:
+        db_table = 'invoicing_vat_return_periods'
+        verbose_name = _(u'VAT return period')
+        verbose_name_plural = _(u'VAT return periods')
+        ordering = ('-date_from',)
+        unique_together = (('date_from', 'date_to'),)
+
+    def __unicode__(self):
+        return u'%s - %s' % (self.date_from, self.date_to)
+
+    def save(self, **kwargs):
+        if not self.closed:
+            # reopened period is built again when it is closed
+            self.refreshed = None
+        return super(VATReturnPeriod, self).save(**kwargs)
+
+    def refresh(self, force=False):
+        """
+        Builds stored lines of closed period if they were not built yet (always with ``force``)
+        and applies pending changes of invoices to stored lines of all closed periods.
+
+        :return: True if lines of this period were built
+        """
+        from invoicing.reports import build_vat_return, update_vat_returns
+
+        if not self.closed:
+            return False
+
+        built = force or not self.refreshed
+        if built:
+            build_vat_return(self)
+        update_vat_returns()
+        return built
+
+    def get_lines(self):
+        """
+        Lines of VAT return. Closed periods are served from materialized rows, open periods are computed.
+        """
+        from invoicing.reports import vat_return_lines
+        from invoicing.routers import read_replica
+
+        if not self.closed:
+            with read_replica():
+                return vat_return_lines(self.date_from, self.date_to)
+
+        self.refresh()
+        return list(self.lines.values(*VATReturnLine.VALUE_FIELDS))
+
+
+class VATReturnLine(models.Model):
+    VALUE_FIELDS = ('tax_rate', 'customer_country', 'reverse_charge', 'currency', 'invoices', 'base', 'vat')
+    GROUP_FIELDS = ('tax_rate', 'customer_country', 'reverse_charge', 'currency')
+
+    period = models.ForeignKey(VATReturnPeriod, verbose_name=_(u'period'), related_name='lines')
+    tax_rate = models.DecimalField(_(u'tax rate (%)'), max_digits=3, decimal_places=1,
+        blank=True, null=True, default=None)
+    customer_country = models.CharField(_(u'customer country'), max_length=2,
+        blank=True, null=True, default=None)
+    reverse_charge = models.BooleanField(_(u'reverse charge'), default=False)
+    currency = models.CharField(_(u'currency'), max_length=10)
+    invoices = models.PositiveIntegerField(_(u'invoices'), default=0)
+    base = models.DecimalField(_(u'base'), max_digits=19, decimal_places=2, default=0)
+    vat = models.DecimalField(_(u'VAT'), max_digits=19, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'invoicing_vat_return_lines'
+        verbose_name = _(u'VAT return line')
+        verbose_name_plural = _(u'VAT return lines')
+        ordering = ('period', 'currency', 'tax_rate', 'customer_country')
+
+    def __unicode__(self):
+        return u'%s %s%% %s' % (self.period, self.tax_rate, self.customer_country)
+
+
+class VATReturnEntry(models.Model):
+    """
+    Contribution of one invoice to lines of closed VAT return period. Invoice is kept as plain id,
+    so entries do not prevent archiving and archived invoices stay in the return.
+    """
+    VALUE_FIELDS = ('tax_rate', 'customer_country', 'reverse_charge', 'currency', 'base', 'vat')
+
+    period = models.ForeignKey(VATReturnPeriod, verbose_name=_(u'period'), related_name='entries')
+    invoice_id = models.IntegerField(_(u'invoice ID'), db_index=True)
+    tax_rate = models.DecimalField(_(u'tax rate (%)'), max_digits=3, decimal_places=1,
+        blank=True, null=True, default=None)
+    customer_country = models.CharField(_(u'customer country'), max_length=2,
+        blank=True, null=True, default=None)
+    reverse_charge = models.BooleanField(_(u'reverse charge'), default=False)
+    currency = models.CharField(_(u'currency'), max_length=10)
+    base = models.DecimalField(_(u'base'), max_digits=19, decimal_places=2, default=0)
+    vat = models.DecimalField(_(u'VAT'), max_digits=19, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'invoicing_vat_return_entries'
+        verbose_name = _(u'VAT return entry')
+        verbose_name_plural = _(u'VAT return entries')
+
+    def __unicode__(self):
+        return u'%s %s' % (self.period, self.invoice_id)
+
+    @property
+    def group(self):
+        """
+        Values of ``VATReturnLine.GROUP_FIELDS`` identifying line of the entry.
+        """
+        return tuple(getattr(self, name) for name in VATReturnLine.GROUP_FIELDS)
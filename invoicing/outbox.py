@@ -0,0 +1,120 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from invoicing.models import OutboxCursor, OutboxEvent
+
+
+EVENT_FIELDS = ('id', 'transaction_id', 'object_type', 'object_id', 'invoice_id', 'action', 'data', 'created')
+
+
+def event_data(event):
+    return dict((name, getattr(event, name)) for name in EVENT_FIELDS)
+
+
+# Where transaction ids are not available (all databases except PostgreSQL), a gap in event ids younger
+# than this may still be filled by a transaction which is not committed yet, older gaps are treated as left
+# by rolled back transactions and skipped. An event committed by a transaction running longer than this
+# (e.g. ingestion of a big chunk) after a later event was read is therefore never read; keep it above
+# duration of the longest transaction recording events.
+DEFAULT_SETTLE_SECONDS = 300
+
+
+def _settle_time():
+    return datetime.timedelta(seconds=getattr(settings, 'INVOICING_OUTBOX_SETTLE_SECONDS', DEFAULT_SETTLE_SECONDS))
+
+
+def _position(position):
+    # plain event id is position of event without transaction id
+    return tuple(position) if isinstance(position, (tuple, list)) else (0, position)
+
+
+def get_position(consumer):
+    """
+    :return: tuple (transaction id, event id) of the last event processed by ``consumer``
+    """
+    cursor = OutboxCursor.objects.filter(consumer=consumer).first()
+    return cursor.get_position() if cursor is not None else (0, 0)
+
+
+def read(position, batch_size=500):
+    """
+    Events after ``position`` (tuple of transaction id and event id) in order of their positions.
+
+    On PostgreSQL only events of transactions older than the oldest running transaction are read.
+    No event can be committed before them later, so nothing is skipped regardless how long transactions run.
+    Elsewhere batch ends before the first gap in ids younger than ``settings.INVOICING_OUTBOX_SETTLE_SECONDS``
+    (see ``DEFAULT_SETTLE_SECONDS``), which may still be filled by uncommitted transaction.
+
+    :return: list of ``OutboxEvent``
+    """
+    position = _position(position)
+    horizon = OutboxEvent.objects.visibility_horizon()
+
+    if horizon is not None:
+        return list(OutboxEvent.objects.after(position).filter(transaction_id__lt=horizon)[:batch_size])
+
+    events = list(OutboxEvent.objects.after(position)[:batch_size])
+    settled = now() - _settle_time()
+
+    expected = position[1] + 1
+    for index, event in enumerate(events):
+        if event.pk != expected and event.created > settled:
+            return events[:index]
+        expected = event.pk + 1
+    return events
+
+
+def acknowledge(consumer, position):
+    """
+    Moves cursor of ``consumer`` forward to ``position`` (of the last processed event, see ``read()``).
+    """
+    position = _position(position)
+    with transaction.atomic():
+        cursor, created = OutboxCursor.objects.select_for_update().get_or_create(consumer=consumer)
+        if position > cursor.get_position():
+            cursor.transaction_id, cursor.position = position
+            cursor.save(update_fields=['transaction_id', 'position', 'modified'])
+
+
+def consume(consumer, batch_size=500):
+    """
+    Iterates batches of events not processed by ``consumer`` yet. Cursor is moved past the batch
+    when the next one is requested, so a batch interrupted by error is delivered again (at least once).
+
+        for events in consume('warehouse'):
+            load(events)
+    """
+    position = get_position(consumer)
+
+    while True:
+        events = read(position, batch_size)
+        if not events:
+            return
+
+        yield events
+        position = events[-1].get_position()
+        acknowledge(consumer, position)
+
+
+def compact(chunk_size=10000):
+    """
+    Deletes events processed by all consumers, in chunks. Nothing is deleted while there is no consumer.
+
+    :return: number of deleted events
+    """
+    cursor = OutboxCursor.objects.order_by('transaction_id', 'position').first()
+    if cursor is None or cursor.get_position() == (0, 0):
+        return 0
+
+    count = 0
+    while True:
+        pks = list(OutboxEvent.objects.up_to(cursor.get_position()).order_by('transaction_id', 'pk')
+                   .values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return count
+
+        OutboxEvent.objects.filter(pk__in=pks).delete()
+        count += len(pks)
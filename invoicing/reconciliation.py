@@ -0,0 +1,258 @@
+import csv
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+try:
+    from xml.etree.cElementTree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import six
+from django.utils.dateparse import parse_date
+from django.utils.encoding import force_text
+
+from invoicing.exports import keyset_chunks
+from invoicing.models import Invoice, OutboxEvent, Payment, date_today
+
+
+StatementLine = namedtuple('StatementLine', [
+    'amount', 'currency', 'date', 'variable_symbol', 'specific_symbol', 'constant_symbol', 'reference'
+])
+
+Match = namedtuple('Match', ['line', 'status', 'invoice', 'difference'])
+
+MATCHED = 'MATCHED'
+UNDERPAID = 'UNDERPAID'
+OVERPAID = 'OVERPAID'
+AMBIGUOUS = 'AMBIGUOUS'
+DUPLICATE = 'DUPLICATE'
+UNMATCHED = 'UNMATCHED'
+
+
+def _symbol(value):
+    """
+    Normalizes payment symbol (strips spaces and leading zeros).
+    """
+    value = force_text(value or '').strip().lstrip('0')
+    return value or None
+
+
+def _amount(value):
+    try:
+        return Decimal(force_text(value).strip().replace(' ', '').replace(',', '.'))
+    except (InvalidOperation, AttributeError):
+        return None
+
+
+def _date(value):
+    """
+    Parses booking date, impossible or malformed date (e.g. ``2023-02-30``) is treated as missing.
+    """
+    try:
+        return parse_date(value[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def parse_csv(fileobj, delimiter=','):
+    """
+    Reads statement lines from CSV file with header containing columns
+    ``amount``, ``currency``, ``date`` and optionally ``variable_symbol``, ``specific_symbol``,
+    ``constant_symbol`` and ``reference``. Lines are generated one by one.
+    Only incoming payments are read, lines with zero or negative amount (debits) are skipped
+    like debit entries of CAMT.053 statement.
+    """
+    for row in csv.DictReader(fileobj, delimiter=str(delimiter)):
+        if six.PY2:
+            row = dict((key, force_text(value, 'utf-8') if value is not None else None) for key, value in row.items())
+
+        amount = _amount(row.get('amount'))
+        if amount is None or amount <= 0:
+            continue
+
+        yield StatementLine(
+            amount=amount,
+            currency=(row.get('currency') or '').strip().upper(),
+            date=_date((row.get('date') or '').strip()),
+            variable_symbol=_symbol(row.get('variable_symbol')),
+            specific_symbol=_symbol(row.get('specific_symbol')),
+            constant_symbol=_symbol(row.get('constant_symbol')),
+            reference=(row.get('reference') or '').strip() or None
+        )
+
+
+SYMBOLS_PATTERN = re.compile(r'/(VS|SS|KS)/?(\d+)')
+
+
+def parse_camt053(fileobj):
+    """
+    Reads incoming payments (credit entries) from ISO 20022 CAMT.053 bank statement.
+    XML is parsed incrementally and processed entries are released from memory.
+
+    Payment symbols are read from end-to-end identification in ``/VS123/SS456/KS0308`` form,
+    structured creditor reference is used as ``reference``.
+    """
+    def local(tag):
+        return tag.rsplit('}', 1)[-1]
+
+    def find(element, path):
+        for name in path.split('/'):
+            if element is None:
+                return None
+            element = next((child for child in element if local(child.tag) == name), None)
+        return element
+
+    def text(element, path):
+        found = find(element, path)
+        return found.text.strip() if found is not None and found.text else None
+
+    for event, element in iterparse(fileobj, events=('end',)):
+        if local(element.tag) != 'Ntry':
+            continue
+
+        amount_element = find(element, 'Amt')
+        amount = _amount(amount_element.text) if amount_element is not None else None
+
+        if text(element, 'CdtDbtInd') == 'CRDT' and amount is not None:
+            details = find(element, 'NtryDtls/TxDtls')
+            symbols = dict(SYMBOLS_PATTERN.findall(text(details, 'Refs/EndToEndId') or ''))
+            booking_date = text(element, 'BookgDt/Dt')
+
+            yield StatementLine(
+                amount=amount,
+                currency=amount_element.get('Ccy', '').upper(),
+                date=_date(booking_date),
+                variable_symbol=_symbol(symbols.get('VS')),
+                specific_symbol=_symbol(symbols.get('SS')),
+                constant_symbol=_symbol(symbols.get('KS')),
+                reference=text(details, 'RmtInf/Strd/CdtrRefInf/Ref') or text(details, 'RmtInf/Ustrd')
+            )
+
+        element.clear()
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'camt053': parse_camt053,
+}
+
+
+class InvoiceIndex(object):
+    """
+    In-memory hash index of unsettled invoices by variable symbol and by reference.
+    Invoices are loaded by ``values()`` in chunks, no model instances are created.
+    """
+    fields = ('id', 'full_number', 'currency', 'balance_due', 'variable_symbol', 'specific_symbol', 'reference')
+
+    def __init__(self, queryset=None, chunk_size=5000):
+        self.by_variable_symbol = {}
+        self.by_reference = {}
+
+        if queryset is None:
+            queryset = Invoice.objects.get_queryset().unsettled()
+
+        for chunk in keyset_chunks(queryset, self.fields, chunk_size):
+            for row in chunk:
+                row['specific_symbol'] = _symbol(row['specific_symbol'])
+
+                variable_symbol = _symbol(row['variable_symbol'])
+                if variable_symbol:
+                    self.by_variable_symbol.setdefault(variable_symbol, []).append(row)
+                if row['reference']:
+                    self.by_reference.setdefault(row['reference'].strip(), []).append(row)
+
+    def candidates(self, line):
+        # invoices of other currency with the same variable symbol do not prevent matching by reference
+        candidates = []
+        if line.variable_symbol:
+            candidates = [invoice for invoice in self.by_variable_symbol.get(line.variable_symbol, [])
+                          if invoice['currency'] == line.currency]
+        if not candidates and line.reference:
+            candidates = [invoice for invoice in self.by_reference.get(line.reference, [])
+                          if invoice['currency'] == line.currency]
+
+        if len(candidates) > 1 and line.specific_symbol:
+            candidates = [invoice for invoice in candidates if invoice['specific_symbol'] == line.specific_symbol] or candidates
+
+        return candidates
+
+
+class Reconciler(object):
+    """
+    Matches statement lines against unsettled invoices.
+
+    Line matches invoice if variable symbol (or reference) and currency are equal.
+    Several invoices with the same symbol are narrowed by specific symbol and by amount.
+    Amount is compared with balance due, difference up to ``settings.INVOICING_RECONCILIATION_TOLERANCE``
+    is accepted. Underpaid lines are recorded as partial payments.
+    """
+
+    def __init__(self, queryset=None, tolerance=None):
+        self.index = InvoiceIndex(queryset)
+        self.tolerance = tolerance if tolerance is not None else \
+            Decimal(getattr(settings, 'INVOICING_RECONCILIATION_TOLERANCE', '0.01'))
+        self.matched = set()
+
+    def match(self, line):
+        candidates = self.index.candidates(line)
+
+        if len(candidates) > 1:
+            exact = [invoice for invoice in candidates if abs(invoice['balance_due'] - line.amount) <= self.tolerance]
+            if len(exact) != 1:
+                return Match(line, AMBIGUOUS, None, None)
+            candidates = exact
+
+        if not candidates:
+            return Match(line, UNMATCHED, None, None)
+
+        invoice = candidates[0]
+        difference = line.amount - invoice['balance_due']
+
+        if invoice['id'] in self.matched:
+            return Match(line, DUPLICATE, invoice['id'], difference)
+
+        if difference < -self.tolerance:
+            # partial payment, following lines are compared with the rest
+            invoice['balance_due'] -= line.amount
+            return Match(line, UNDERPAID, invoice['id'], difference)
+
+        self.matched.add(invoice['id'])
+        return Match(line, MATCHED if difference <= self.tolerance else OVERPAID, invoice['id'], difference)
+
+    def apply(self, results, chunk_size=1000):
+        """
+        Records payments of matched lines and marks fully paid invoices as paid.
+        Payments are inserted in bulk, balances are recomputed and statuses changed by bulk updates.
+        """
+        payments = [
+            Payment(invoice_id=result.invoice, amount=result.line.amount,
+                    date=result.line.date or date_today(), reference=result.line.reference)
+            for result in results if result.status in (MATCHED, OVERPAID, UNDERPAID)
+        ]
+
+        with transaction.atomic():
+            for start in range(0, len(payments), chunk_size):
+                chunk = payments[start:start + chunk_size]
+                Payment.objects.bulk_create(chunk)
+                invoice_ids = set(payment.invoice_id for payment in chunk)
+                Invoice.objects.filter(pk__in=invoice_ids).update_balances()
+                OutboxEvent.objects.record_invoices(OutboxEvent.ACTION.UPDATED, invoice_ids)
+
+            matched = sorted(self.matched)
+            for start in range(0, len(matched), chunk_size):
+                Invoice.objects.filter(pk__in=matched[start:start + chunk_size]).mark_paid()
+
+    def reconcile(self, lines, apply=True):
+        """
+        Matches all lines and if ``apply`` is set, records payments.
+
+        :return: list of ``Match``
+        """
+        results = [self.match(line) for line in lines]
+
+        if apply:
+            self.apply(results)
+
+        return results
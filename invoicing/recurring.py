@@ -0,0 +1,158 @@
+import calendar
+import datetime
+
+from django.db import transaction
+from django.db.models import Case, DateField, Value, When
+
+from invoicing.models import Invoice, InvoiceFacet, Item, OutboxEvent, RecurringInvoice, date_today
+from invoicing.utils import get_customer_key
+
+
+# template fields which are not copied to generated invoices
+EXCLUDED_FIELDS = (
+    'id', 'number', 'full_number', 'status', 'date_issue', 'date_tax_point', 'date_due', 'date_sent',
+    'overdue', 'dunning_level', 'amount_paid', 'balance_due', 'recurring', 'recurring_period', 'created', 'modified',
+    'idempotency_key', 'customer_key',
+)
+
+ITEM_FIELDS = ('invoice_id', 'title', 'quantity', 'unit', 'unit_price', 'discount', 'tax_rate', 'tag', 'weight')
+
+
+def add_months(date, months, day=None):
+    """
+    Moves date by given number of months. Day (``day`` or day of ``date``) is clamped to the length of target month.
+    """
+    month = date.month - 1 + months
+    year = date.year + month // 12
+    month = month % 12 + 1
+    day = min(day or date.day, calendar.monthrange(year, month)[1])
+    return datetime.date(year, month, day)
+
+
+def next_date(schedule, date):
+    """
+    Issue date following ``date`` in the schedule. Monthly and yearly schedules keep day of month
+    of the template, so they do not drift after short months.
+    """
+    if schedule.period == RecurringInvoice.PERIOD.MONTHLY:
+        return add_months(date, 1, schedule.template.date_issue.day)
+    if schedule.period == RecurringInvoice.PERIOD.YEARLY:
+        return add_months(date, 12, schedule.template.date_issue.day)
+    return date + datetime.timedelta(days=schedule.interval_days or 1)
+
+
+def due_periods(schedule, today):
+    """
+    All periods (issue dates) of the schedule owed up to ``today``, so missed runs are caught up.
+    """
+    periods = []
+    date = schedule.date_next
+    while date <= today and (schedule.date_end is None or date <= schedule.date_end):
+        periods.append(date)
+        date = next_date(schedule, date)
+    return periods, date
+
+
+def copy_invoice(template, schedule, period):
+    """
+    New unsaved invoice issued on ``period`` with details of ``template``.
+    Due date keeps the same distance from issue date as in the template.
+    """
+    invoice = Invoice(**dict(
+        (field.attname, getattr(template, field.attname))
+        for field in Invoice._meta.concrete_fields if field.name not in EXCLUDED_FIELDS
+    ))
+    invoice.status = Invoice.STATUS.NEW
+    invoice.date_issue = period
+    invoice.date_tax_point = period
+    invoice.date_due = period + (template.date_due - template.date_issue)
+    invoice.recurring = schedule
+    invoice.recurring_period = period
+    invoice.overdue = invoice.is_overdue
+    # set by Invoice.save(), which is not called by bulk_create()
+    invoice.customer_key = get_customer_key(invoice.customer_vat_id, invoice.customer_registration_id,
+                                            invoice.customer_country)
+    return invoice
+
+
+def generate_chunk(schedule_ids, today):
+    """
+    Issues all owed invoices of given schedules in one transaction.
+    Invoices and items are built in memory and inserted in bulk.
+
+    :return: number of generated invoices
+    """
+    with transaction.atomic():
+        schedules = list(
+            RecurringInvoice.objects.get_queryset().due(today)
+            .filter(pk__in=schedule_ids).select_related('template').select_for_update()
+        )
+        if not schedules:
+            return 0
+
+        owed = {}
+        for schedule in schedules:
+            owed[schedule.pk] = due_periods(schedule, today)
+
+        # periods already issued by previous (possibly crashed) run
+        all_periods = set(period for periods, date_next in owed.values() for period in periods)
+        issued = set(Invoice.objects.filter(
+            recurring__in=list(owed), recurring_period__in=all_periods
+        ).values_list('recurring_id', 'recurring_period'))
+
+        invoices = [
+            copy_invoice(schedule.template, schedule, period)
+            for schedule in schedules for period in owed[schedule.pk][0]
+            if (schedule.pk, period) not in issued
+        ]
+
+        if invoices:
+            Invoice.objects.allocate_numbers(invoices)
+            Invoice.objects.bulk_create(invoices)
+            InvoiceFacet.objects.add_invoices(invoices)
+
+            # bulk_create does not set primary keys on every backend
+            keys = dict(((invoice.recurring_id, invoice.recurring_period), invoice.recurring.template_id)
+                        for invoice in invoices)
+            created = Invoice.objects.filter(recurring__in=list(owed), recurring_period__in=all_periods)\
+                .values_list('pk', 'recurring_id', 'recurring_period')
+            created = [(pk, keys[(recurring_id, period)]) for pk, recurring_id, period in created
+                       if (recurring_id, period) in keys]
+
+            template_items = {}
+            for item in Item.objects.filter(invoice__in=set(keys.values())).values(*ITEM_FIELDS):
+                template_items.setdefault(item.pop('invoice_id'), []).append(item)
+
+            Item.objects.bulk_create([
+                Item(invoice_id=pk, **item)
+                for pk, template_id in created for item in template_items.get(template_id, [])
+            ])
+            Invoice.objects.filter(pk__in=[pk for pk, template_id in created]).update_balances()
+            # items created together with invoice are covered by its event
+            OutboxEvent.objects.record_invoices(OutboxEvent.ACTION.CREATED, [pk for pk, template_id in created])
+
+        RecurringInvoice.objects.filter(pk__in=list(owed)).update(date_next=Case(
+            *[When(pk=pk, then=Value(date_next)) for pk, (periods, date_next) in owed.items()],
+            output_field=DateField()
+        ))
+
+    return len(invoices)
+
+
+def generate(today=None, chunk_size=500):
+    """
+    Issues invoices of all due recurring schedules.
+
+    Due schedules are found by single indexed query and processed in chunks, every chunk in its own
+    transaction. Generated invoices are unique per schedule and period, so interrupted run can be
+    safely started again -- already issued periods are skipped.
+
+    :return: number of generated invoices
+    """
+    today = today or date_today()
+    schedule_ids = list(RecurringInvoice.objects.due(today).values_list('pk', flat=True))
+
+    count = 0
+    for start in range(0, len(schedule_ids), chunk_size):
+        count += generate_chunk(schedule_ids[start:start + chunk_size], today)
+    return count
@@ -0,0 +1,286 @@
+import datetime
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils.dateparse import parse_date
+from django.utils.timezone import now
+
+from invoicing.models import Invoice, Item, OutboxCursor, OutboxEvent, VATReturnEntry, VATReturnLine, VATReturnPeriod
+from invoicing.outbox import acknowledge, read
+
+
+TWO_PLACES = Decimal('0.01')
+
+# outbox consumer keeping materialized VAT returns of closed periods up to date
+VAT_RETURN_CONSUMER = 'invoicing.vat_returns'
+
+
+def _dictfetchall(cursor):
+    desc = cursor.description
+    return [
+        dict(zip([col[0] for col in desc], row))
+        for row in cursor.fetchall()
+    ]
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return parse_date(value[:10])
+
+
+def _entries_sql(connection, where, params):
+    """
+    Query of VAT base and VAT per invoice, tax rate, customer country, reverse charge status and currency.
+    Amounts are rounded per invoice and tax rate, as they are on the invoice.
+
+    :return: tuple (sql, params)
+    """
+    reverse_charge = 'CASE WHEN items.tax_rate IS NULL AND invoices.customer_vat_id IS NOT NULL THEN 1 ELSE 0 END'
+    base = 'items.quantity * items.unit_price * (100 - items.discount) / 100'
+
+    sql = (
+        'SELECT invoices.id AS invoice_id, invoices.date_tax_point AS date_tax_point, '
+        'items.tax_rate AS tax_rate, invoices.customer_country AS customer_country, '
+        '%(reverse_charge)s AS reverse_charge, invoices.currency AS currency, '
+        'ROUND(CAST(SUM(%(base)s) AS numeric), 2) AS base, '
+        'ROUND(CAST(SUM(%(base)s * COALESCE(items.tax_rate, 0) / 100) AS numeric), 2) AS vat '
+        'FROM %(items)s items INNER JOIN %(invoices)s invoices ON invoices.id = items.invoice_id '
+        'WHERE %(where)s AND invoices.type IN (%%s, %%s, %%s) AND invoices.status <> %%s '
+        'GROUP BY invoices.id, invoices.date_tax_point, items.tax_rate, invoices.customer_country, '
+        'invoices.currency, %(reverse_charge)s'
+    ) % {
+        'reverse_charge': reverse_charge,
+        'base': base,
+        'items': connection.ops.quote_name(Item._meta.db_table),
+        'invoices': connection.ops.quote_name(Invoice._meta.db_table),
+        'where': where,
+    }
+    params = list(params) + [Invoice.TYPE.INVOICE, Invoice.TYPE.ADVANCE, Invoice.TYPE.VAT_CREDIT_NOTE,
+                             Invoice.STATUS.CANCELED]
+    return sql, params
+
+
+def vat_return_lines(date_from, date_to, period=None, using=None):
+    """
+    Sums of VAT base and VAT by tax rate, customer country, reverse charge status and currency
+    of invoices with tax point date between ``date_from`` and ``date_to`` (inclusive).
+    Everything is computed in single grouped query.
+
+    :param period: ``None`` or ``'month'``, ``'year'`` to split totals by tax point period
+    :return: list of dicts with keys ``period`` (only if requested), ``tax_rate``, ``customer_country``,
+             ``reverse_charge``, ``currency``, ``invoices``, ``base`` and ``vat``
+    """
+    using = using or router.db_for_read(Item)
+    connection = connections[using]
+
+    entries, params = _entries_sql(
+        connection, 'invoices.date_tax_point >= %s AND invoices.date_tax_point <= %s', [date_from, date_to])
+
+    group_by = ['entries.tax_rate', 'entries.customer_country', 'entries.currency', 'entries.reverse_charge']
+    select = [
+        'entries.tax_rate AS tax_rate',
+        'entries.customer_country AS customer_country',
+        'entries.currency AS currency',
+        'entries.reverse_charge AS reverse_charge',
+    ]
+
+    if period is not None:
+        period_sql = connection.ops.date_trunc_sql(period, 'entries.date_tax_point')
+        select.insert(0, '%s AS period' % period_sql)
+        group_by.insert(0, period_sql)
+
+    # entries are grouped by invoice, so every entry is one invoice of the line
+    sql = (
+        'SELECT %(select)s, COUNT(*) AS invoices, SUM(entries.base) AS base, SUM(entries.vat) AS vat '
+        'FROM (%(entries)s) entries '
+        'GROUP BY %(group_by)s '
+        'ORDER BY %(group_by)s'
+    ) % {
+        'select': ', '.join(select),
+        'entries': entries,
+        'group_by': ', '.join(group_by),
+    }
+
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    lines = _dictfetchall(cursor)
+
+    for line in lines:
+        line['reverse_charge'] = bool(line['reverse_charge'])
+        if period is not None:
+            line['period'] = _as_date(line['period'])
+
+    return lines
+
+
+def vat_return_entries(invoice_ids=None, date_from=None, date_to=None, using=None):
+    """
+    Contributions of invoices (given by ids, or by tax point date range) to VAT return lines.
+
+    :return: list of dicts with keys ``invoice_id``, ``date_tax_point`` and fields of ``VATReturnEntry``
+    """
+    using = using or router.db_for_read(Item)
+    connection = connections[using]
+
+    if invoice_ids is not None:
+        invoice_ids = list(invoice_ids)
+        if not invoice_ids:
+            return []
+        where = 'invoices.id IN (%s)' % ', '.join(['%s'] * len(invoice_ids))
+        params = invoice_ids
+    else:
+        where = 'invoices.date_tax_point >= %s AND invoices.date_tax_point <= %s'
+        params = [date_from, date_to]
+
+    sql, params = _entries_sql(connection, where, params)
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    entries = _dictfetchall(cursor)
+
+    for entry in entries:
+        entry['date_tax_point'] = _as_date(entry['date_tax_point'])
+        entry['reverse_charge'] = bool(entry['reverse_charge'])
+        entry['tax_rate'] = Decimal(entry['tax_rate']).quantize(Decimal('0.1')) if entry['tax_rate'] is not None else None
+        entry['base'] = Decimal(entry['base'] or 0).quantize(TWO_PLACES)
+        entry['vat'] = Decimal(entry['vat'] or 0).quantize(TWO_PLACES)
+
+    return entries
+
+
+def _entry(period, row):
+    return VATReturnEntry(period=period, invoice_id=row['invoice_id'],
+                          **dict((name, row[name]) for name in VATReturnEntry.VALUE_FIELDS))
+
+
+def _get_cursor(using):
+    """
+    Cursor of VAT return consumer. It starts at the last recorded event, because periods are built
+    from invoices directly and only later changes are read from outbox. On PostgreSQL it starts before
+    events of running transactions, whose changes may not be visible to the build yet.
+    """
+    horizon = OutboxEvent.objects.using(using).visibility_horizon()
+    if horizon is not None:
+        transaction_id, position = horizon, 0
+    else:
+        last = OutboxEvent.objects.using(using).order_by('-transaction_id', '-pk').first()
+        transaction_id, position = last.get_position() if last is not None else (0, 0)
+    cursor, created = OutboxCursor.objects.using(using).select_for_update()\
+        .get_or_create(consumer=VAT_RETURN_CONSUMER, defaults={'transaction_id': transaction_id, 'position': position})
+    return cursor
+
+
+def build_vat_return(period, using=None):
+    """
+    Stores contributions of all invoices of closed ``period`` and lines summed from them.
+    The whole period is scanned only here, once when the period is closed.
+    """
+    using = using or router.db_for_write(VATReturnPeriod)
+
+    with transaction.atomic(using=using):
+        _get_cursor(using)
+
+        entries = [_entry(period, row) for row in vat_return_entries(date_from=period.date_from, date_to=period.date_to, using=using)]
+        lines = {}
+        for entry in entries:
+            line = lines.setdefault(entry.group, VATReturnLine(period=period, **dict(zip(VATReturnLine.GROUP_FIELDS, entry.group))))
+            line.invoices += 1
+            line.base += entry.base
+            line.vat += entry.vat
+
+        period.entries.all().delete()
+        period.lines.all().delete()
+        VATReturnEntry.objects.using(using).bulk_create(entries, batch_size=500)
+        VATReturnLine.objects.using(using).bulk_create(lines.values())
+
+        period.refreshed = now()
+        VATReturnPeriod.objects.using(using).filter(pk=period.pk).update(refreshed=period.refreshed)
+
+
+def apply_invoice_changes(invoice_ids, deleted_ids=(), using=None):
+    """
+    Recomputes contributions of changed invoices to built closed periods and adds the differences
+    to stored lines. Other invoices of the periods are not read. Invoices missing in live table
+    which were not deleted (i.e. archived) keep their contributions.
+
+    :return: number of lines changed
+    """
+    using = using or router.db_for_write(VATReturnPeriod)
+    periods = list(VATReturnPeriod.objects.using(using).filter(closed=True, refreshed__isnull=False))
+    if not periods:
+        return 0
+
+    existing = set(Invoice.objects.using(using).filter(pk__in=invoice_ids).values_list('pk', flat=True))
+    invoice_ids = [pk for pk in invoice_ids if pk in existing or pk in deleted_ids]
+
+    old = list(VATReturnEntry.objects.using(using).filter(period__in=periods, invoice_id__in=invoice_ids))
+    new = [_entry(period, row) for row in vat_return_entries(existing, using=using)
+           for period in periods if period.date_from <= row['date_tax_point'] <= period.date_to]
+
+    differences = {}
+    for sign, entries in ((-1, old), (1, new)):
+        for entry in entries:
+            difference = differences.setdefault((entry.period_id, entry.group), [0, 0, 0])
+            difference[0] += sign
+            difference[1] += sign * entry.base
+            difference[2] += sign * entry.vat
+
+    changed = 0
+    for (period_id, group), (invoices, base, vat) in differences.items():
+        if not (invoices or base or vat):
+            continue
+
+        lines = VATReturnLine.objects.using(using).filter(period_id=period_id, **dict(zip(VATReturnLine.GROUP_FIELDS, group)))
+        if not lines.update(invoices=F('invoices') + invoices, base=F('base') + base, vat=F('vat') + vat):
+            VATReturnLine.objects.using(using).create(period_id=period_id, invoices=invoices, base=base, vat=vat,
+                                                      **dict(zip(VATReturnLine.GROUP_FIELDS, group)))
+        changed += 1
+
+    if changed:
+        VATReturnLine.objects.using(using).filter(period__in=periods, invoices__lte=0).delete()
+
+    VATReturnEntry.objects.using(using).filter(pk__in=[entry.pk for entry in old]).delete()
+    VATReturnEntry.objects.using(using).bulk_create(new, batch_size=500)
+    return changed
+
+
+def update_vat_returns(batch_size=500, using=None):
+    """
+    Applies changes of invoices, items and payments recorded in outbox since the last update
+    to materialized VAT returns of closed periods. Cost depends on the number of changed invoices,
+    not on the size of the periods. Concurrent updates are serialized by lock of consumer cursor.
+
+    :return: number of processed events
+    """
+    using = using or router.db_for_write(VATReturnPeriod)
+    count = 0
+
+    while True:
+        with transaction.atomic(using=using):
+            cursor = OutboxCursor.objects.using(using).select_for_update().filter(consumer=VAT_RETURN_CONSUMER).first()
+            if cursor is None:
+                # no period was built yet
+                return count
+
+            events = read(cursor.get_position(), batch_size)
+            if not events:
+                return count
+
+            invoice_ids = set()
+            deleted_ids = set()
+            for event in events:
+                if event.action == OutboxEvent.ACTION.ARCHIVED:
+                    continue
+                invoice_ids.add(event.invoice_id)
+                if event.object_type == OutboxEvent.OBJECT_TYPE.INVOICE and event.action == OutboxEvent.ACTION.DELETED:
+                    deleted_ids.add(event.invoice_id)
+
+            invoice_ids = sorted(invoice_ids)
+            for start in range(0, len(invoice_ids), batch_size):
+                apply_invoice_changes(invoice_ids[start:start + batch_size], deleted_ids, using)
+
+            acknowledge(VAT_RETURN_CONSUMER, events[-1].get_position())
+            count += len(events)
@@ -0,0 +1,121 @@
+import random
+import threading
+
+from django.conf import settings
+
+
+_state = threading.local()
+
+
+def _replicas():
+    return getattr(settings, 'INVOICING_READ_DATABASES', ())
+
+
+def _primary():
+    return getattr(settings, 'INVOICING_PRIMARY_DATABASE', 'default')
+
+
+class read_replica(object):
+    """
+    Context manager (and decorator) sending reads of invoicing models to one of
+    ``settings.INVOICING_READ_DATABASES``. Once a write is routed inside the context,
+    following reads of the context stay on primary database, so just saved invoice is never read stale.
+    Pinning starts and ends with the outermost context, reads outside of it always go to primary.
+
+        with read_replica():
+            lines = vat_return_lines(date_from, date_to)
+    """
+
+    def __enter__(self):
+        depth = getattr(_state, 'depth', 0)
+        if not depth:
+            _state.pinned = False
+        _state.depth = depth + 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _state.depth -= 1
+        if not _state.depth:
+            _state.pinned = False
+
+    def __call__(self, func):
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+
+def read_replica_iterator(iterable):
+    """
+    Iterates ``iterable`` in replica read context, e.g. content of streaming response
+    which is generated after the view has returned.
+    """
+    iterator = iter(iterable)
+    while True:
+        with read_replica():
+            try:
+                value = next(iterator)
+            except StopIteration:
+                return
+        yield value
+
+
+def unpin():
+    """
+    Allows reading from replicas again after a write inside current ``read_replica`` context.
+    """
+    _state.pinned = False
+
+
+class InvoicingRouter(object):
+    """
+    Routes invoicing models: writes (including number allocation and status transitions) always go
+    to primary database, reads go to a random replica only inside ``read_replica`` context.
+
+    Settings::
+
+        DATABASE_ROUTERS = ['invoicing.routers.InvoicingRouter']
+        INVOICING_PRIMARY_DATABASE = 'default'
+        INVOICING_READ_DATABASES = ('replica',)
+    """
+    app_label = 'invoicing'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+
+        replicas = _replicas()
+        if replicas and getattr(_state, 'depth', 0) and not getattr(_state, 'pinned', False):
+            return random.choice(replicas)
+        return _primary()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+
+        if getattr(_state, 'depth', 0):
+            # pinning is scoped to the current read_replica context
+            _state.pinned = True
+        return _primary()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if self.app_label in (obj1._meta.app_label, obj2._meta.app_label):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label != self.app_label:
+            return None
+        return db not in _replicas()
+
+
+class InvoicingRouterMiddleware(object):
+    """
+    Resets read-after-write pinning at start of every request. Kept for compatibility, pinning
+    is scoped to ``read_replica`` contexts and reset by them.
+    """
+
+    def process_request(self, request):
+        unpin()
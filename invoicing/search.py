@@ -0,0 +1,216 @@
+import re
+from functools import reduce
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+
+from invoicing.utils import import_name
+
+
+# invoice columns covered by search index
+SEARCH_FIELDS = ('full_number', 'subtitle', 'note', 'supplier_name', 'customer_name', 'shipping_name')
+
+INVOICES_TABLE = 'invoicing_invoices'
+FTS_TABLE = 'invoicing_invoice_search'
+TRIGRAM_INDEX = 'invoicing_invoices_search_trgm'
+
+
+def split_terms(search_term):
+    return [term for term in re.split(r'\s+', search_term.strip()) if term]
+
+
+class SearchBackend(object):
+    """
+    Full text search of invoices. Default implementation filters searched columns by ``icontains``,
+    database specific backends use dedicated search index kept in sync by the database itself.
+    """
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    @classmethod
+    def is_available(cls, connection):
+        return True
+
+    def search(self, queryset, search_term):
+        """
+        :return: queryset of invoices matching all words of ``search_term``, best matches first if backend ranks them
+        """
+        for term in split_terms(search_term):
+            queryset = queryset.filter(reduce(lambda a, b: a | b, [
+                Q(**{'%s__icontains' % field: term}) for field in SEARCH_FIELDS
+            ]))
+        return queryset
+
+
+def document_sql(table=INVOICES_TABLE):
+    """
+    Searched columns concatenated into one text expression. Must be the same in index and in queries.
+    """
+    return " || ' ' || ".join("COALESCE(%s.%s, '')" % (table, field) for field in SEARCH_FIELDS)
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    """
+    Substring search served by trigram GIN index (``pg_trgm``) over searched columns,
+    ranked by trigram similarity.
+    """
+
+    @classmethod
+    def is_available(cls, connection):
+        cursor = connection.cursor()
+        cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s', [TRIGRAM_INDEX])
+        return cursor.fetchone() is not None
+
+    def search(self, queryset, search_term):
+        terms = split_terms(search_term)
+        if not terms:
+            return queryset
+
+        document = document_sql()
+        return queryset.extra(
+            where=['%s ILIKE %%s' % document] * len(terms),
+            params=['%%%s%%' % term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') for term in terms],
+            select={'search_rank': 'similarity(%s, %%s)' % document},
+            select_params=[search_term],
+            order_by=['-search_rank']
+        )
+
+    @staticmethod
+    def create_index(cursor):
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute('CREATE INDEX %s ON %s USING gin ((%s) gin_trgm_ops)' % (
+            TRIGRAM_INDEX, INVOICES_TABLE, document_sql()))
+
+    @staticmethod
+    def drop_index(cursor):
+        cursor.execute('DROP INDEX IF EXISTS %s' % TRIGRAM_INDEX)
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    Prefix search in FTS5 table with invoices as external content, kept in sync by triggers
+    and ranked by BM25.
+    """
+
+    @classmethod
+    def is_available(cls, connection):
+        return FTS_TABLE in connection.introspection.table_names()
+
+    @staticmethod
+    def match_query(terms):
+        return ' '.join('"%s"*' % term.replace('"', '""') for term in terms)
+
+    def search(self, queryset, search_term):
+        terms = split_terms(search_term)
+        if not terms:
+            return queryset
+
+        # FTS table is joined once, full text query is evaluated once for all rows
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=['%s.rowid = %s.id' % (FTS_TABLE, INVOICES_TABLE), '%s MATCH %%s' % FTS_TABLE],
+            params=[self.match_query(terms)],
+            select={'search_rank': '%s.rank' % FTS_TABLE},
+            order_by=['search_rank']
+        )
+
+    @staticmethod
+    def _context():
+        return {
+            'fts': FTS_TABLE, 'table': INVOICES_TABLE, 'columns': ', '.join(SEARCH_FIELDS),
+            'new_values': ', '.join('new.%s' % field for field in SEARCH_FIELDS),
+            'old_values': ', '.join('old.%s' % field for field in SEARCH_FIELDS),
+        }
+
+    @classmethod
+    def create_triggers(cls, cursor):
+        """
+        Creates triggers keeping FTS table in sync. SQLite drops them whenever invoices table is rebuilt
+        by schema change, migrations altering invoices have to create them again and rebuild the index.
+        """
+        context = cls._context()
+
+        cursor.execute("CREATE TRIGGER %(fts)s_ai AFTER INSERT ON %(table)s BEGIN "
+                       "INSERT INTO %(fts)s(rowid, %(columns)s) VALUES (new.id, %(new_values)s); END" % context)
+        cursor.execute("CREATE TRIGGER %(fts)s_ad AFTER DELETE ON %(table)s BEGIN "
+                       "INSERT INTO %(fts)s(%(fts)s, rowid, %(columns)s) VALUES ('delete', old.id, %(old_values)s); "
+                       "END" % context)
+        # updates of other columns (status, balances, ...) do not touch the index
+        cursor.execute("CREATE TRIGGER %(fts)s_au AFTER UPDATE OF %(columns)s ON %(table)s BEGIN "
+                       "INSERT INTO %(fts)s(%(fts)s, rowid, %(columns)s) VALUES ('delete', old.id, %(old_values)s); "
+                       "INSERT INTO %(fts)s(rowid, %(columns)s) VALUES (new.id, %(new_values)s); END" % context)
+
+    @staticmethod
+    def drop_triggers(cursor):
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute('DROP TRIGGER IF EXISTS %s_%s' % (FTS_TABLE, suffix))
+
+    @staticmethod
+    def rebuild_index(cursor):
+        cursor.execute("INSERT INTO %(fts)s(%(fts)s) VALUES ('rebuild')" % {'fts': FTS_TABLE})
+
+    @classmethod
+    def create_index(cls, cursor):
+        cursor.execute("CREATE VIRTUAL TABLE %(fts)s USING fts5(%(columns)s, "
+                       "content='%(table)s', content_rowid='id')" % cls._context())
+        cls.create_triggers(cursor)
+        cls.rebuild_index(cursor)
+
+    @classmethod
+    def drop_index(cls, cursor):
+        cls.drop_triggers(cursor)
+        cursor.execute('DROP TABLE IF EXISTS %s' % FTS_TABLE)
+
+
+VENDOR_BACKENDS = {
+    'postgresql': PostgreSQLSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def create_search_index(connection):
+    """
+    Creates search index for database vendor. Returns False if the database does not support it
+    (e.g. SQLite without FTS5 or PostgreSQL without permission to create ``pg_trgm`` extension).
+    """
+    backend_class = VENDOR_BACKENDS.get(connection.vendor)
+    if backend_class is None:
+        return False
+
+    try:
+        with transaction.atomic(using=connection.alias):
+            backend_class.create_index(connection.cursor())
+    except DatabaseError:
+        return False
+    return True
+
+
+def drop_search_index(connection):
+    backend_class = VENDOR_BACKENDS.get(connection.vendor)
+    if backend_class is not None:
+        backend_class.drop_index(connection.cursor())
+
+
+_backends = {}
+
+
+def get_search_backend(using='default'):
+    """
+    Returns search backend configured by ``settings.INVOICING_SEARCH_BACKEND`` or the one for database vendor.
+    Backend falls back to ``icontains`` filtering if search index was not created.
+    """
+    if using not in _backends:
+        path = getattr(settings, 'INVOICING_SEARCH_BACKEND', None)
+        connection = connections[using]
+
+        if path is not None:
+            backend_class = import_name(path)
+        else:
+            backend_class = VENDOR_BACKENDS.get(connection.vendor, SearchBackend)
+            if not backend_class.is_available(connection):
+                backend_class = SearchBackend
+
+        _backends[using] = backend_class(using)
+    return _backends[using]
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Sent once per bulk status transition (``InvoiceQuerySet.mark_sent()``, ``mark_paid()``, ...)
+# with list of primary keys of changed invoices.
+invoices_status_changed = Signal(providing_args=['pks', 'status'])
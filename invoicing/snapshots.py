@@ -0,0 +1,75 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import six
+from django.utils.encoding import force_bytes
+
+
+SUPPLIER_FIELDS = (
+    'supplier_name', 'supplier_street', 'supplier_zip', 'supplier_city', 'supplier_country',
+    'supplier_registration_id', 'supplier_tax_id', 'supplier_vat_id', 'supplier_additional_info',
+)
+
+BANK_FIELDS = (
+    'bank_name', 'bank_street', 'bank_zip', 'bank_city', 'bank_country', 'bank_iban', 'bank_swift_bic',
+)
+
+# snapshot foreign key: copied invoice fields
+PARTIES = (
+    ('supplier_snapshot', SUPPLIER_FIELDS),
+    ('bank_snapshot', BANK_FIELDS),
+)
+
+# JSON fields; their values are decoded before hashing (see ``party_data()``)
+JSON_FIELDS = ('supplier_additional_info',)
+
+
+def _plain(value):
+    if value is None or isinstance(value, (dict, list)) or isinstance(value, six.string_types):
+        return value
+    # django_countries.fields.Country and similar wrappers
+    return getattr(value, 'code', None) or six.text_type(value)
+
+
+def _decoded(value):
+    """
+    Decodes JSON string until the value is not a string. Strings set from settings are stored
+    encoded as JSON string, so raw column (``values()``, migrations) holds one more level of encoding
+    than decoded attribute of model instance.
+    """
+    while isinstance(value, six.string_types):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            break
+    return value
+
+
+def party_data(source, fields):
+    """
+    Values of party fields of invoice instance or ``values()`` dict, in JSON serializable form.
+    JSON fields are decoded, so equal details give equal data however they were loaded.
+    """
+    get = source.get if isinstance(source, dict) else lambda name: getattr(source, name, None)
+    return OrderedDict((name, _decoded(get(name)) if name in JSON_FIELDS else _plain(get(name))) for name in fields)
+
+
+def party_digest(data):
+    """
+    Content address of party data. Equal data gives equal digest regardless of key order.
+    """
+    return hashlib.sha256(force_bytes(json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder))).hexdigest()
+
+
+def is_empty(source, fields):
+    get = source.get if isinstance(source, dict) else source.__dict__.get
+    return all(get(name) in (None, '') for name in fields)
+
+
+def empty_values(model, fields):
+    """
+    Values of compacted invoice columns: ``None`` for nullable columns, empty string for the others.
+    """
+    return dict((name, None if model._meta.get_field(name).null else '') for name in fields)
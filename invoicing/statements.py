@@ -0,0 +1,122 @@
+from collections import namedtuple
+
+from django.db.models import Case, DecimalField, F, Max, Q, Sum, Value, When
+
+from invoicing.models import Invoice, Payment
+
+
+Statement = namedtuple('Statement', [
+    'customer_key', 'customer_name', 'currency', 'date_from', 'date_to',
+    'opening_balance', 'invoiced', 'credited', 'paid', 'closing_balance', 'invoices', 'payments'
+])
+
+# invoice types charged to customer account, credit notes (with negative amounts) reduce the balance
+CHARGED_TYPES = (Invoice.TYPE.INVOICE, Invoice.TYPE.ADVANCE)
+CREDIT_TYPES = (Invoice.TYPE.VAT_CREDIT_NOTE,)
+
+INVOICE_FIELDS = ('id', 'customer_key', 'currency', 'type', 'full_number', 'date_issue', 'date_due',
+                  'amount_paid', 'balance_due')
+PAYMENT_FIELDS = ('id', 'invoice__customer_key', 'invoice__currency', 'invoice__full_number', 'date', 'amount',
+                  'reference')
+
+
+def account_invoices(customer_keys=None):
+    """
+    Invoices posted to customer accounts: invoices, advance invoices and credit notes of identified customers,
+    except canceled ones.
+    """
+    invoices = Invoice.objects.filter(customer_key__isnull=False, type__in=CHARGED_TYPES + CREDIT_TYPES)\
+        .exclude(status=Invoice.STATUS.CANCELED)
+    if customer_keys is not None:
+        invoices = invoices.filter(customer_key__in=customer_keys)
+    return invoices
+
+
+def _sum(condition, amount):
+    return Sum(Case(When(condition, then=amount), default=Value(0), output_field=DecimalField()))
+
+
+def balances(date_from, date_to, customer_keys=None):
+    """
+    Opening balance and movements of the period per customer and currency, computed by two aggregate
+    queries (invoices and payments) served by (customer_key, currency, date_issue) index.
+    Invoice amount is its total after credit, i.e. denormalized ``amount_paid + balance_due``.
+
+    :return: dict of (customer key, currency): dict with keys ``customer_name``, ``opening_balance``,
+        ``invoiced``, ``credited`` and ``paid``
+    """
+    invoices = account_invoices(customer_keys).filter(date_issue__lte=date_to)
+    amount = F('amount_paid') + F('balance_due')
+    in_period = Q(date_issue__gte=date_from)
+
+    rows = invoices.order_by().values('customer_key', 'currency').annotate(
+        customer_name=Max('customer_name'),
+        opening=_sum(Q(date_issue__lt=date_from), amount),
+        invoiced=_sum(in_period & Q(type__in=CHARGED_TYPES), amount),
+        credited=_sum(in_period & Q(type__in=CREDIT_TYPES), amount),
+    )
+
+    result = {}
+    for row in rows:
+        result[(row['customer_key'], row['currency'])] = {
+            'customer_name': row['customer_name'],
+            'opening_balance': row['opening'] or 0,
+            'invoiced': row['invoiced'] or 0,
+            'credited': row['credited'] or 0,
+            'paid': 0,
+        }
+
+    payments = Payment.objects.filter(invoice__in=invoices.values('pk'), date__lte=date_to).order_by()\
+        .values('invoice__customer_key', 'invoice__currency').annotate(
+            opening=_sum(Q(date__lt=date_from), F('amount')),
+            paid=_sum(Q(date__gte=date_from), F('amount')),
+        )
+    for row in payments:
+        key = (row['invoice__customer_key'], row['invoice__currency'])
+        result[key]['opening_balance'] -= row['opening'] or 0
+        result[key]['paid'] += row['paid'] or 0
+
+    return result
+
+
+def statements(date_from, date_to, customer_keys=None):
+    """
+    Statements of all customers (or of given ``customer_keys``) with opening balance or movements in the period.
+    Balances are aggregated in database; invoices and payments of the period are listed by one query each.
+
+    :return: list of ``Statement`` ordered by customer key and currency
+    """
+    totals = balances(date_from, date_to, customer_keys)
+
+    invoices = {}
+    for row in account_invoices(customer_keys).filter(date_issue__gte=date_from, date_issue__lte=date_to)\
+            .order_by('customer_key', 'currency', 'date_issue', 'pk').values(*INVOICE_FIELDS):
+        row['total'] = row['amount_paid'] + row['balance_due']
+        invoices.setdefault((row['customer_key'], row['currency']), []).append(row)
+
+    payments = {}
+    for row in Payment.objects.filter(invoice__in=account_invoices(customer_keys).filter(date_issue__lte=date_to)
+                                      .values('pk'), date__gte=date_from, date__lte=date_to)\
+            .order_by('invoice__customer_key', 'invoice__currency', 'date', 'pk').values(*PAYMENT_FIELDS):
+        payments.setdefault((row['invoice__customer_key'], row['invoice__currency']), []).append(row)
+
+    result = []
+    for key in sorted(totals):
+        line = totals[key]
+        if not (line['opening_balance'] or key in invoices or key in payments):
+            continue
+
+        closing = line['opening_balance'] + line['invoiced'] + line['credited'] - line['paid']
+        result.append(Statement(
+            key[0], line['customer_name'], key[1], date_from, date_to,
+            line['opening_balance'], line['invoiced'], line['credited'], line['paid'], closing,
+            invoices.get(key, []), payments.get(key, [])
+        ))
+    return result
+
+
+def customer_statements(customer_key, date_from, date_to):
+    """
+    Statements of one customer, one per currency.
+    """
+    return statements(date_from, date_to, [customer_key])
@@ -0,0 +1,72 @@
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from invoicing.models import Invoice, Item
+
+
+def create_invoice(items=((1, '100.00', 20),), **kwargs):
+    """
+    Saves invoice of default supplier with items given as (quantity, unit price, tax rate) tuples.
+    """
+    date_issue = kwargs.pop('date_issue', datetime.date(2016, 1, 15))
+    values = {
+        'language': 'en',
+        'date_issue': date_issue,
+        'date_tax_point': date_issue,
+        'date_due': date_issue + datetime.timedelta(days=14),
+        'currency': 'EUR',
+        'payment_method': Invoice.PAYMENT_METHOD.BANK_TRANSFER,
+        'customer_name': 'Example customer',
+        'customer_country': 'SK',
+    }
+    values.update(kwargs)
+
+    invoice = Invoice(**values)
+    if not invoice.supplier_name:
+        invoice.set_supplier_data(settings.INVOICING_SUPPLIER)
+    invoice.save()
+
+    for quantity, unit_price, tax_rate in items:
+        Item.objects.create(invoice=invoice, title='Item', quantity=Decimal(quantity), unit_price=Decimal(unit_price),
+                            tax_rate=None if tax_rate is None else Decimal(tax_rate))
+
+    return Invoice.objects.get(pk=invoice.pk)
+
+
+def ingest_payload(idempotency_key, **kwargs):
+    """
+    Payload of ingestion API with invoice of default supplier and one item.
+    """
+    supplier = settings.INVOICING_SUPPLIER
+    payload = {
+        'idempotency_key': idempotency_key,
+        'language': 'en',
+        'date_issue': '2016-01-15',
+        'date_tax_point': '2016-01-15',
+        'date_due': '2016-01-29',
+        'currency': 'EUR',
+        'payment_method': Invoice.PAYMENT_METHOD.BANK_TRANSFER,
+        'supplier_name': supplier['name'],
+        'supplier_street': supplier['street'],
+        'supplier_city': supplier['city'],
+        'supplier_zip': supplier['zip'],
+        'supplier_country': supplier['country_code'],
+        'customer_name': 'Example customer',
+        'customer_country': 'SK',
+        'customer_registration_id': '12 345 678',
+        'bank_iban': supplier['bank']['iban'],
+        'bank_swift_bic': supplier['bank']['swift_bic'],
+        'items': [{'title': 'Item', 'quantity': '1', 'unit_price': '100.00', 'tax_rate': '20'}],
+    }
+    payload.update(kwargs)
+    return payload
+
+
+class SuperuserMixin(object):
+    def setUp(self):
+        super(SuperuserMixin, self).setUp()
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
@@ -0,0 +1,74 @@
+import datetime
+from decimal import Decimal
+
+from django.core.paginator import Paginator
+from django.test import TestCase
+
+from invoicing.archive import ArchivedInvoice, ArchivedInvoiceDocument, ArchivedInvoiceSnapshot, ArchivedItem, \
+    ArchivedPayment, archivable_invoices, archive_year, ensure_archive_tables, including_archive
+from invoicing.models import Invoice, InvoiceDocument, InvoiceFacet, InvoiceSnapshot, Item, OutboxEvent, Payment
+from invoicing.tests.base import create_invoice
+
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.paid = []
+        for day in (10, 20):
+            invoice = create_invoice(date_issue=datetime.date(2014, 3, day))
+            Invoice.objects.filter(pk=invoice.pk).mark_sent()
+            Payment.objects.create(invoice=invoice, amount=Decimal('120.00'))
+            Invoice.objects.filter(pk=invoice.pk).mark_paid()
+            self.paid.append(invoice)
+
+        self.unpaid = create_invoice(date_issue=datetime.date(2014, 3, 15))
+        self.later = create_invoice(date_issue=datetime.date(2015, 3, 15))
+        Invoice.objects.filter(pk=self.later.pk).cancel()
+
+    def test_archivable_invoices(self):
+        self.assertEqual(sorted(archivable_invoices(2014).values_list('pk', flat=True)),
+                         [invoice.pk for invoice in self.paid])
+
+    def test_archive_year(self):
+        pks = [invoice.pk for invoice in self.paid]
+
+        self.assertEqual(archive_year(2014, chunk_size=1), 2)
+
+        self.assertFalse(Invoice.objects.filter(pk__in=pks).exists())
+        for model in (Item, Payment, InvoiceDocument, InvoiceSnapshot):
+            self.assertFalse(model.objects.filter(invoice__in=pks).exists())
+        self.assertEqual(Invoice.objects.count(), 2)
+
+        self.assertEqual(sorted(ArchivedInvoice.objects.values_list('pk', flat=True)), pks)
+        self.assertEqual(ArchivedItem.objects.filter(invoice_id__in=pks).count(), 2)
+        self.assertEqual(ArchivedPayment.objects.filter(invoice_id__in=pks).count(), 2)
+        self.assertEqual(ArchivedInvoiceSnapshot.objects.filter(invoice_id__in=pks).count(), 2)
+        self.assertEqual(ArchivedInvoiceDocument.objects.filter(invoice_id__in=pks).count(), 2)
+
+        archived = ArchivedInvoice.objects.get(pk=pks[0])
+        self.assertEqual(archived.full_number, self.paid[0].full_number)
+        self.assertEqual(archived.item_set.get().unit_price, Decimal('100.00'))
+        self.assertEqual(archived.payments.get().amount, Decimal('120.00'))
+        self.assertTrue(archived.documents.exists())
+
+        self.assertEqual(InvoiceFacet.objects.counts('year'), [{'year': 2014, 'count': 1}, {'year': 2015, 'count': 1}])
+        self.assertEqual(OutboxEvent.objects.filter(action=OutboxEvent.ACTION.ARCHIVED).count(), 2)
+
+        # nothing left to archive, archive tables are kept
+        self.assertEqual(archive_year(2014), 0)
+        ensure_archive_tables()
+
+    def test_including_archive(self):
+        archive_year(2014)
+
+        invoices = including_archive(date_issue__year=2014)
+        self.assertEqual(invoices.count(), 3)
+        self.assertEqual([invoice.date_issue.day for invoice in invoices], [10, 15, 20])
+        self.assertEqual([type(invoice) for invoice in invoices], [ArchivedInvoice, Invoice, ArchivedInvoice])
+
+        invoices = including_archive().filter(status=Invoice.STATUS.PAID).order_by('-date_issue')
+        self.assertEqual([invoice.pk for invoice in invoices], [self.paid[1].pk, self.paid[0].pk])
+        self.assertEqual(including_archive().exclude(status=Invoice.STATUS.NEW)[1:3][0].pk, self.paid[1].pk)
+        self.assertEqual(including_archive()[3].pk, self.later.pk)
+
+        page = Paginator(including_archive().order_by('-date_issue', 'number'), 3).page(2)
+        self.assertEqual([invoice.pk for invoice in page], [self.paid[0].pk])
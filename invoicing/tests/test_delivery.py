@@ -0,0 +1,58 @@
+from decimal import Decimal
+from smtplib import SMTPException
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+
+from invoicing.delivery import deliver
+from invoicing.models import DeliveryAttempt, Invoice, InvoiceDocument, InvoiceSnapshot, Item
+from invoicing.tests.base import create_invoice
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException('Connection refused')
+
+
+def create_digital_invoice():
+    return create_invoice(delivery_method=Invoice.DELIVERY_METHOD.DIGITAL, customer_email='customer@example.com')
+
+
+class DeliveryTest(TestCase):
+    def test_stored_document_is_attached(self):
+        invoice = create_digital_invoice()
+        create_invoice()
+
+        self.assertEqual(deliver(), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['customer@example.com'])
+        filename, content, mimetype = mail.outbox[0].attachments[0]
+        document = InvoiceDocument.objects.get(invoice=invoice, format='html')
+        self.assertEqual(content, document.get_content())
+
+        invoice = Invoice.objects.get(pk=invoice.pk)
+        self.assertEqual(invoice.status, Invoice.STATUS.SENT)
+        self.assertTrue(invoice.snapshot.verify())
+        self.assertEqual(DeliveryAttempt.objects.get().status, DeliveryAttempt.STATUS.SENT)
+
+    def test_delivered_invoice_is_not_changed_by_late_items(self):
+        invoice = create_digital_invoice()
+        deliver()
+        Item.objects.create(invoice=invoice, title='Late item', unit_price=Decimal('50.00'), tax_rate=Decimal(20))
+
+        self.assertEqual(InvoiceSnapshot.objects.get(invoice=invoice).total, Decimal('120.00'))
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).balance_due, Decimal('120.00'))
+
+    @override_settings(EMAIL_BACKEND='invoicing.tests.test_delivery.FailingEmailBackend')
+    def test_failed_invoice_is_reopened(self):
+        invoice = create_digital_invoice()
+
+        self.assertEqual(deliver(), (0, 1))
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).status, Invoice.STATUS.NEW)
+        self.assertFalse(InvoiceSnapshot.objects.filter(invoice=invoice).exists())
+        self.assertFalse(InvoiceDocument.objects.filter(invoice=invoice).exists())
+        self.assertEqual(DeliveryAttempt.objects.get().error, 'SMTPException: Connection refused')
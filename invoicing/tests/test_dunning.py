@@ -0,0 +1,87 @@
+import datetime
+
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from invoicing.dunning import due_reminders, send_reminders
+from invoicing.models import Invoice, Reminder
+from invoicing.tests.base import create_invoice
+
+
+# invoices are due on 2016-01-29
+LEVEL_1 = datetime.date(2016, 2, 10)
+LEVEL_2 = datetime.date(2016, 2, 20)
+
+
+def create_overdue_invoice(**kwargs):
+    kwargs.setdefault('customer_email', 'customer@example.com')
+    invoice = create_invoice(**kwargs)
+    Invoice.objects.filter(pk=invoice.pk).mark_sent()
+    return invoice
+
+
+class DunningTest(TestCase):
+    def test_invoices_are_grouped_per_customer(self):
+        first = create_overdue_invoice()
+        second = create_overdue_invoice(date_issue=datetime.date(2016, 1, 10))
+        other = create_overdue_invoice(customer_email='other@example.com')
+        create_overdue_invoice(currency='CZK')
+        create_invoice(customer_email='customer@example.com', date_issue=datetime.date(2016, 2, 1))
+
+        reminders = dict(((reminder.recipient, reminder.currency), reminder) for reminder in due_reminders(LEVEL_1))
+
+        self.assertEqual(sorted(reminders), [('customer@example.com', 'CZK'), ('customer@example.com', 'EUR'),
+                                             ('other@example.com', 'EUR')])
+        reminder = reminders[('customer@example.com', 'EUR')]
+        self.assertEqual(reminder.invoice_ids, [second.pk, first.pk])
+        self.assertEqual(reminder.outstanding, first.balance_due + second.balance_due)
+        self.assertEqual(reminders[('other@example.com', 'EUR')].invoice_ids, [other.pk])
+
+        self.assertEqual(len(send_reminders(LEVEL_1)), 3)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_levels_are_escalated_once(self):
+        invoice = create_overdue_invoice()
+
+        self.assertEqual([reminder.level for reminder in send_reminders(LEVEL_1)], [1])
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).dunning_level, 1)
+
+        # repeated run of the same day sends nothing
+        self.assertEqual(send_reminders(LEVEL_1), [])
+        self.assertEqual(send_reminders(LEVEL_1 + datetime.timedelta(days=1)), [])
+
+        self.assertEqual([reminder.level for reminder in send_reminders(LEVEL_2)], [2])
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).dunning_level, 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(list(Reminder.objects.order_by('pk').values_list('level', 'status')),
+                         [(1, Reminder.STATUS.SENT), (2, Reminder.STATUS.SENT)])
+
+    def test_failed_reminder_is_retried(self):
+        invoice = create_overdue_invoice()
+
+        with override_settings(EMAIL_BACKEND='invoicing.tests.test_delivery.FailingEmailBackend'):
+            reminder, = send_reminders(LEVEL_1)
+        self.assertEqual(reminder.status, Reminder.STATUS.FAILED)
+        self.assertEqual(reminder.error, 'SMTPException: Connection refused')
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).dunning_level, 0)
+
+        reminder, = send_reminders(LEVEL_1)
+        self.assertEqual(reminder.status, Reminder.STATUS.SENT)
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).dunning_level, 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_customer_without_email(self):
+        invoice = create_invoice()
+
+        reminder, = send_reminders(LEVEL_1)
+
+        self.assertEqual(reminder.status, Reminder.STATUS.NEW)
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).dunning_level, 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_command_rejects_invalid_date(self):
+        for value in ('2023-02-30', 'foo'):
+            with self.assertRaisesMessage(CommandError, 'Invalid date "%s".' % value):
+                call_command('send_reminders', date=value)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import csv
+import datetime
+import io
+import json
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.utils import six
+
+from invoicing.exports import CSVWriter, InvoiceExport, ItemExport, JSONLinesWriter, keyset_chunks
+from invoicing.models import Invoice
+from invoicing.tests.base import SuperuserMixin, create_invoice
+
+
+def read_csv(lines):
+    content = b''.join(lines) if six.PY2 else ''.join(lines)
+    if six.PY2:
+        return [[value.decode('utf-8') for value in row] for row in csv.reader(io.BytesIO(content))]
+    return list(csv.reader(io.StringIO(content, newline='')))
+
+
+class KeysetChunksTest(TestCase):
+    def test_chunks_across_pk_gaps(self):
+        invoices = [create_invoice(items=()) for i in range(7)]
+        deleted = [invoices[1].pk, invoices[2].pk, invoices[5].pk]
+        kept = [invoice.pk for invoice in invoices if invoice.pk not in deleted]
+        Invoice.objects.filter(pk__in=deleted).delete()
+
+        chunks = list(keyset_chunks(Invoice.objects.all(), ('id',), chunk_size=2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2])
+        self.assertEqual([row['id'] for chunk in chunks for row in chunk], kept)
+
+    def test_chunk_size_of_exact_multiple(self):
+        for i in range(4):
+            create_invoice(items=())
+
+        chunks = list(keyset_chunks(Invoice.objects.all(), ('id',), chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2])
+
+
+class InvoiceExportTest(TestCase):
+    def test_totals(self):
+        invoice = create_invoice(items=((2, '10.00', 20), (1, '5.00', 0)), credit='1.00')
+
+        row = list(InvoiceExport(chunk_size=1).rows())[0]
+
+        self.assertEqual(row['id'], invoice.pk)
+        self.assertEqual(str(row['subtotal']), '25.00')
+        self.assertEqual(str(row['vat']), '4.00')
+        self.assertEqual(str(row['total']), '28.00')
+
+    def test_date_range(self):
+        create_invoice(items=(), date_issue=datetime.date(2016, 1, 31))
+        february = create_invoice(items=(), date_issue=datetime.date(2016, 2, 1))
+
+        rows = list(InvoiceExport(date_from=datetime.date(2016, 2, 1), date_to=datetime.date(2016, 2, 29)).rows())
+        self.assertEqual([row['id'] for row in rows], [february.pk])
+
+    def test_items(self):
+        invoice = create_invoice(items=((3, '1.50', 20),))
+
+        rows = list(ItemExport().rows())
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['invoice'], invoice.pk)
+        self.assertEqual(str(rows[0]['total']), '5.40')
+
+
+class CSVWriterTest(TestCase):
+    def test_escaping(self):
+        name = 'Fish, "Chips"\nand Čaj'
+        invoice = create_invoice(items=(), customer_name=name, reference=None)
+
+        rows = read_csv(CSVWriter().lines(InvoiceExport()))
+        header, values = rows[0], rows[1]
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(header, list(InvoiceExport.fields + InvoiceExport.total_fields))
+        self.assertEqual(values[header.index('customer_name')], name)
+        self.assertEqual(values[header.index('reference')], '')
+        self.assertEqual(values[header.index('id')], str(invoice.pk))
+
+
+class JSONLinesWriterTest(TestCase):
+    def test_lines(self):
+        create_invoice(items=((1, '10.00', 20),), customer_name='Čaj "s.r.o."')
+
+        lines = list(JSONLinesWriter().lines(InvoiceExport()))
+
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith('\n'))
+        row = json.loads(lines[0])
+        self.assertEqual(row['customer_name'], 'Čaj "s.r.o."')
+        self.assertEqual(row['total'], '12.00')
+
+
+class InvoiceExportViewTest(SuperuserMixin, TestCase):
+    def test_streams_csv(self):
+        create_invoice()
+
+        response = self.client.get(reverse('invoicing:invoice_export'), {'export': 'items'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+
+    def test_invalid_date(self):
+        for value in ('2016-13-01', '2016-02-31', 'yesterday'):
+            response = self.client.get(reverse('invoicing:invoice_export'), {'date_from': value})
+            self.assertEqual(response.status_code, 400)
+
+    def test_unknown_export(self):
+        response = self.client.get(reverse('invoicing:invoice_export'), {'export': 'payments'})
+        self.assertEqual(response.status_code, 404)
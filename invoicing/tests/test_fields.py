@@ -0,0 +1,39 @@
+from collections import OrderedDict
+
+from django.test import TestCase
+
+from invoicing.fields import RawJSON
+from invoicing.models import Invoice
+from invoicing.tests.base import create_invoice
+
+
+class LazyJSONFieldTest(TestCase):
+    def setUp(self):
+        self.invoice = create_invoice(customer_additional_info={'note': 'customer', 'tags': [1, 2]})
+
+    def test_decoded_on_access(self):
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertIsInstance(invoice.__dict__['customer_additional_info'], RawJSON)
+
+        self.assertEqual(invoice.customer_additional_info, {'note': 'customer', 'tags': [1, 2]})
+        self.assertIsInstance(invoice.__dict__['customer_additional_info'], dict)
+
+    def test_unchanged_value_is_saved_raw(self):
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        raw = invoice.__dict__['customer_additional_info']
+        field = Invoice._meta.get_field('customer_additional_info')
+        self.assertEqual(field.get_prep_value(raw), raw)
+
+        invoice.save()
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).customer_additional_info,
+                         {'note': 'customer', 'tags': [1, 2]})
+
+    def test_changed_value(self):
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        invoice.customer_additional_info = OrderedDict([('note', 'changed')])
+        invoice.save()
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).customer_additional_info, {'note': 'changed'})
+
+    def test_null(self):
+        invoice = create_invoice(customer_additional_info=None)
+        self.assertIsNone(Invoice.objects.get(pk=invoice.pk).customer_additional_info)
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from invoicing import finalization
+from invoicing.finalization import finalize, finalize_pending
+from invoicing.models import Invoice, InvoiceDocument, InvoiceSnapshot, Item
+from invoicing.tests.base import create_invoice
+
+
+def add_item(invoice):
+    Item.objects.create(invoice=invoice, title='Correction', unit_price=Decimal('50.00'), tax_rate=Decimal(20))
+
+
+class FinalizationTest(TestCase):
+    def assertFinalized(self, invoice, total):
+        snapshot = InvoiceSnapshot.objects.get(invoice=invoice)
+        self.assertEqual(snapshot.total, Decimal(total))
+        self.assertTrue(snapshot.verify())
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).balance_due, Decimal(total))
+
+    def test_returned_invoice_is_finalized_again(self):
+        invoice = create_invoice()
+        Invoice.objects.filter(pk=invoice.pk).mark_sent()
+        self.assertFinalized(invoice, '120.00')
+
+        Invoice.objects.filter(pk=invoice.pk).mark_returned()
+        self.assertFalse(InvoiceSnapshot.objects.filter(invoice=invoice).exists())
+        self.assertFalse(InvoiceDocument.objects.filter(invoice=invoice).exists())
+
+        add_item(invoice)
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).balance_due, Decimal('180.00'))
+
+        Invoice.objects.filter(pk=invoice.pk).mark_sent()
+        self.assertFinalized(invoice, '180.00')
+
+    def test_returned_invoice_is_finalized_again_on_save(self):
+        invoice = create_invoice()
+        invoice.status = Invoice.STATUS.SENT
+        invoice.save()
+        self.assertFinalized(invoice, '120.00')
+
+        invoice.status = Invoice.STATUS.RETURNED
+        invoice.save()
+        self.assertFalse(InvoiceSnapshot.objects.filter(invoice=invoice).exists())
+
+        add_item(invoice)
+        invoice.status = Invoice.STATUS.SENT
+        invoice.save()
+        self.assertFinalized(invoice, '180.00')
+
+    def test_returned_invoice_is_not_finalized(self):
+        invoice = create_invoice()
+        Invoice.objects.filter(pk=invoice.pk).mark_sent()
+        Invoice.objects.filter(pk=invoice.pk).mark_returned()
+
+        self.assertEqual(finalize_pending(), 0)
+        self.assertFalse(InvoiceSnapshot.objects.filter(invoice=invoice).exists())
+
+    def test_finalize_pending(self):
+        invoice = create_invoice()
+        Invoice.objects.filter(pk=invoice.pk).mark_sent()
+        # e.g. process crashed after status was changed
+        InvoiceDocument.objects.filter(invoice=invoice).delete()
+        InvoiceSnapshot.objects.filter(invoice=invoice).delete()
+        create_invoice()
+
+        self.assertEqual(finalize_pending(), 1)
+        self.assertFinalized(invoice, '120.00')
+        self.assertEqual(finalize_pending(), 0)
+
+    def test_invoice_modified_while_rendered_is_rendered_again(self):
+        invoice = create_invoice()
+        Invoice.objects.filter(pk=invoice.pk).update(status=Invoice.STATUS.SENT)
+        render_documents = finalization.render_documents
+        rendered = []
+
+        def render_and_modify(invoice):
+            if not rendered:
+                # e.g. item added by concurrent request before invoice rows are locked
+                add_item(invoice)
+            rendered.append(invoice.pk)
+            return render_documents(invoice)
+
+        finalization.render_documents = render_and_modify
+        try:
+            self.assertEqual(finalize([invoice.pk]), 1)
+        finally:
+            finalization.render_documents = render_documents
+
+        self.assertEqual(rendered, [invoice.pk, invoice.pk])
+        self.assertFinalized(invoice, '180.00')
@@ -0,0 +1,77 @@
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase
+
+from invoicing.formatters import registry as formatters
+from invoicing.formatters.html import HTMLFormatter
+from invoicing.formatters.pdf import PDFFormatter
+from invoicing.models import Invoice, Payment
+from invoicing.tests.base import SuperuserMixin, create_invoice
+
+
+class CacheKeyTest(TestCase):
+    def get_cache_key(self, invoice):
+        return HTMLFormatter(Invoice.objects.get(pk=invoice.pk)).get_cache_key()
+
+    def test_deleted_item_changes_key(self):
+        invoice = create_invoice(items=((1, '10.00', 20), (2, '5.00', 20)))
+        key = self.get_cache_key(invoice)
+
+        # not the latest modified item
+        invoice.item_set.order_by('modified').first().delete()
+        self.assertNotEqual(self.get_cache_key(invoice), key)
+
+    def test_payment_changes_key(self):
+        invoice = create_invoice()
+        key = self.get_cache_key(invoice)
+
+        Payment.objects.create(invoice=invoice, amount='10.00')
+        self.assertNotEqual(self.get_cache_key(invoice), key)
+
+    def test_balance_update_changes_key(self):
+        invoice = create_invoice()
+        key = self.get_cache_key(invoice)
+
+        Invoice.objects.filter(pk=invoice.pk).update_balances()
+        self.assertNotEqual(self.get_cache_key(invoice), key)
+
+
+class ContentNegotiationTest(SuperuserMixin, TestCase):
+    def setUp(self):
+        super(ContentNegotiationTest, self).setUp()
+        self.url = reverse('invoicing:invoice_detail', kwargs={'pk': create_invoice().pk})
+
+    def get(self, accept=None, **params):
+        if accept is not None:
+            return self.client.get(self.url, params, HTTP_ACCEPT=accept)
+        return self.client.get(self.url, params)
+
+    def test_format_parameter_overrides_accept(self):
+        response = self.get('application/pdf', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertNotIn('Accept', response.get('Vary', ''))
+
+    def test_quality_ordering(self):
+        response = self.get('application/pdf;q=0.5, application/json, text/html;q=0.8')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('Accept', response['Vary'])
+
+        response = self.get('application/json;q=0, text/html;q=0.1')
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+    def test_wildcards(self):
+        for accept in ('*/*', 'text/*', 'image/png, */*;q=0.1'):
+            response = self.get(accept)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/html'), accept)
+
+        # the first formatter of media type (rendering PDF requires WeasyPrint)
+        request = RequestFactory().get(self.url, HTTP_ACCEPT='application/*, text/html;q=0.5')
+        self.assertIs(formatters.negotiate(request), PDFFormatter)
+
+    def test_default_format(self):
+        self.assertTrue(self.get()['Content-Type'].startswith('text/html'))
+
+    def test_not_acceptable(self):
+        self.assertEqual(self.get(format='docx').status_code, 406)
+        self.assertEqual(self.get('image/png, application/json;q=0').status_code, 406)
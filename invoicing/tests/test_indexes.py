@@ -0,0 +1,84 @@
+import datetime
+from importlib import import_module
+from unittest import skipUnless
+
+from django.apps import apps
+from django.db import IntegrityError, connection
+from django.test import TestCase
+
+from invoicing.models import Invoice, Item
+from invoicing.tests.base import create_invoice
+
+
+def index_name(model, columns):
+    """
+    Name of index (or unique constraint) of model table on given columns.
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return next(name for name, constraint in constraints.items()
+                if (constraint['index'] or constraint['unique']) and constraint['columns'] == list(columns))
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'query plans are checked on SQLite and PostgreSQL')
+class QueryPlanTest(TestCase):
+    """
+    Hot queries of numbering, full number lookup and item listing are served by composite indexes.
+    """
+
+    def setUp(self):
+        self.invoice = create_invoice(items=((1, '10.00', 20), (2, '20.00', 20)))
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            else:
+                # tables of tests are small, sequential scan would always win
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, model, columns):
+        name = index_name(model, columns)
+        plan = self.query_plan(queryset)
+        self.assertIn(name, plan, 'index %s is not used:\n%s' % (name, plan))
+
+    def test_numbering(self):
+        queryset = Invoice.objects.filter(
+            type=Invoice.TYPE.INVOICE, date_issue__gte=datetime.date(2016, 1, 1), date_issue__lte=datetime.date(2016, 12, 31)
+        ).order_by('-number').values('number')
+        self.assertUsesIndex(queryset, Invoice, ('type', 'date_issue', 'number'))
+
+    def test_full_number_lookup(self):
+        queryset = Invoice.objects.filter(type=Invoice.TYPE.INVOICE, full_number=self.invoice.full_number)
+        self.assertUsesIndex(queryset, Invoice, ('type', 'full_number'))
+
+    def test_items_of_invoice(self):
+        queryset = self.invoice.item_set.all()
+        self.assertUsesIndex(queryset, Item, ('invoice_id', 'weight', 'created'))
+        if connection.vendor == 'sqlite':
+            # rows are read in index order, without sorting
+            self.assertNotIn('TEMP B-TREE', self.query_plan(queryset))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'unique index is dropped in rolled back transaction')
+class DuplicateNumbersTest(TestCase):
+    def test_check(self):
+        migration = import_module('invoicing.migrations.0012_numbering_indexes')
+
+        class SchemaEditor(object):
+            pass
+        schema_editor = SchemaEditor()
+        schema_editor.connection = connection
+
+        create_invoice()
+        migration.check_duplicate_numbers(apps, schema_editor)
+
+        with connection.cursor() as cursor:
+            # unique index of the current schema is removed only for this test
+            cursor.execute('DROP INDEX %s' % index_name(Invoice, ('type', 'full_number')))
+        create_invoice(full_number=Invoice.objects.get().full_number)
+        with self.assertRaisesRegexp(IntegrityError, 'duplicates'):
+            migration.check_duplicate_numbers(apps, schema_editor)
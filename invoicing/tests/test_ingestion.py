@@ -0,0 +1,65 @@
+import json
+
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase, override_settings
+
+from invoicing.ingestion import CREATED, EXISTING, INVALID, ingest
+from invoicing.models import Invoice
+from invoicing.tests.base import SuperuserMixin, ingest_payload
+
+
+class IngestionTest(TestCase):
+    def test_idempotency(self):
+        payloads = [ingest_payload('order-1'), ingest_payload('order-2'), ingest_payload('order-1')]
+        results = ingest(payloads)
+        self.assertEqual([result.status for result in results], [CREATED, CREATED, EXISTING])
+        self.assertEqual(results[0].invoice, results[2].invoice)
+
+        numbers = list(Invoice.objects.values_list('number', flat=True))
+        self.assertEqual([result.status for result in ingest(payloads)], [EXISTING] * 3)
+        self.assertEqual(list(Invoice.objects.values_list('number', flat=True)), numbers)
+
+    def test_invalid_keys(self):
+        results = ingest([ingest_payload(['order-1']), ingest_payload({'key': 1}), ingest_payload(None),
+                          ingest_payload('order-1')])
+        self.assertEqual([result.status for result in results], [INVALID, INVALID, INVALID, CREATED])
+        self.assertEqual(results[0].errors, {'idempotency_key': ['Enter a string.']})
+        self.assertEqual(results[2].errors, {'idempotency_key': ['This field is required.']})
+
+    def test_invalid_payload(self):
+        result, = ingest([ingest_payload('order-1', currency='', unknown=1)])
+        self.assertEqual(result.status, INVALID)
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_invalid_country(self):
+        result, = ingest([ingest_payload('order-1', customer_country='XX', currency='')])
+        self.assertEqual(result.status, INVALID)
+        self.assertEqual(sorted(result.errors), ['currency', 'customer_country'])
+
+
+@override_settings(INVOICING_INGEST_TOKENS=('secret-token', ))
+class IngestViewTest(SuperuserMixin, TestCase):
+    def post(self, client, data, **extra):
+        return client.post(reverse('invoicing:invoice_ingest'), json.dumps(data),
+                           content_type='application/json', **extra)
+
+    def test_token(self):
+        client = Client(enforce_csrf_checks=True)
+        response = self.post(client, {'invoices': [ingest_payload('order-1'), ingest_payload([])]},
+                             HTTP_AUTHORIZATION='Token secret-token')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content.decode('utf-8'))['results']
+        self.assertEqual([result['status'] for result in results], [CREATED, INVALID])
+
+        response = self.post(client, {'invoices': []}, HTTP_AUTHORIZATION='Token other')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.post(client, {'invoices': []}).status_code, 401)
+
+    def test_session_requires_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='admin', password='admin')
+        self.assertEqual(self.post(client, {'invoices': []}).status_code, 403)
+        self.assertEqual(self.post(self.client, {'invoices': []}).status_code, 200)
+
+    def test_bad_request(self):
+        self.assertEqual(self.post(self.client, {'invoices': {}}).status_code, 400)
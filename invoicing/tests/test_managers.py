@@ -0,0 +1,185 @@
+import datetime
+from decimal import Decimal
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from invoicing.models import Invoice, InvoiceFacet, Item, OutboxEvent, Payment
+from invoicing.tests.base import SuperuserMixin, create_invoice
+
+
+def create_sent_invoice(**kwargs):
+    invoice = create_invoice(**kwargs)
+    Invoice.objects.filter(pk=invoice.pk).mark_sent()
+    return invoice
+
+
+class AgingTest(TestCase):
+    today = datetime.date(2016, 3, 1)
+
+    def test_buckets(self):
+        current = create_sent_invoice(date_issue=datetime.date(2016, 2, 20))
+        overdue = create_sent_invoice(items=((2, '50.00', 20), ), customer_name='Other customer')
+        create_sent_invoice(customer_name='Other customer', credit=Decimal('20.00'))
+        Payment.objects.create(invoice=current, amount=Decimal('30.00'))
+
+        rows = Invoice.objects.aging(self.today)
+        self.assertEqual([row['customer_name'] for row in rows], ['Example customer', 'Other customer'])
+        self.assertEqual(rows[0]['current'], Decimal('90.00'))
+        self.assertEqual(rows[0]['total'], Decimal('90.00'))
+        self.assertEqual(rows[1]['31_60'], Decimal('220.00'))
+        self.assertEqual(rows[1]['total'], Decimal('220.00'))
+        self.assertEqual(rows[1]['current'], 0)
+
+        Invoice.objects.filter(pk=overdue.pk).mark_paid()
+        self.assertEqual(Invoice.objects.aging(self.today)[1]['total'], Decimal('100.00'))
+
+    def test_drafts_are_excluded(self):
+        create_invoice()
+        returned = create_sent_invoice(customer_name='Other customer')
+        Invoice.objects.filter(pk=returned.pk).mark_returned()
+
+        rows = Invoice.objects.aging(self.today)
+        self.assertEqual([(row['customer_name'], row['total']) for row in rows], [('Other customer', Decimal('120.00'))])
+
+    def test_single_query(self):
+        create_sent_invoice()
+        with self.assertNumQueries(1):
+            Invoice.objects.aging(self.today)
+
+
+class PaymentBalanceTest(TestCase):
+    def assertBalance(self, invoice, amount_paid, balance_due):
+        invoice = Invoice.objects.get(pk=invoice.pk)
+        self.assertEqual((invoice.amount_paid, invoice.balance_due), (Decimal(amount_paid), Decimal(balance_due)))
+
+    def test_payments(self):
+        invoice = create_invoice(credit=Decimal('20.00'))
+        self.assertBalance(invoice, '0.00', '100.00')
+
+        payment = Payment.objects.create(invoice=invoice, amount=Decimal('30.00'))
+        Payment.objects.create(invoice=invoice, amount=Decimal('10.00'))
+        self.assertBalance(invoice, '40.00', '60.00')
+
+        payment.amount = Decimal('90.00')
+        payment.save()
+        self.assertBalance(invoice, '100.00', '0.00')
+
+        Payment.objects.get(pk=payment.pk).delete()
+        self.assertBalance(invoice, '10.00', '90.00')
+
+    def test_filters(self):
+        unpaid = create_invoice()
+        partially_paid = create_invoice()
+        Payment.objects.create(invoice=partially_paid, amount=Decimal('20.00'))
+        paid = create_invoice()
+        Payment.objects.create(invoice=paid, amount=Decimal('120.00'))
+        overpaid = create_invoice()
+        Payment.objects.create(invoice=overpaid, amount=Decimal('150.00'))
+        create_invoice(credit=Decimal('120.00'))
+        canceled = create_invoice()
+        Payment.objects.create(invoice=canceled, amount=Decimal('20.00'))
+        Invoice.objects.filter(pk=canceled.pk).cancel()
+
+        self.assertEqual(list(Invoice.objects.unpaid().values_list('pk', flat=True)), [unpaid.pk])
+        self.assertEqual(list(Invoice.objects.partially_paid().values_list('pk', flat=True)), [partially_paid.pk])
+
+        # partial payment is refunded
+        Payment.objects.filter(invoice=partially_paid).get().delete()
+        self.assertEqual(sorted(Invoice.objects.unpaid().values_list('pk', flat=True)), [unpaid.pk, partially_paid.pk])
+        self.assertFalse(Invoice.objects.partially_paid().exists())
+
+
+class WriteRoutingTest(TestCase):
+    def test_queryset_routing_is_kept(self):
+        invoice = create_invoice()
+        queryset = Invoice.objects.filter(pk=invoice.pk)
+
+        self.assertEqual(queryset.update_balances(), 1)
+        self.assertFalse(queryset._for_write)
+
+        self.assertEqual(queryset.mark_returned(), [])
+        self.assertEqual(queryset.cancel(), [invoice.pk])
+        self.assertFalse(queryset._for_write)
+
+
+class FacetTest(SuperuserMixin, TestCase):
+    def counts(self):
+        return dict(((row['type'], row['status']), row['count'])
+                    for row in InvoiceFacet.objects.counts('type', 'status'))
+
+    def test_deletes(self):
+        invoices = [create_invoice() for i in range(4)]
+        self.assertEqual(self.counts(), {(Invoice.TYPE.INVOICE, Invoice.STATUS.NEW): 4})
+
+        invoices[0].delete()
+        Invoice.objects.filter(pk=invoices[1].pk).delete()
+        response = self.client.post(reverse('admin:invoicing_invoice_changelist'), {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [invoices[2].pk],
+        })
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(self.counts(), {(Invoice.TYPE.INVOICE, Invoice.STATUS.NEW): 1})
+        self.assertEqual(InvoiceFacet.objects.counts('year'), [{'year': 2016, 'count': 1}])
+
+
+class ItemUpdateInBulkTest(TestCase):
+    def test_update(self):
+        invoice = create_invoice(items=((1, '10.00', 20), (2, '20.00', 20), (3, '30.00', 20)))
+        items = list(invoice.item_set.order_by('pk'))
+        items[0].title = 'First'
+        items[1].unit_price = Decimal('25.00')
+        events = OutboxEvent.objects.count()
+
+        # savepoint, UPDATE per chunk, outbox INSERT, release
+        with self.assertNumQueries(5):
+            Item.objects.update_in_bulk(items[:2], ['title', 'unit_price'], chunk_size=1)
+
+        self.assertEqual(list(invoice.item_set.order_by('pk').values_list('title', 'unit_price')), [
+            ('First', Decimal('10.00')), ('Item', Decimal('25.00')), ('Item', Decimal('30.00'))])
+        self.assertEqual(OutboxEvent.objects.count(), events + 2)
+
+
+class OutboxTest(SuperuserMixin, TestCase):
+    def events(self, position):
+        return [(event.object_type, event.object_id, event.action, event.data) for event in OutboxEvent.objects.after(position)]
+
+    def test_deletes(self):
+        invoices = [create_invoice() for i in range(3)]
+        items = [invoice.item_set.get().pk for invoice in invoices]
+        position = OutboxEvent.objects.last().get_position()
+
+        Invoice.objects.filter(pk=invoices[0].pk).delete()
+        response = self.client.post(reverse('admin:invoicing_invoice_changelist'), {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [invoices[1].pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        Item.objects.filter(pk=items[2]).delete()
+
+        self.assertEqual(self.events(position), [
+            (OutboxEvent.OBJECT_TYPE.ITEM, items[0], OutboxEvent.ACTION.DELETED, None),
+            (OutboxEvent.OBJECT_TYPE.INVOICE, invoices[0].pk, OutboxEvent.ACTION.DELETED, None),
+            (OutboxEvent.OBJECT_TYPE.ITEM, items[1], OutboxEvent.ACTION.DELETED, None),
+            (OutboxEvent.OBJECT_TYPE.INVOICE, invoices[1].pk, OutboxEvent.ACTION.DELETED, None),
+            (OutboxEvent.OBJECT_TYPE.ITEM, items[2], OutboxEvent.ACTION.DELETED, None),
+        ])
+
+    def test_mark_overdue(self):
+        # both are overdue when they are saved, only one of them was on March 1
+        overdue = create_invoice(date_issue=datetime.date(2016, 1, 1))
+        current = create_invoice(date_issue=datetime.date(2016, 2, 20))
+        position = OutboxEvent.objects.last().get_position()
+
+        self.assertEqual(Invoice.objects.get_queryset().mark_overdue(datetime.date(2016, 3, 1)), (0, 1))
+        self.assertEqual(self.events(position), [
+            (OutboxEvent.OBJECT_TYPE.INVOICE, current.pk, OutboxEvent.ACTION.UPDATED, {'overdue': False})])
+
+        position = OutboxEvent.objects.last().get_position()
+        self.assertEqual(Invoice.objects.get_queryset().mark_overdue(), (1, 0))
+        self.assertEqual(self.events(position), [
+            (OutboxEvent.OBJECT_TYPE.INVOICE, current.pk, OutboxEvent.ACTION.UPDATED, {'overdue': True})])
+
+        Invoice.objects.filter(pk=overdue.pk).mark_paid()
+        position = OutboxEvent.objects.last().get_position()
+        self.assertEqual(Invoice.objects.get_queryset().mark_overdue(), (0, 0))
+        self.assertEqual(self.events(position), [])
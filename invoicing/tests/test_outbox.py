@@ -0,0 +1,86 @@
+import datetime
+from unittest import skipIf, skipUnless
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+from invoicing.models import OutboxCursor, OutboxEvent
+from invoicing.outbox import acknowledge, compact, consume, get_position, read
+
+
+def event(pk, transaction_id=0, age=3600):
+    # events are settled by default (older than settle time of databases without transaction ids)
+    return OutboxEvent(pk=pk, transaction_id=transaction_id, object_type=OutboxEvent.OBJECT_TYPE.INVOICE,
+                       object_id=pk, invoice_id=pk, action=OutboxEvent.ACTION.UPDATED,
+                       created=now() - datetime.timedelta(seconds=age))
+
+
+def positions(events):
+    return [event.get_position() for event in events]
+
+
+class OutboxTest(TestCase):
+    def test_positions(self):
+        OutboxEvent.objects.bulk_create([event(1), event(2, 20), event(3, 10), event(4, 10)])
+
+        self.assertEqual(positions(read((0, 0))), [(0, 1), (10, 3), (10, 4), (20, 2)])
+        self.assertEqual(positions(read((10, 3))), [(10, 4), (20, 2)])
+
+        self.assertEqual([positions(events) for events in consume('warehouse', batch_size=3)],
+                         [[(0, 1), (10, 3), (10, 4)], [(20, 2)]])
+        self.assertEqual(get_position('warehouse'), (20, 2))
+
+        # cursor is never moved back
+        acknowledge('warehouse', (10, 4))
+        self.assertEqual(get_position('warehouse'), (20, 2))
+
+    def test_compact(self):
+        OutboxEvent.objects.bulk_create([event(1), event(2, 20), event(3, 10)])
+        self.assertEqual(compact(), 0)
+
+        acknowledge('warehouse', (20, 2))
+        acknowledge('archive', (10, 3))
+        self.assertEqual(compact(chunk_size=1), 2)
+        self.assertEqual(positions(OutboxEvent.objects.all()), [(20, 2)])
+
+
+@skipIf(connection.vendor == 'postgresql', 'PostgreSQL reads events by transaction visibility')
+class SettleTimeTest(TestCase):
+    def test_late_committed_event(self):
+        OutboxEvent.objects.bulk_create([event(1, age=0), event(3, age=0)])
+
+        # event 2 may still be committed
+        self.assertEqual(positions(read((0, 0))), [(0, 1)])
+
+        OutboxEvent.objects.bulk_create([event(2, age=0)])
+        self.assertEqual(positions(read((0, 1))), [(0, 2), (0, 3)])
+
+    @override_settings(INVOICING_OUTBOX_SETTLE_SECONDS=60)
+    def test_old_gap_is_skipped(self):
+        OutboxEvent.objects.bulk_create([event(1, age=0), event(3, age=61)])
+
+        self.assertEqual(positions(read((0, 0))), [(0, 1), (0, 3)])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'transaction ids are recorded on PostgreSQL')
+class TransactionVisibilityTest(TransactionTestCase):
+    def test_late_committed_event(self):
+        other = connection.copy()
+        try:
+            with other.cursor() as cursor:
+                cursor.execute('BEGIN')
+                cursor.execute('INSERT INTO %s (object_type, object_id, invoice_id, action, transaction_id, created) '
+                               'VALUES (%%s, 1, 1, %%s, txid_current(), now())' % OutboxEvent._meta.db_table,
+                               [OutboxEvent.OBJECT_TYPE.INVOICE, OutboxEvent.ACTION.UPDATED])
+
+                # committed later than event of the running transaction
+                OutboxEvent.objects.record_invoices(OutboxEvent.ACTION.UPDATED, [2])
+                self.assertEqual(read((0, 0)), [])
+
+                cursor.execute('COMMIT')
+        finally:
+            other.close()
+
+        self.assertEqual([event.invoice_id for event in read((0, 0))], [1, 2])
+        self.assertFalse(OutboxCursor.objects.exists())
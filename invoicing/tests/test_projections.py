@@ -0,0 +1,31 @@
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase
+
+from invoicing.models import Invoice, Payment
+from invoicing.tests.base import create_invoice
+
+
+class ProjectionTest(TestCase):
+    def test_list_rows(self):
+        invoice = create_invoice(items=((2, '50.00', 20), ))
+        Payment.objects.create(invoice=invoice, amount=Decimal('20.00'))
+        invoice = Invoice.objects.get(pk=invoice.pk)
+
+        row, = Invoice.objects.as_rows('list')
+        self.assertEqual(row.full_number, invoice.full_number)
+        self.assertEqual(str(row), invoice.full_number)
+        self.assertEqual(row.customer_name, 'Example customer')
+        self.assertEqual(row.total, Decimal('120.00'))
+        self.assertEqual(row.balance_due, Decimal('100.00'))
+        self.assertEqual(row.is_overdue, invoice.is_overdue)
+        self.assertFalse(hasattr(row, '__dict__'))
+        self.assertFalse(hasattr(row, 'note'))
+
+    def test_custom_projection(self):
+        create_invoice(date_issue=datetime.date(2016, 2, 1))
+        with self.assertNumQueries(1):
+            rows = list(Invoice.objects.filter(date_issue__month=2).as_rows(('note', )))
+        self.assertEqual(rows[0].fields, Invoice.objects.get_queryset().ROW_FIELDS + ('note', ))
+        self.assertIs(type(rows[0]), Invoice.objects.get_queryset().row_class(('note', )))
@@ -0,0 +1,90 @@
+import datetime
+import io
+from decimal import Decimal
+
+from django.test import TestCase
+
+from invoicing.models import Invoice
+from invoicing.reconciliation import MATCHED, UNDERPAID, UNMATCHED, Reconciler, StatementLine, parse_camt053, \
+    parse_csv
+from invoicing.tests.base import create_invoice
+
+
+CSV = (
+    'amount,currency,date,variable_symbol,reference\n'
+    '120.00,EUR,2016-01-20,0001,\n'
+    '-50.00,EUR,2016-01-21,0001,\n'
+    '0,EUR,2016-01-21,,\n'
+    'n/a,EUR,2016-01-22,,\n'
+    '30.00,EUR,2023-02-30,0002,\n'
+)
+
+CAMT053 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+  <BkToCstmrStmt><Stmt>
+    <Ntry>
+      <Amt Ccy="EUR">120.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><BookgDt><Dt>2016-01-20</Dt></BookgDt>
+      <NtryDtls><TxDtls><Refs><EndToEndId>/VS0001/SS2</EndToEndId></Refs></TxDtls></NtryDtls>
+    </Ntry>
+    <Ntry>
+      <Amt Ccy="EUR">30.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><BookgDt><Dt>2023-02-30</Dt></BookgDt>
+      <NtryDtls><TxDtls><Refs><EndToEndId>/VS0002</EndToEndId></Refs></TxDtls></NtryDtls>
+    </Ntry>
+    <Ntry>
+      <Amt Ccy="EUR">50.00</Amt><CdtDbtInd>DBIT</CdtDbtInd><BookgDt><Dt>2016-01-21</Dt></BookgDt>
+    </Ntry>
+  </Stmt></BkToCstmrStmt>
+</Document>
+'''
+
+
+def line(amount, currency='EUR', variable_symbol=None, reference=None):
+    return StatementLine(amount=Decimal(amount), currency=currency, date=None, variable_symbol=variable_symbol,
+                         specific_symbol=None, constant_symbol=None, reference=reference)
+
+
+class ParseCSVTest(TestCase):
+    def test_credits_only(self):
+        lines = list(parse_csv(io.BytesIO(CSV.encode('utf-8')) if str is bytes else io.StringIO(CSV)))
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0].amount, Decimal('120.00'))
+        self.assertEqual(lines[0].variable_symbol, '1')
+        self.assertEqual(lines[0].date, datetime.date(2016, 1, 20))
+
+    def test_impossible_date_is_missing(self):
+        lines = list(parse_csv(io.BytesIO(CSV.encode('utf-8')) if str is bytes else io.StringIO(CSV)))
+        self.assertEqual((lines[1].variable_symbol, lines[1].date), ('2', None))
+
+
+class ParseCAMT053Test(TestCase):
+    def test_credits_only(self):
+        lines = list(parse_camt053(io.BytesIO(CAMT053)))
+        self.assertEqual([(line.amount, line.variable_symbol) for line in lines],
+                         [(Decimal('120.00'), '1'), (Decimal('30.00'), '2')])
+        self.assertEqual(lines[0].specific_symbol, '2')
+        self.assertEqual(lines[0].date, datetime.date(2016, 1, 20))
+
+    def test_impossible_date_is_missing(self):
+        lines = list(parse_camt053(io.BytesIO(CAMT053)))
+        self.assertIsNone(lines[1].date)
+
+
+class ReconcilerTest(TestCase):
+    def setUp(self):
+        self.invoice = create_invoice(variable_symbol=1, reference='RF18539007547034')
+
+    def test_match_and_apply(self):
+        results = Reconciler().reconcile([line('100.00', variable_symbol='1'), line('20.00', variable_symbol='1')])
+        self.assertEqual([result.status for result in results], [UNDERPAID, MATCHED])
+
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertEqual(invoice.status, Invoice.STATUS.PAID)
+        self.assertEqual(invoice.balance_due, 0)
+
+    def test_currency_mismatch_falls_back_to_reference(self):
+        create_invoice(variable_symbol=2, currency='CZK')
+        result = Reconciler().match(line('120.00', variable_symbol='2', reference='RF18539007547034'))
+        self.assertEqual((result.status, result.invoice), (MATCHED, self.invoice.pk))
+
+        result = Reconciler().match(line('120.00', variable_symbol='2'))
+        self.assertEqual(result.status, UNMATCHED)
@@ -0,0 +1,35 @@
+import datetime
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from invoicing.ingestion import CREATED, ingest
+from invoicing.models import Invoice, RecurringInvoice
+from invoicing.recurring import generate
+from invoicing.tests.base import ingest_payload
+
+
+class RecurringTest(TestCase):
+    def test_ingested_template(self):
+        result, = ingest([ingest_payload('order-1')])
+        self.assertEqual(result.status, CREATED)
+        template = Invoice.objects.get(pk=result.invoice)
+        self.assertEqual(template.customer_key, 'REG:SK:12345678')
+
+        RecurringInvoice.objects.create(template=template, period=RecurringInvoice.PERIOD.MONTHLY,
+                                        date_next=datetime.date(2016, 2, 15))
+        self.assertEqual(generate(datetime.date(2016, 3, 20)), 2)
+
+        invoices = Invoice.objects.filter(recurring__template=template).order_by('date_issue')
+        self.assertEqual([invoice.date_issue for invoice in invoices],
+                         [datetime.date(2016, 2, 15), datetime.date(2016, 3, 15)])
+        for invoice in invoices:
+            self.assertIsNone(invoice.idempotency_key)
+            self.assertEqual(invoice.customer_key, template.customer_key)
+            self.assertEqual(invoice.total, template.total)
+
+    def test_command_rejects_invalid_date(self):
+        for value in ('2023-02-30', 'foo'):
+            with self.assertRaisesMessage(CommandError, 'Invalid date "%s".' % value):
+                call_command('generate_recurring_invoices', date=value)
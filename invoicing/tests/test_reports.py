@@ -0,0 +1,71 @@
+import datetime
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from invoicing.models import Invoice, Item, VATReturnEntry, VATReturnPeriod
+from invoicing.reports import update_vat_returns, vat_return_lines
+from invoicing.tests.base import create_invoice
+
+
+class VATReturnTest(TransactionTestCase):
+    # changes are read from outbox, where PostgreSQL shows only events of committed transactions
+    def setUp(self):
+        self.first = create_invoice(items=((1, '100.00', 20), (2, '10.00', 10)))
+        self.second = create_invoice(items=((3, '50.00', 20), ))
+        self.period = VATReturnPeriod.objects.create(
+            date_from=datetime.date(2016, 1, 1), date_to=datetime.date(2016, 1, 31), closed=True)
+        self.assertTrue(self.period.refresh())
+
+    def assertStoredLines(self):
+        self.assertEqual(self.period.get_lines(), vat_return_lines(self.period.date_from, self.period.date_to))
+
+    def test_build(self):
+        lines = self.period.get_lines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[1]['tax_rate'], Decimal(20))
+        self.assertEqual(lines[1]['invoices'], 2)
+        self.assertEqual(lines[1]['base'], Decimal('250.00'))
+        self.assertEqual(lines[1]['vat'], Decimal('50.00'))
+        self.assertEqual(self.period.entries.count(), 3)
+        self.assertStoredLines()
+
+    def test_item_changes(self):
+        Item.objects.create(invoice=self.second, title='Extra', quantity=1, unit_price=Decimal('5.00'), tax_rate=10)
+        self.first.item_set.get(tax_rate=10).delete()
+        self.assertStoredLines()
+        self.assertEqual(self.period.get_lines()[0]['invoices'], 1)
+
+    def test_invoice_moved_out_of_period(self):
+        self.second.date_tax_point = datetime.date(2016, 2, 1)
+        self.second.save()
+        self.assertStoredLines()
+        self.assertEqual(self.period.entries.filter(invoice_id=self.second.pk).count(), 0)
+
+    def test_deleted_invoice(self):
+        Invoice.objects.get(pk=self.first.pk).delete()
+        self.assertStoredLines()
+        self.assertEqual(len(self.period.get_lines()), 1)
+
+    def test_only_changed_invoice_is_recomputed(self):
+        self.first.customer_country = 'CZ'
+        self.first.save()
+        untouched = VATReturnEntry.objects.get(invoice_id=self.second.pk)
+        update_vat_returns()
+        self.assertEqual(VATReturnEntry.objects.get(invoice_id=self.second.pk).pk, untouched.pk)
+        self.assertStoredLines()
+
+    def test_get_lines_without_changes(self):
+        self.period.get_lines()
+        # begin, cursor lock, (transaction horizon on PostgreSQL,) outbox read and stored lines; no scan of the period
+        with self.assertNumQueries(5 if connection.vendor == 'postgresql' else 4):
+            self.period.get_lines()
+
+    def test_reopened_period(self):
+        self.period.closed = False
+        self.period.save()
+        self.assertIsNone(self.period.refreshed)
+        self.period.closed = True
+        self.period.save()
+        self.assertTrue(self.period.refresh())
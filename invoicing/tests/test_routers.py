@@ -0,0 +1,52 @@
+from django.test import TestCase, override_settings
+
+from invoicing.models import Invoice
+from invoicing.routers import read_replica
+from invoicing.tests.base import create_invoice
+
+
+@override_settings(DATABASE_ROUTERS=['invoicing.routers.InvoicingRouter'], INVOICING_READ_DATABASES=('replica', ))
+class RouterTest(TestCase):
+    """
+    Primary and replica are two separate databases here, invoices created on primary are not
+    replicated, so reads sent to replica do not find them.
+    """
+    multi_db = True
+
+    def setUp(self):
+        self.invoice = create_invoice()
+
+    def assertReadFrom(self, alias):
+        self.assertEqual(Invoice.objects.all().db, alias)
+        self.assertEqual(Invoice.objects.filter(pk=self.invoice.pk).exists(), alias == 'default')
+
+    def test_reads(self):
+        self.assertReadFrom('default')
+        with read_replica():
+            self.assertReadFrom('replica')
+        self.assertReadFrom('default')
+
+    def test_pinned_after_write(self):
+        with read_replica():
+            self.assertReadFrom('replica')
+            Invoice.objects.filter(pk=self.invoice.pk).update(note='changed')
+            with read_replica():
+                self.assertReadFrom('default')
+            self.assertReadFrom('default')
+
+        # pinning ends with the context
+        with read_replica():
+            self.assertReadFrom('replica')
+
+    def test_write_outside_context(self):
+        create_invoice()
+        with read_replica():
+            self.assertReadFrom('replica')
+
+    def test_decorator(self):
+        @read_replica()
+        def count():
+            return Invoice.objects.count()
+
+        self.assertEqual(count(), 0)
+        self.assertEqual(Invoice.objects.count(), 1)
@@ -0,0 +1,58 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from invoicing.models import Invoice
+from invoicing.search import FTS_TABLE, SQLiteSearchBackend, SearchBackend, get_search_backend
+from invoicing.tests.base import create_invoice
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.acme = create_invoice(customer_name='Acme Corporation', note='monthly support')
+        self.other = create_invoice(customer_name='Other company', note='Acme hardware')
+
+    def search(self, term, backend=None):
+        backend = backend or get_search_backend(connection.alias)
+        return [invoice.pk for invoice in backend.search(Invoice.objects.all(), term)]
+
+    def test_search(self):
+        self.assertEqual(sorted(self.search('acme')), sorted([self.acme.pk, self.other.pk]))
+        self.assertEqual(self.search('acme supp'), [self.acme.pk])
+        self.assertEqual(self.search('missing'), [])
+        self.assertEqual(len(self.search('')), 2)
+
+    def test_updated_invoice(self):
+        self.other.customer_name = 'Renamed'
+        self.other.save()
+        self.assertEqual(self.search('renamed'), [self.other.pk])
+
+    def test_default_backend(self):
+        self.assertEqual(self.search('acme supp', SearchBackend()), [self.acme.pk])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'requires SQLite')
+class SQLiteSearchTest(TestCase):
+    def test_ranking(self):
+        create_invoice(customer_name='Other company', note='Acme hardware')
+        best = create_invoice(customer_name='Acme', note='Acme')
+        backend = SQLiteSearchBackend()
+        self.assertEqual([invoice.pk for invoice in backend.search(Invoice.objects.all(), 'acme')][0], best.pk)
+
+    def test_single_match(self):
+        queryset = SQLiteSearchBackend().search(Invoice.objects.all(), 'acme')
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertEqual(sql.count('MATCH'), 1)
+        self.assertNotIn('CORRELATED', plan)
+
+    def test_triggers(self):
+        # SQLite drops triggers when migration rebuilds invoices table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'invoicing_invoices'")
+            triggers = dict(cursor.fetchall())
+        self.assertEqual(sorted(triggers), ['%s_%s' % (FTS_TABLE, suffix) for suffix in ('ad', 'ai', 'au')])
+        self.assertIn('AFTER UPDATE OF full_number, subtitle', triggers['%s_au' % FTS_TABLE])
@@ -0,0 +1,36 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.test import TestCase
+
+from invoicing.models import Invoice, PartySnapshot
+from invoicing.snapshots import SUPPLIER_FIELDS, party_data, party_digest
+from invoicing.tests.base import create_invoice
+
+
+class PartyDataTest(TestCase):
+    def test_additional_info_is_decoded(self):
+        invoice = create_invoice()
+        fresh = Invoice()
+        fresh.set_supplier_data(settings.INVOICING_SUPPLIER)
+        row = Invoice.objects.values(*SUPPLIER_FIELDS).get(pk=invoice.pk)
+
+        digests = set(party_digest(party_data(source, SUPPLIER_FIELDS))
+                      for source in (invoice, fresh, row, Invoice.objects.get(pk=invoice.pk)))
+        self.assertEqual(len(digests), 1)
+        self.assertEqual(party_data(row, SUPPLIER_FIELDS)['supplier_additional_info'], {'www': 'www.example.com'})
+
+    def test_migration(self):
+        create_invoice()
+        create_invoice()
+        Invoice.objects.update(supplier_snapshot=None, bank_snapshot=None)
+        PartySnapshot.objects.all().delete()
+
+        migration = import_module('invoicing.migrations.0010_party_snapshots')
+        migration.link_party_snapshots(apps, None)
+
+        invoice = Invoice.objects.all()[0]
+        supplier = party_data(invoice, SUPPLIER_FIELDS)
+        self.assertEqual(PartySnapshot.objects.get_for_data(supplier).pk, invoice.supplier_snapshot_id)
+        self.assertEqual(Invoice.objects.values('supplier_snapshot').distinct().count(), 1)
@@ -0,0 +1,29 @@
+import json
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from invoicing.tests.base import SuperuserMixin, create_invoice
+
+
+class CustomerStatementViewTest(SuperuserMixin, TestCase):
+    def get(self, **params):
+        return self.client.get(reverse('invoicing:invoice_statements'), params)
+
+    def test_statements(self):
+        create_invoice(customer_registration_id='12345678')
+
+        response = self.get(date_from='2016-01-01', date_to='2016-01-31')
+
+        self.assertEqual(response.status_code, 200)
+        statements = json.loads(response.content.decode('utf-8'))['statements']
+        self.assertEqual([statement['customer_key'] for statement in statements], ['REG:SK:12345678'])
+
+    def test_invalid_dates(self):
+        self.assertEqual(self.get(date_from='2016-01-01').status_code, 400)
+        self.assertEqual(self.get(date_from='2016-01-01', date_to='2016-02-30').status_code, 400)
+
+    def test_reversed_period(self):
+        response = self.get(date_from='2016-02-01', date_to='2016-01-31')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content, b'Period has to start before it ends.')
@@ -0,0 +1,111 @@
+import datetime
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from xml.etree import ElementTree
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from invoicing.formatters.ubl import ISDOCFormatter, UBLFormatter
+from invoicing.models import Invoice, Item
+from invoicing.tests.base import create_invoice
+
+
+CAC = '{urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2}'
+CBC = '{urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2}'
+INVOICE = '{urn:oasis:names:specification:ubl:schema:xsd:Invoice-2}'
+CREDIT_NOTE = '{urn:oasis:names:specification:ubl:schema:xsd:CreditNote-2}'
+
+
+def render(formatter_class, invoice):
+    return ElementTree.fromstring(formatter_class(Invoice.objects.get(pk=invoice.pk)).get_content())
+
+
+class UBLFormatterTest(TestCase):
+    def test_invoice(self):
+        invoice = create_invoice(items=((2, '10.00', 20), (1, '5.00', 0)))
+
+        root = render(UBLFormatter, invoice)
+
+        self.assertEqual(root.tag, INVOICE + 'Invoice')
+        self.assertEqual(root.find(CBC + 'InvoiceTypeCode').text, '380')
+        self.assertEqual(len(root.findall(CAC + 'InvoiceLine')), 2)
+        self.assertEqual(root.find(CAC + 'LegalMonetaryTotal/' + CBC + 'PayableAmount').text, '29.00')
+        categories = [element.text for element in root.findall(CAC + 'TaxTotal/' + CAC + 'TaxSubtotal/' + CAC + 'TaxCategory/' + CBC + 'ID')]
+        self.assertEqual(sorted(categories), ['S', 'Z'])
+
+    def test_tax_not_applicable(self):
+        invoice = create_invoice(items=((1, '10.00', 20),))
+        Item.objects.filter(invoice=invoice).update(tax_rate=None)
+
+        root = render(UBLFormatter, invoice)
+
+        category = root.find(CAC + 'TaxTotal/' + CAC + 'TaxSubtotal/' + CAC + 'TaxCategory')
+        self.assertEqual(category.find(CBC + 'ID').text, 'O')
+        self.assertIsNone(category.find(CBC + 'Percent'))
+        line_category = root.find(CAC + 'InvoiceLine/' + CAC + 'Item/' + CAC + 'ClassifiedTaxCategory')
+        self.assertEqual(line_category.find(CBC + 'ID').text, 'O')
+
+    def test_credit_note(self):
+        invoice = create_invoice(items=((1, '-10.00', 20),), type=Invoice.TYPE.VAT_CREDIT_NOTE)
+
+        root = render(UBLFormatter, invoice)
+
+        self.assertEqual(root.tag, CREDIT_NOTE + 'CreditNote')
+        self.assertEqual(root.find(CBC + 'CreditNoteTypeCode').text, '381')
+        self.assertIsNone(root.find(CBC + 'InvoiceTypeCode'))
+        self.assertIsNone(root.find(CBC + 'DueDate'))
+        self.assertEqual(len(root.findall(CAC + 'CreditNoteLine')), 1)
+        self.assertIsNotNone(root.find(CAC + 'CreditNoteLine/' + CBC + 'CreditedQuantity'))
+        self.assertEqual(root.findall(CAC + 'InvoiceLine'), [])
+
+    def test_totals_match_lines_of_finalized_invoice(self):
+        invoice = create_invoice(items=((1, '10.00', 20),))
+        invoice.status = Invoice.STATUS.SENT
+        invoice.save()
+        # items changed behind the frozen snapshot
+        Item.objects.create(invoice=invoice, title='Late item', unit_price=Decimal('5.00'), tax_rate=Decimal(20))
+
+        root = render(UBLFormatter, invoice)
+
+        lines = sum(Decimal(element.text) for element in root.findall(CAC + 'InvoiceLine/' + CBC + 'LineExtensionAmount'))
+        taxable = sum(Decimal(element.text) for element in root.findall(CAC + 'TaxTotal/' + CAC + 'TaxSubtotal/' + CBC + 'TaxableAmount'))
+        self.assertEqual(lines, taxable)
+        self.assertEqual(root.find(CAC + 'LegalMonetaryTotal/' + CBC + 'LineExtensionAmount').text, '15.00')
+
+
+class ISDOCFormatterTest(TestCase):
+    def test_credit_note(self):
+        invoice = create_invoice(items=((1, '-10.00', 20),), type=Invoice.TYPE.VAT_CREDIT_NOTE)
+
+        root = render(ISDOCFormatter, invoice)
+
+        self.assertEqual(root.find('{http://isdoc.cz/namespace/2013}DocumentType').text, '2')
+
+
+class ExportEInvoicesCommandTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_date_range(self):
+        create_invoice(date_issue=datetime.date(2016, 1, 15))
+        create_invoice(date_issue=datetime.date(2016, 2, 15))
+        stdout = StringIO()
+
+        call_command('export_einvoices', self.directory, date_from='2016-02-01', date_to='2016-02-29', stdout=stdout)
+
+        self.assertEqual(stdout.getvalue().strip(), '1 invoices exported.')
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_invalid_dates(self):
+        for value in ('2023-13-01', '2023-02-30', 'foo'):
+            with self.assertRaisesMessage(CommandError, 'Invalid date "%s"' % value):
+                call_command('export_einvoices', self.directory, date_from=value)
+
+        with self.assertRaisesMessage(CommandError, 'Period has to start before it ends.'):
+            call_command('export_einvoices', self.directory, date_from='2016-02-01', date_to='2016-01-31')
@@ -0,0 +1,8 @@
+from django.conf.urls import include, url
+from django.contrib import admin
+
+
+urlpatterns = [
+    url(r'^admin/', include(admin.site.urls)),
+    url(r'^invoicing/', include('invoicing.urls', app_name='invoicing', namespace='invoicing')),
+]
@@ -1,8 +1,14 @@
 from django.conf.urls import patterns, url
 
-from .views import InvoiceDetailView
+from .views import CustomerStatementView, InvoiceDetailView, InvoiceExportView, InvoiceFacetsView, InvoiceIngestView, \
+    InvoiceSearchView
 
 
 urlpatterns = patterns('',
     url(r'^invoice/detail/(?P<pk>[-\d]+)/$', InvoiceDetailView.as_view(), name='invoice_detail'),
+    url(r'^invoice/export/$', InvoiceExportView.as_view(), name='invoice_export'),
+    url(r'^invoice/ingest/$', InvoiceIngestView.as_view(), name='invoice_ingest'),
+    url(r'^invoice/search/$', InvoiceSearchView.as_view(), name='invoice_search'),
+    url(r'^invoice/facets/$', InvoiceFacetsView.as_view(), name='invoice_facets'),
+    url(r'^invoice/statements/$', CustomerStatementView.as_view(), name='invoice_statements'),
 )
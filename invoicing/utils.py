@@ -1,4 +1,30 @@
+import re
+
+from django.utils.encoding import force_text
+
+
 def import_name(name):
     components = name.split('.')
     mod = __import__('.'.join(components[0:-1]), globals(), locals(), [components[-1]])
     return getattr(mod, components[-1])
+
+
+def _normalize_id(value):
+    return re.sub(r'[\W_]+', '', force_text(value or ''), flags=re.UNICODE).upper()
+
+
+def get_customer_key(vat_id=None, registration_id=None, country=None):
+    """
+    Normalized customer identity: VAT ID (``VAT:SK2020123456``), or registration ID with country code
+    (``REG:SK:12345678``). Spaces and punctuation are removed. None if neither is known.
+    """
+    vat_id = _normalize_id(vat_id)
+    if vat_id:
+        return ('VAT:%s' % vat_id)[:255]
+
+    registration_id = _normalize_id(registration_id)
+    country = _normalize_id(getattr(country, 'code', country))
+    if registration_id and country:
+        return ('REG:%s:%s' % (country, registration_id))[:255]
+
+    return None
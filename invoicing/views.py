@@ -1,16 +1,33 @@
+import json
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
 from django.utils.decorators import method_decorator
-from django.views.generic import DetailView
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import DetailView, View
 
-from invoicing.utils import import_name
+from invoicing.exports import EXPORTS, WRITERS
+from invoicing.formatters import NotAcceptable, registry as formatters
+from invoicing.formatters.data import InvoiceJSONEncoder
+from invoicing.ingestion import Ingestion
+from invoicing.routers import read_replica, read_replica_iterator
+from invoicing.search import get_search_backend
+from invoicing.statements import statements
 
-from models import Invoice
+from models import Invoice, InvoiceFacet
 
 
 class InvoiceDetailView(DetailView):
+    """
+    Renders invoice in format requested by ``?format=`` parameter or ``Accept`` header.
+    Available formats are configured by ``settings.INVOICING_FORMATTERS``.
+    """
     model = Invoice
 
     @method_decorator(login_required)
@@ -20,7 +37,182 @@ class InvoiceDetailView(DetailView):
 
         invoice = get_object_or_404(self.model, pk=kwargs.get('pk', None))
 
-        invoicing_formatter = getattr(settings, 'INVOICING_FORMATTER', 'invoicing.formatters.html.BootstrapHTMLFormatter')
-        formatter_class = import_name(invoicing_formatter)
+        try:
+            formatter_class = formatters.negotiate(request)
+        except NotAcceptable as e:
+            return HttpResponse(str(e), status=406, content_type='text/plain')
         formatter = formatter_class(invoice)
-        return formatter.get_response()
+        response = formatter.get_response()
+
+        if 'format' not in request.GET:
+            patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class InvoiceExportView(View):
+    """
+    Streams invoices (``?export=invoices``) or items (``?export=items``) as CSV or JSON Lines (``?format=csv|jsonl``).
+    Optional ``?date_from=`` and ``?date_to=`` limit exported invoices by issue date.
+    """
+
+    @method_decorator(login_required)
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_active or not request.user.is_superuser:
+            return HttpResponseForbidden()
+        return super(InvoiceExportView, self).dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        export_name = request.GET.get('export', 'invoices')
+        writer_name = request.GET.get('format', 'csv')
+
+        if export_name not in EXPORTS or writer_name not in WRITERS:
+            raise Http404
+
+        dates = {}
+        for name in ('date_from', 'date_to'):
+            value = request.GET.get(name, None)
+            if value:
+                try:
+                    dates[name] = parse_date(value)
+                except ValueError:
+                    dates[name] = None
+                if dates[name] is None:
+                    return HttpResponseBadRequest('Invalid date "%s" (expected YYYY-MM-DD).' % name)
+
+        export = EXPORTS[export_name](**dates)
+        writer = WRITERS[writer_name]()
+
+        response = StreamingHttpResponse(read_replica_iterator(writer.lines(export)), content_type=writer.content_type)
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (export_name, writer.extension)
+        return response
+
+
+class InvoiceIngestView(View):
+    """
+    Creates invoices from JSON batch ``{"invoices": [{"idempotency_key": ..., ..., "items": [...]}, ...]}``.
+    Responds with result of every payload in the same order; repeated keys are reported as existing.
+
+    Upstream systems authenticate by ``Authorization: Token <token>`` header with one of
+    ``settings.INVOICING_INGEST_TOKENS``, such requests are not checked for CSRF token.
+    Logged in superusers are accepted as well, with CSRF protection of their session.
+    """
+
+    def authenticate(self, request):
+        """
+        :return: None if request is authenticated, otherwise error response
+        """
+        header = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if len(header) == 2 and header[0] == 'Token':
+            tokens = getattr(settings, 'INVOICING_INGEST_TOKENS', ())
+            if any(constant_time_compare(header[1], token) for token in tokens):
+                return None
+            return HttpResponseForbidden('Invalid token.')
+
+        if not request.user.is_authenticated():
+            return HttpResponse('Authentication required.', status=401)
+        if not request.user.is_active or not request.user.is_superuser:
+            return HttpResponseForbidden()
+        return CsrfViewMiddleware().process_view(request, None, (), {})
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        error = self.authenticate(request)
+        if error is not None:
+            return error
+        return super(InvoiceIngestView, self).dispatch(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payloads = json.loads(request.body.decode('utf-8'))['invoices']
+        except (ValueError, KeyError, TypeError):
+            return HttpResponseBadRequest('Expected JSON object with "invoices" list.')
+
+        if not isinstance(payloads, list) or not all(isinstance(payload, dict) for payload in payloads):
+            return HttpResponseBadRequest('Expected JSON object with "invoices" list.')
+
+        results = Ingestion().ingest(payloads)
+        content = json.dumps({'results': [result._asdict() for result in results]}, cls=InvoiceJSONEncoder)
+        return HttpResponse(content, content_type='application/json')
+
+
+class InvoiceSearchView(View):
+    """
+    Returns JSON list of invoices matching ``?q=`` query, best matches first. ``?limit=`` defaults to 20.
+    """
+    fields = ('id', 'full_number', 'type', 'status', 'customer_name', 'date_issue', 'currency', 'balance_due')
+
+    @method_decorator(login_required)
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_active or not request.user.is_superuser:
+            return HttpResponseForbidden()
+        return super(InvoiceSearchView, self).dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.GET.get('limit', 20)), 100)
+        except ValueError:
+            return HttpResponseBadRequest('Invalid limit.')
+
+        with read_replica():
+            queryset = Invoice.objects.all()
+            invoices = get_search_backend(queryset.db).search(queryset, request.GET.get('q', ''))[:limit]
+            results = [dict((field, getattr(invoice, field)) for field in self.fields) for invoice in invoices]
+        content = json.dumps({'results': results}, cls=InvoiceJSONEncoder)
+        return HttpResponse(content, content_type='application/json')
+
+
+class InvoiceFacetsView(View):
+    """
+    Returns JSON invoice counts from ``InvoiceFacet`` grouped by ``?by=`` fields
+    (comma separated ``year``, ``month``, ``type``, ``status``), optionally filtered by the same query parameters.
+    """
+    facet_fields = ('year', 'month', 'type', 'status')
+
+    @method_decorator(login_required)
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_active or not request.user.is_superuser:
+            return HttpResponseForbidden()
+        return super(InvoiceFacetsView, self).dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        fields = [field for field in request.GET.get('by', 'year,month').split(',') if field]
+        if not fields or not set(fields).issubset(self.facet_fields):
+            return HttpResponseBadRequest('Invalid "by" parameter.')
+
+        filters = dict((field, request.GET[field]) for field in self.facet_fields if request.GET.get(field))
+        with read_replica():
+            facets = InvoiceFacet.objects.counts(*fields, **filters)
+
+        content = json.dumps({'facets': facets}, cls=InvoiceJSONEncoder)
+        return HttpResponse(content, content_type='application/json')
+
+
+class CustomerStatementView(View):
+    """
+    Returns JSON account statements of the period ``?date_from=`` - ``?date_to=`` (YYYY-MM-DD), one per currency,
+    of customer given by ``?customer=`` key (see ``Invoice.customer_key``), or of all customers if omitted.
+    """
+
+    @method_decorator(login_required)
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_active or not request.user.is_superuser:
+            return HttpResponseForbidden()
+        return super(CustomerStatementView, self).dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            date_from = parse_date(request.GET.get('date_from', ''))
+            date_to = parse_date(request.GET.get('date_to', ''))
+        except ValueError:
+            date_from = date_to = None
+        if date_from is None or date_to is None:
+            return HttpResponseBadRequest('Parameters "date_from" and "date_to" are required (YYYY-MM-DD).')
+        if date_from > date_to:
+            return HttpResponseBadRequest('Period has to start before it ends.')
+
+        customer = request.GET.get('customer', None)
+        with read_replica():
+            result = statements(date_from, date_to, [customer] if customer else None)
+
+        content = json.dumps({'statements': [statement._asdict() for statement in result]}, cls=InvoiceJSONEncoder)
+        return HttpResponse(content, content_type='application/json')
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+import sys
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.test.utils import get_runner
+
+
+settings.configure(
+    DEBUG=False,
+    DATABASES={
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        # separate database, so tests of invoicing.routers see where queries were sent
+        'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+    },
+    INSTALLED_APPS=(
+        'django.contrib.auth',
+        'django.contrib.contenttypes',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.admin',
+        'invoicing',
+    ),
+    MIDDLEWARE_CLASSES=(
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    ),
+    TEMPLATES=[{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+        'OPTIONS': {'context_processors': ['django.contrib.auth.context_processors.auth']},
+    }],
+    ROOT_URLCONF='invoicing.tests.urls',
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    USE_TZ=True,
+    INVOICING_TAX_RATE=Decimal(20),
+    INVOICING_SUPPLIER={
+        'name': 'Example company',
+        'street': 'Example street',
+        'city': 'Example city',
+        'zip': '010 01',
+        'country_code': 'SK',
+        'registration_id': '123 456 789',
+        'tax_id': '111222333',
+        'vat_id': 'SK111222333',
+        'additional_info': '{"www": "www.example.com"}',
+        'bank': {
+            'name': 'Example bank',
+            'street': 'Example street',
+            'zip': '010 01',
+            'city': 'Example city',
+            'country_code': 'SK',
+            'iban': 'SK3112000000198742637541',
+            'swift_bic': 'EXAMPLEBANK',
+        },
+    },
+    INVOICING_SNAPSHOT_FORMATS=('html',),
+    INVOICING_DELIVERY_FORMATS=('html',),
+    INVOICING_DELIVERY_FROM_EMAIL='invoices@example.com',
+    INVOICING_NUMBER_FORMAT="{{ invoice.date_issue|date:'Y/m' }}/{{ invoice.number }}",
+)
+
+
+if __name__ == '__main__':
+    django.setup()
+    TestRunner = get_runner(settings)
+    failures = TestRunner(verbosity=1).run_tests(sys.argv[1:] or ['invoicing'])
+    sys.exit(bool(failures))
@@ -17,6 +17,9 @@ setup(
     install_requires=(
         'django', 'django-countries', 'django-iban', 'jsonfield', 'django-model-utils', 'django-money', 'vatnumber'
     ),
+    extras_require={
+        'pdf': ('WeasyPrint',),
+    },
     classifiers=[
         'Programming Language :: Python',
         'Programming Language :: Python :: 2.5',